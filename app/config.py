@@ -21,6 +21,38 @@ class Settings(BaseSettings):
 
     upload_dir: Path = Path("storage/uploads")
     max_upload_mb: int = 10
+    # Behind nginx: an `internal` location aliased to upload_dir (e.g. "/_uploads/"). Authorized upload
+    # requests are then answered with X-Accel-Redirect and nginx sends the file itself.
+    upload_accel_redirect: str = ""
+
+    backup_dir: Path = Path("storage/backups")
+    backup_interval_hours: float = 0.0  # 0 disables the background backup job
+    backup_keep: int = 14
+
+    # Archival of old meal photos (python -m app.services.archive): day folders older than the first age
+    # are re-encoded smaller, whole months older than the second are packed into one ZIP each.
+    archive_interval_hours: float = 0.0  # 0 disables the background archival job
+    archive_recompress_after_days: int = 90  # 0 disables recompression
+    archive_pack_after_days: int = 180  # 0 disables packing
+    archive_max_side_px: int = 1600
+    archive_jpeg_quality: int = 70  # also used for WebP
+
+    job_workers: int = 2  # background job threads per process
+    lazy_routers: bool = True  # import rarely used pages on their first request instead of at startup
+
+    # Admission control: concurrent requests per route class, how many may wait, and for how long.
+    # Keep the sum of limits plus job_workers within the DB pool (5 + 10 overflow by default) so
+    # admitted requests never queue on a connection checkout.
+    admission_enabled: bool = True
+    admission_read_limit: int = 8
+    admission_read_queue: int = 32
+    admission_write_limit: int = 3
+    admission_write_queue: int = 16
+    admission_upload_limit: int = 2
+    admission_upload_queue: int = 4
+    admission_queue_timeout_s: float = 2.0
+    admission_retry_after_s: int = 2
+    db_pool_timeout_s: float = 5.0
 
 
 settings = Settings()
@@ -1,24 +1,189 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker, with_loader_criteria
+from sqlalchemy.pool import QueuePool
 
 from app.config import settings
+from app.models import TenantMixin
+
+
+class WaitStats:
+    """Recent wait durations (a fixed window of samples) for percentile reporting."""
+
+    def __init__(self, window: int = 2048) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_s = 0.0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total_s += seconds
+
+    def summary(self) -> dict[str, float | int]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total = self.count, self.total_s
+        if not samples:
+            return {"count": count, "avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        def pct(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+        return {
+            "count": count,
+            "avg_ms": round(total / count * 1000, 2),
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(samples[-1] * 1000, 2),
+        }
+
 
+pool_waits = WaitStats()
+# Set per request by the admission middleware; checkouts made while serving it add their wait here.
+request_pool_wait: ContextVar[list[float] | None] = ContextVar("request_pool_wait", default=None)
+
+
+class _TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - t0
+            pool_waits.record(waited)
+            acc = request_pool_wait.get()
+            if acc is not None:
+                acc[0] += waited
+
+
+_url = make_url(settings.database_url)
+# In-memory SQLite keeps SQLAlchemy's single-connection pool; everything else gets a bounded checkout wait.
+_pool_kwargs = (
+    {}
+    if _url.get_backend_name() == "sqlite" and _url.database in (None, "", ":memory:")
+    else {"poolclass": _TimedQueuePool, "pool_timeout": settings.db_pool_timeout_s}
+)
 
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
     future=True,
+    **_pool_kwargs,
 )
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+INIT_LOCK_NAME = "project80_init"
+INIT_LOCK_TIMEOUT_S = 60
+
+
+def tenant_id(db: Session) -> int | None:
+    """The user this session is bound to, or None for unscoped (startup, CLI, backup) sessions."""
+    return db.info.get("user_id")
+
+
+def tenant_session(user_id: int) -> Session:
+    db = SessionLocal()
+    db.info["user_id"] = user_id
+    return db
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_tenant(state: ORMExecuteState) -> None:
+    # Every ORM SELECT/UPDATE/DELETE touching a tenant table, including subqueries and unions,
+    # gets `user_id = :uid` added, so per-user code never has to remember the filter.
+    uid = state.session.info.get("user_id")
+    if uid is None or not (state.is_select or state.is_update or state.is_delete):
+        return
+    state.statement = state.statement.options(
+        with_loader_criteria(TenantMixin, lambda cls: cls.user_id == uid, include_aliases=True)
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_tenant(db: Session, flush_context, instances) -> None:
+    uid = db.info.get("user_id")
+    for obj in db.new:
+        if isinstance(obj, TenantMixin) and obj.user_id is None:
+            if uid is None:
+                raise RuntimeError(f"{type(obj).__name__} needs a user_id outside a user-bound session")
+            obj.user_id = uid
+
+
+def get_db(request: Request) -> Session:
+    from app.security import session_user_id
 
-def get_db() -> Session:
     db = SessionLocal()
     try:
+        db.info["user_id"] = session_user_id(db, request)
+        # Release the connection the lookup used; long-lived responses (SSE) shouldn't pin it.
+        db.rollback()
         yield db
     finally:
         db.close()
 
+
+@contextmanager
+def file_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """Exclusive inter-process lock on `path`; yields False if `blocking` is off and it is taken."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        yield True
+    finally:
+        # Closing the descriptor releases the lock on every platform.
+        os.close(fd)
+
+
+@contextmanager
+def init_lock() -> Iterator[None]:
+    """Serialize one-time startup work across worker processes.
+
+    MySQL uses a named advisory lock so that workers on different hosts are covered too;
+    everything else falls back to an exclusive lock on a file next to the storage dir.
+    """
+    if engine.dialect.name == "mysql":
+        with engine.connect() as conn:
+            got = conn.execute(
+                text("SELECT GET_LOCK(:name, :timeout)"), {"name": INIT_LOCK_NAME, "timeout": INIT_LOCK_TIMEOUT_S}
+            ).scalar()
+            if got != 1:
+                raise RuntimeError(f"Timed out waiting for database lock {INIT_LOCK_NAME!r}.")
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": INIT_LOCK_NAME})
+    else:
+        with file_lock(Path("storage") / ".init.lock"):
+            yield
@@ -3,59 +3,126 @@ from __future__ import annotations
 from pathlib import Path
 
 from fastapi import FastAPI, Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
 
 from app.config import settings
-from app.db import engine
-from app.models import Base, User, UserSettings
-from app.routers import auth, calendar_view, dashboard, food, medical, metrics, reports
+from app.db import engine, init_lock
+from app.routers import auth, dashboard, events, food, metrics, sync, uploads
+from app.routers.lazy import include_lazy, load_all
+from app.services.admission import AdmissionMiddleware
+from app.services.jobs import JobPool
+from app.services.schema import SCHEMA_VERSION, migrate, stored_version
+
+# Side effects only: the refresh_day job handler and the metric write-through hooks must be registered
+# in every process, whichever routers it has loaded.
+from app.services import rollups, timeseries  # noqa: F401
 
 app = FastAPI(title=settings.app_name)
+_backup_scheduler = None
+_archive_scheduler = None
+_job_pool: JobPool | None = None
+
 
 def _ensure_dirs() -> None:
     Path("storage").mkdir(exist_ok=True)
     settings.upload_dir.mkdir(parents=True, exist_ok=True)
 
 
-def _ensure_single_user() -> None:
-    with Session(engine) as db:
-        user = db.execute(select(User).where(User.username == "self")).scalar_one_or_none()
-        if user is None:
-            user = User(username="self")
-            db.add(user)
-            db.flush()
-            db.add(
-                UserSettings(user_id=user.id, height_cm=settings.user_height_cm, goal_weight_kg=settings.goal_weight_kg)
-            )
-            db.commit()
-
+def init_app_state() -> None:
+    """Create tables, the owner user and per-user indexes. Safe to call from several workers at once.
 
-@app.on_event("startup")
-def on_startup() -> None:
+    A database already at SCHEMA_VERSION is left alone after one query, without taking the init lock.
+    """
     _ensure_dirs()
     try:
-        Base.metadata.create_all(bind=engine)
+        if stored_version(engine) >= SCHEMA_VERSION:
+            return
+        with init_lock():
+            if stored_version(engine) < SCHEMA_VERSION:  # another worker may have finished meanwhile
+                migrate(engine)
     except OperationalError as e:
         raise RuntimeError(
             "Database connection failed. Check DATABASE_URL (host/user/password) and MySQL grants. "
             "If you are running this app on your local PC but MySQL is on a remote server, you must "
             "grant access for this client IP or run the app on the same server as MySQL."
         ) from e
-    _ensure_single_user()
+
+
+@app.on_event("startup")
+def on_startup() -> None:
+    global _archive_scheduler, _backup_scheduler, _job_pool
+    init_app_state()
+    _job_pool = JobPool(settings.job_workers)
+    _job_pool.start()
+    if settings.backup_interval_hours > 0:
+        from app.services.backup import BackupScheduler
+
+        _backup_scheduler = BackupScheduler(settings.backup_interval_hours)
+        _backup_scheduler.start()
+    if settings.archive_interval_hours > 0:
+        from app.services.archive import ArchiveScheduler
+
+        _archive_scheduler = ArchiveScheduler(settings.archive_interval_hours)
+        _archive_scheduler.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    if _job_pool is not None:
+        _job_pool.stop()
+    if _backup_scheduler is not None:
+        _backup_scheduler.stop()
+    if _archive_scheduler is not None:
+        _archive_scheduler.stop()
 
 _ensure_dirs()
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
-app.mount("/uploads", StaticFiles(directory=str(settings.upload_dir)), name="uploads")
 
+# Pages hit on every visit or by the offline client are loaded up front.
 app.include_router(auth.router)
 app.include_router(dashboard.router)
 app.include_router(metrics.router)
 app.include_router(food.router)
-app.include_router(medical.router)
-app.include_router(reports.router)
-app.include_router(calendar_view.router)
+app.include_router(events.router)
+app.include_router(sync.router)
+app.include_router(uploads.router)
+
+# The rest are imported on first use (see app.routers.lazy); set LAZY_ROUTERS=0 to load them at startup.
+_LAZY_ROUTERS = {
+    "app.routers.medical": ("/medical", "/api/labs"),
+    "app.routers.reports": ("/report",),
+    "app.routers.calendar_view": ("/calendar",),
+    "app.routers.export": ("/export",),
+    "app.routers.search": ("/search",),
+    "app.routers.insights": ("/insights",),
+    "app.routers.glucose": ("/glucose", "/api/glucose"),
+    "app.routers.jobs": ("/jobs",),
+    "app.routers.status": ("/api/status",),
+}
+for _module, _prefixes in _LAZY_ROUTERS.items():
+    include_lazy(app, _module, *_prefixes)
+if not settings.lazy_routers:
+    load_all(app)
+
+_openapi = app.openapi
+
+
+def _openapi_with_lazy_routes() -> dict:
+    load_all(app)
+    return _openapi()
+
+
+app.openapi = _openapi_with_lazy_routes
+
+# Outermost, so overflow is refused before any routing, auth or DB work.
+app.add_middleware(AdmissionMiddleware)
+
+
+@app.exception_handler(PoolTimeoutError)
+def _pool_exhausted(request: Request, exc: PoolTimeoutError) -> PlainTextResponse:
+    return PlainTextResponse(
+        "服务繁忙，请稍后重试。", status_code=503, headers={"Retry-After": str(settings.admission_retry_after_s)}
+    )
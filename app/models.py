@@ -3,14 +3,22 @@ from __future__ import annotations
 import enum
 from datetime import date, datetime
 
-from sqlalchemy import Boolean, Date, DateTime, Enum, Float, ForeignKey, Index, Integer, String, Text
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import Boolean, Date, DateTime, Double, Enum, Float, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.orm import DeclarativeBase, Mapped, declared_attr, mapped_column, relationship
 
 
 class Base(DeclarativeBase):
     pass
 
 
+class TenantMixin:
+    """Rows owned by one user. Sessions bound to a user only see and write that user's rows (see app.db)."""
+
+    @declared_attr
+    def user_id(cls) -> Mapped[int]:
+        return mapped_column(ForeignKey("users.id"), nullable=False)
+
+
 class MealType(str, enum.Enum):
     breakfast = "breakfast"
     lunch = "lunch"
@@ -35,6 +43,7 @@ class User(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     username: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    password_hash: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     settings: Mapped["UserSettings"] = relationship(back_populates="user", uselist=False)
@@ -55,11 +64,23 @@ class UserSettings(Base):
     user: Mapped["User"] = relationship(back_populates="settings")
 
 
-class DailyMetrics(Base):
+class UserSession(Base):
+    """A login. The cookie carries the token; only its SHA-256 is stored."""
+
+    __tablename__ = "user_sessions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class DailyMetrics(TenantMixin, Base):
     __tablename__ = "daily_metrics"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    day: Mapped[date] = mapped_column(Date, index=True, nullable=False)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
 
     weight_kg: Mapped[float | None] = mapped_column(Float, nullable=True)
     fasting_glucose_mmol_l: Mapped[float | None] = mapped_column(Float, nullable=True)
@@ -75,14 +96,14 @@ class DailyMetrics(Base):
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
 
-    __table_args__ = (Index("ix_daily_metrics_day_unique", "day", unique=True),)
+    __table_args__ = (Index("ix_daily_metrics_user_day", "user_id", "day", unique=True),)
 
 
-class FoodLog(Base):
+class FoodLog(TenantMixin, Base):
     __tablename__ = "food_logs"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    eaten_at: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=False)
+    eaten_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     meal_type: Mapped[MealType] = mapped_column(Enum(MealType), nullable=False)
 
     image_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
@@ -97,30 +118,36 @@ class FoodLog(Base):
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (Index("ix_food_logs_user_eaten", "user_id", "eaten_at"),)
 
-class MedicationLog(Base):
+
+class MedicationLog(TenantMixin, Base):
     __tablename__ = "medications"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(128), index=True, nullable=False)
     dose: Mapped[str | None] = mapped_column(String(128), nullable=True)
-    taken_at: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=False)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     next_reminder_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (Index("ix_medications_user_taken", "user_id", "taken_at"),)
+
 
-class MedicationInventory(Base):
+class MedicationInventory(TenantMixin, Base):
     __tablename__ = "medication_inventory"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(128), unique=True, nullable=False)
+    name: Mapped[str] = mapped_column(String(128), nullable=False)
     remaining: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
 
+    __table_args__ = (Index("ix_medication_inventory_user_name", "user_id", "name", unique=True),)
+
 
-class LabReport(Base):
+class LabReport(TenantMixin, Base):
     __tablename__ = "lab_reports"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -129,23 +156,51 @@ class LabReport(Base):
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (Index("ix_lab_reports_user_created", "user_id", "created_at"),)
 
-class LabMetric(Base):
+
+class LabMetric(TenantMixin, Base):
     __tablename__ = "lab_metrics"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    metric_date: Mapped[date] = mapped_column(Date, index=True, nullable=False)
-    name: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    metric_date: Mapped[date] = mapped_column(Date, nullable=False)
+    name: Mapped[str] = mapped_column(String(64), nullable=False)
     value: Mapped[float] = mapped_column(Float, nullable=False)
     unit: Mapped[str | None] = mapped_column(String(32), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        Index("ix_lab_metrics_user_name_date", "user_id", "name", "metric_date"),
+        Index("ix_lab_metrics_user_date", "user_id", "metric_date"),
+    )
+
+
+class AppMeta(Base):
+    """Instance-wide key/value facts, e.g. the schema version startup last migrated to (see app.services.schema)."""
+
+    __tablename__ = "app_meta"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), nullable=False)
+
+
+class LabReference(Base):
+    """Reference range per analyte, in that analyte's canonical unit. Seeded with common adult ranges."""
+
+    __tablename__ = "lab_references"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    analyte: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    unit: Mapped[str] = mapped_column(String(32), nullable=False)
+    low: Mapped[float | None] = mapped_column(Float, nullable=True)
+    high: Mapped[float | None] = mapped_column(Float, nullable=True)
 
-class DailySummary(Base):
+
+class DailySummary(TenantMixin, Base):
     __tablename__ = "daily_summary"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    day: Mapped[date] = mapped_column(Date, unique=True, index=True, nullable=False)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
     color: Mapped[SummaryColor] = mapped_column(Enum(SummaryColor), nullable=False)
     score: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     reasons: Mapped[str] = mapped_column(Text, default="", nullable=False)
@@ -154,3 +209,209 @@ class DailySummary(Base):
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
 
+    __table_args__ = (Index("ix_daily_summary_user_day", "user_id", "day", unique=True),)
+
+
+class MonthlyRollup(TenantMixin, Base):
+    """Materialized per-month aggregates; refreshed whenever a day inside the month changes."""
+
+    __tablename__ = "monthly_rollup"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    month: Mapped[date] = mapped_column(Date, nullable=False)  # first day of month
+
+    metric_days: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    weight_n: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    weight_avg: Mapped[float | None] = mapped_column(Float, nullable=True)
+    weight_min: Mapped[float | None] = mapped_column(Float, nullable=True)
+    weight_max: Mapped[float | None] = mapped_column(Float, nullable=True)
+    fasting_n: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    fasting_avg: Mapped[float | None] = mapped_column(Float, nullable=True)
+    fasting_min: Mapped[float | None] = mapped_column(Float, nullable=True)
+    fasting_max: Mapped[float | None] = mapped_column(Float, nullable=True)
+    bp_n: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    bp_systolic_avg: Mapped[float | None] = mapped_column(Float, nullable=True)
+    bp_systolic_max: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    bp_diastolic_n: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    bp_diastolic_avg: Mapped[float | None] = mapped_column(Float, nullable=True)
+    bp_diastolic_max: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    sleep_n: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    sleep_avg: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    green_days: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    yellow_days: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    red_days: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    meals: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    refined_carbs_meals: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    sugar_meals: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    veggies_first_meals: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    protein_enough_meals: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    danger_meals: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    __table_args__ = (Index("ix_monthly_rollup_user_month", "user_id", "month", unique=True),)
+
+
+class SyncMutation(TenantMixin, Base):
+    """Idempotency ledger for /api/sync: one row per client-generated mutation key."""
+
+    __tablename__ = "sync_mutations"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    entity_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (Index("ix_sync_mutations_user_key", "user_id", "idempotency_key", unique=True),)
+
+
+class SearchDocument(TenantMixin, Base):
+    """Denormalized searchable text; the dialect-specific full-text index is built on top of it."""
+
+    __tablename__ = "search_documents"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    entity: Mapped[str] = mapped_column(String(16), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    title: Mapped[str] = mapped_column(String(255), default="", nullable=False)
+    body: Mapped[str] = mapped_column(Text, default="", nullable=False)
+
+    __table_args__ = (
+        Index("ix_search_documents_entity", "entity", "entity_id", unique=True),
+        Index("ix_search_documents_user_entity", "user_id", "entity"),
+    )
+
+
+class MetricStat(TenantMixin, Base):
+    """Running statistics per tracked metric column, advanced by one observation per write.
+
+    `prev` holds the statistics as they were before the last observation (JSON), so re-saving the
+    latest day rolls back one step instead of replaying history. Columns are DOUBLE so the stored
+    state is bit-for-bit what a replay would compute.
+    """
+
+    __tablename__ = "metric_stats"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    metric: Mapped[str] = mapped_column(String(32), nullable=False)
+    n: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    mean: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    m2: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    ewma: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    ewvar: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    median: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    mad: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    last_day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    last_value: Mapped[float | None] = mapped_column(Double, nullable=True)
+    prev: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    __table_args__ = (Index("ix_metric_stats_user_metric", "user_id", "metric", unique=True),)
+
+
+class MetricAnomaly(TenantMixin, Base):
+    """A reading that stood out against that metric's running statistics at the time it was saved."""
+
+    __tablename__ = "metric_anomalies"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    metric: Mapped[str] = mapped_column(String(32), nullable=False)
+    value: Mapped[float] = mapped_column(Double, nullable=False)
+    expected: Mapped[float] = mapped_column(Double, nullable=False)
+    robust_z: Mapped[float] = mapped_column(Double, nullable=False)
+    ewma_z: Mapped[float | None] = mapped_column(Double, nullable=True)
+    method: Mapped[str] = mapped_column(String(16), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_metric_anomalies_user_metric_day", "user_id", "metric", "day", unique=True),
+        Index("ix_metric_anomalies_user_day", "user_id", "day"),
+    )
+
+
+class GlucoseDay(TenantMixin, Base):
+    """One day of intraday (CGM) glucose readings packed into two arrays, plus that day's aggregates.
+
+    `seconds` is an array('I') of seconds since midnight and `centi_mmol` an array('H') of readings in
+    0.01 mmol/L, both little-endian and sorted by time: 6 bytes per reading, one row per day, so a year
+    of 5-minute readings is ~365 rows. The counters let range summaries run in SQL without unpacking.
+    """
+
+    __tablename__ = "glucose_days"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    seconds: Mapped[bytes] = mapped_column(LargeBinary(2**24), nullable=False)
+    centi_mmol: Mapped[bytes] = mapped_column(LargeBinary(2**24), nullable=False)
+    n: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    n_low: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    n_in_range: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    n_high: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    sum_mmol: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    sum_sq_mmol: Mapped[float] = mapped_column(Double, default=0.0, nullable=False)
+    min_mmol: Mapped[float | None] = mapped_column(Double, nullable=True)
+    max_mmol: Mapped[float | None] = mapped_column(Double, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    __table_args__ = (Index("ix_glucose_days_user_day", "user_id", "day", unique=True),)
+
+
+class FastingWindow(TenantMixin, Base):
+    """The gap between one meal ending and the next meal starting, materialized from food_logs.
+
+    Keyed by the meal that breaks the fast, so inserting a meal replaces exactly one window with two.
+    `day` is the calendar day the fast was broken on.
+    """
+
+    __tablename__ = "fasting_windows"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    prev_meal_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    next_meal_id: Mapped[int] = mapped_column(Integer, unique=True, nullable=False)
+    start_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    end_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    hours: Mapped[float] = mapped_column(Float, nullable=False)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+
+    __table_args__ = (Index("ix_fasting_windows_user_day", "user_id", "day"),)
+
+
+class Job(TenantMixin, Base):
+    """Deferred work for the in-process worker pool (see app.services.jobs).
+
+    `key` identifies what the job recomputes (e.g. a day); queued jobs with the same user, kind and key
+    are coalesced into one run.
+    """
+
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(64), nullable=False)
+    key: Mapped[str] = mapped_column(String(128), nullable=False, default="")
+    payload: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+    run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        Index("ix_jobs_user_kind_key", "user_id", "kind", "key", "status"),
+        Index("ix_jobs_user_created", "user_id", "created_at"),
+    )
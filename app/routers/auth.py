@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Request, Form, Response, status
+from fastapi import APIRouter, Depends, Request, Form, Response, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from sqlalchemy.orm import Session
 
-from app.security import SESSION_COOKIE_NAME, verify_credentials
+from app.db import get_db
+from app.security import SESSION_COOKIE_NAME, SESSION_TTL, authenticate, create_session, end_session
+from app.templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/login", response_class=HTMLResponse)
 def login_page(request: Request):
@@ -18,17 +19,19 @@ def login_submit(
     request: Request,
     response: Response,
     username: str = Form(...),
-    password: str = Form(...)
+    password: str = Form(...),
+    db: Session = Depends(get_db),
 ):
-    if verify_credentials(username, password):
+    user = authenticate(db, username, password)
+    if user is not None:
         # Successful login
         # Allow redirect to dashboard
         resp = RedirectResponse(url="/dashboard", status_code=status.HTTP_302_FOUND)
         resp.set_cookie(
             key=SESSION_COOKIE_NAME,
-            value="authenticated",
+            value=create_session(db, user.id),
             httponly=True,
-            max_age=60 * 60 * 24 * 7, # 7 days
+            max_age=int(SESSION_TTL.total_seconds()),
             samesite="lax"
         )
         return resp
@@ -44,7 +47,8 @@ def login_submit(
         )
 
 @router.get("/logout")
-def logout():
+def logout(request: Request, db: Session = Depends(get_db)):
+    end_session(db, request.cookies.get(SESSION_COOKIE_NAME))
     resp = RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
     resp.delete_cookie(SESSION_COOKIE_NAME)
     return resp
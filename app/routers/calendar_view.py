@@ -4,18 +4,50 @@ from datetime import date
 
 from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.db import get_db
-from app.models import DailyMetrics
+from app.models import DailySummary
 from app.security import require_auth_dependency as basic_auth_dependency
-from app.services.calendar import month_grid
+from app.services.calendar import month_grid, year_layout
+from app.services.rollups import fill_missing_summaries
+from app.services.rules import evaluate_day
+from app.templating import templates
 
 
 router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
-templates = Jinja2Templates(directory="app/templates")
+
+
+def _summary_cells(db: Session, first: date, last: date, today: date) -> dict[date, tuple[str, int]]:
+    """(color, score) per day in [first, last] from `daily_summary`, the same colors the dashboard shows.
+
+    Past days with data but no summary yet are evaluated in one batch and stored for next time;
+    today is evaluated live. Days without data have no entry.
+    """
+    rows = db.execute(
+        select(DailySummary.day, DailySummary.color, DailySummary.score).where(
+            DailySummary.day >= first, DailySummary.day <= last
+        )
+    ).all()
+    cells = {d: (color.value, score) for d, color, score in rows}
+    try:
+        created = fill_missing_summaries(db, first, last, have=set(cells))
+        if created:
+            db.commit()
+    except IntegrityError:
+        # A concurrent request stored some of these days first; read back what is there now.
+        db.rollback()
+        created = list(
+            db.execute(select(DailySummary).where(DailySummary.day >= first, DailySummary.day <= last)).scalars()
+        )
+    if created:
+        cells.update((s.day, (s.color.value, s.score)) for s in created)
+    if first <= today <= last and today not in cells:
+        result = evaluate_day(db, today)
+        cells[today] = (result.color.value, result.score)
+    return cells
 
 
 @router.get("/calendar", response_class=HTMLResponse)
@@ -40,53 +72,9 @@ def calendar(
         next_year, next_month = y, m + 1
 
     weeks = month_grid(y, m)
-    
-    # Calculate date range for batch fetching
     all_days = [d.day for week in weeks for d in week]
-    if not all_days:
-        return templates.TemplateResponse("calendar.html", {
-            "request": request, "year": y, "month": m, 
-            "prev_year": prev_year, "prev_month": prev_month,
-            "next_year": next_year, "next_month": next_month,
-            "weeks": weeks, "day_to_summary": {}
-        })
-
-    min_date = min(all_days)
-    max_date = max(all_days)
-    
-    # Batch Fetch DailyMetrics
-    metrics_list = db.execute(select(DailyMetrics).where(DailyMetrics.day >= min_date, DailyMetrics.day <= max_date)).scalars().all()
-    metrics_map = {m.day: m for m in metrics_list}
-
-    # Batch Fetch FoodLog
-    # Note: FoodLog uses datetime, so we need full range
-    from datetime import datetime, time
-    start_dt = datetime.combine(min_date, time.min)
-    end_dt = datetime.combine(max_date, time.max)
-    
-    from app.models import FoodLog
-    logs_list = db.execute(select(FoodLog).where(FoodLog.eaten_at >= start_dt, FoodLog.eaten_at <= end_dt)).scalars().all()
-    
-    # Group logs by date
-    logs_map = {}
-    for log in logs_list:
-        d = log.eaten_at.date()
-        if d not in logs_map:
-            logs_map[d] = []
-        logs_map[d].append(log)
-
-    from app.services.rules import evaluate_day_from_data
-
-    day_to_summary = {}
-    for d_obj in all_days:
-        if d_obj > today:
-            day_to_summary[d_obj] = None
-        else:
-            # In-memory calculation using batch data (FAST)
-            m_obj = metrics_map.get(d_obj)
-            l_objs = logs_map.get(d_obj, [])
-            result = evaluate_day_from_data(m_obj, l_objs)
-            day_to_summary[d_obj] = result.color.value
+    cells = _summary_cells(db, min(all_days), max(all_days), today) if all_days else {}
+    day_to_summary = {d: cells[d][0] if d in cells else None for d in all_days}
 
     return templates.TemplateResponse(
         "calendar.html",
@@ -102,3 +90,31 @@ def calendar(
             "day_to_summary": day_to_summary,
         },
     )
+
+
+@router.get("/calendar/year", response_class=HTMLResponse)
+def calendar_year(
+    request: Request,
+    year: int | None = Query(None, ge=1900, le=9998),  # the 9999 grid would pad past date.max
+    db: Session = Depends(get_db),
+) -> HTMLResponse:
+    today = date.today()
+    layout = year_layout(year or today.year)
+
+    cells = _summary_cells(db, layout.first, layout.last, today)
+
+    counts = {"green": 0, "yellow": 0, "red": 0}
+    for color, _ in cells.values():
+        counts[color] += 1
+
+    return templates.TemplateResponse(
+        "calendar_year.html",
+        {
+            "request": request,
+            "title": f"{layout.year}年",
+            "layout": layout,
+            "cells": cells,
+            "counts": counts,
+            "today": today,
+        },
+    )
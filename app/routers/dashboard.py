@@ -2,93 +2,156 @@ from __future__ import annotations
 
 import json
 from datetime import date, datetime, timedelta
+from typing import Any, Callable
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.db import get_db
-from app.models import DailyMetrics, User, UserSettings
+from app.db import get_db, tenant_id
+from app.models import DailySummary, UserSettings
 from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.anomaly import describe, recent_anomalies
+from app.services.cache import LRUCache, data_version
+from app.services.events import publish_fasting, publish_summary
+from app.services.fasting import TARGET_HOURS, fasting_stats
 from app.services.rules import fasting_hours_since, upsert_daily_summary
-from app.services.stats import get_recent_metrics, get_summary_counts, get_weight_baseline
+from app.services.stats import get_latest_weight, get_recent_metrics, get_summary_counts, get_weight_baseline
+from app.services.timeseries import MetricDay, series_for
+from app.templating import templates
 
 router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
-templates = Jinja2Templates(directory="app/templates")
 
+# Rendered card HTML keyed by (user, card, today, data version); any write bumps that user's version.
+_card_cache = LRUCache(maxsize=64)
 
-@router.get("/", include_in_schema=False)
-def root() -> RedirectResponse:
-    return RedirectResponse(url="/dashboard", status_code=302)
 
+def _user_settings(db: Session) -> UserSettings:
+    return db.execute(select(UserSettings).where(UserSettings.user_id == tenant_id(db))).scalar_one()
 
-@router.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    today = date.today()
-    yesterday = today - timedelta(days=1)
 
-    summary_yesterday = upsert_daily_summary(db, yesterday)
-    warning_image = "warnings/red_warning.svg" if summary_yesterday.color.value == "red" else None
+def _metrics_today(db: Session, today: date) -> MetricDay | None:
+    return series_for(db).row(today)
+
 
-    metrics_today = db.execute(select(DailyMetrics).where(DailyMetrics.day == today)).scalar_one_or_none()
-    user = db.execute(select(User).where(User.username == "self")).scalar_one()
-    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == user.id)).scalar_one()
+def _status_ctx(db: Session, today: date) -> dict[str, Any]:
+    summary_yesterday = upsert_daily_summary(db, today - timedelta(days=1))
+    publish_summary(tenant_id(db), summary_yesterday)
+    metrics_today = _metrics_today(db, today)
+    user_settings = _user_settings(db)
 
     height_m = max(user_settings.height_cm, 1.0) / 100.0
     bmi = None
     if metrics_today and metrics_today.weight_kg:
         bmi = metrics_today.weight_kg / (height_m * height_m)
 
-    recent = get_recent_metrics(db, days=30)
-    chart_days = [m.day.isoformat() for m in recent]
-    chart_weight = [m.weight_kg for m in recent]
-    chart_glucose = [m.fasting_glucose_mmol_l for m in recent]
-
-    baseline = get_weight_baseline(db)
-    weight_change = None
-    if baseline is not None and metrics_today and metrics_today.weight_kg is not None:
-        weight_change = metrics_today.weight_kg - baseline
-
     goal_delta = None
     if metrics_today and metrics_today.weight_kg is not None:
         goal_delta = metrics_today.weight_kg - user_settings.goal_weight_kg
 
-    now = datetime.now()
-    fasting_hours = fasting_hours_since(user_settings.last_meal_end_at, now)
+    return {
+        "settings": user_settings,
+        "metrics_today": metrics_today,
+        "bmi": bmi,
+        "goal_delta": goal_delta,
+        "summary_yesterday": summary_yesterday,
+    }
+
+
+def _fasting_ctx(db: Session, today: date) -> dict[str, Any]:
+    user_settings = _user_settings(db)
+    publish_fasting(tenant_id(db), user_settings.last_meal_end_at)
+    fasting_hours = fasting_hours_since(user_settings.last_meal_end_at, datetime.now())
     fasting_remaining = None
     if fasting_hours is not None:
         fasting_remaining = max(0.0, 16.0 - fasting_hours)
+    stats = fasting_stats(db, today - timedelta(days=29), today)
+    return {
+        "fasting_hours": fasting_hours,
+        "fasting_remaining": fasting_remaining,
+        "fasting_stats": stats,
+        "target_hours": TARGET_HOURS,
+    }
 
+
+def _achievements_ctx(db: Session, today: date) -> dict[str, Any]:
     counts = get_summary_counts(db)
     green_total = counts["green"]
     green_milestone = (green_total // 7) * 7 if green_total >= 7 else None
 
+    baseline = get_weight_baseline(db)
+    latest = get_latest_weight(db)
     weight_milestone = None
-    if baseline is not None and metrics_today and metrics_today.weight_kg is not None:
-        lost = baseline - metrics_today.weight_kg
+    if baseline is not None and latest is not None:
+        lost = baseline - latest
         if lost >= 5:
             weight_milestone = int(lost // 5) * 5
 
+    return {"green_total": green_total, "green_milestone": green_milestone, "weight_milestone": weight_milestone}
+
+
+def _trend_ctx(db: Session, today: date) -> dict[str, Any]:
+    recent = get_recent_metrics(db, days=30)
+    return {
+        "chart_days_json": json.dumps([m.day.isoformat() for m in recent], ensure_ascii=False),
+        "chart_weight_json": json.dumps([m.weight_kg for m in recent], ensure_ascii=False),
+        "chart_glucose_json": json.dumps([m.fasting_glucose_mmol_l for m in recent], ensure_ascii=False),
+    }
+
+
+def _warning_ctx(db: Session, today: date) -> dict[str, Any]:
+    color = db.execute(
+        select(DailySummary.color).where(DailySummary.day == today - timedelta(days=1))
+    ).scalar_one_or_none()
+    return {"warning_image": "warnings/red_warning.svg" if color is not None and color.value == "red" else None}
+
+
+def _anomalies_ctx(db: Session, today: date) -> dict[str, Any]:
+    return {"anomalies": [(a.day, describe(a)) for a in recent_anomalies(db, today)]}
+
+
+# name -> (template, context builder, cacheable). The fasting card depends on the clock, not on data.
+CARDS: dict[str, tuple[str, Callable[[Session, date], dict[str, Any]], bool]] = {
+    "status": ("partials/dashboard_status.html", _status_ctx, True),
+    "fasting": ("partials/dashboard_fasting.html", _fasting_ctx, False),
+    "achievements": ("partials/dashboard_achievements.html", _achievements_ctx, True),
+    "trend": ("partials/dashboard_trend.html", _trend_ctx, True),
+    "warning": ("partials/dashboard_warning.html", _warning_ctx, True),
+    "anomalies": ("partials/dashboard_anomalies.html", _anomalies_ctx, True),
+}
+
+
+def render_card(db: Session, name: str, today: date, version: int) -> str:
+    template_name, build, cacheable = CARDS[name]
+
+    def render() -> str:
+        return templates.get_template(template_name).render(**build(db, today))
+
+    if not cacheable:
+        return render()
+    return _card_cache.get_or_set((tenant_id(db), name, today, version), render)
+
+
+@router.get("/", include_in_schema=False)
+def root() -> RedirectResponse:
+    return RedirectResponse(url="/dashboard", status_code=302)
+
+
+@router.get("/dashboard", response_class=HTMLResponse)
+def dashboard(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
+    today = date.today()
+    version = data_version(tenant_id(db))
+    cards = {name: render_card(db, name, today, version) for name in CARDS}
     return templates.TemplateResponse(
         "dashboard.html",
-        {
-            "request": request,
-            "settings": user_settings,
-            "metrics_today": metrics_today,
-            "bmi": bmi,
-            "goal_delta": goal_delta,
-            "weight_change": weight_change,
-            "summary_yesterday": summary_yesterday,
-            "warning_image": warning_image,
-            "chart_days_json": json.dumps(chart_days, ensure_ascii=False),
-            "chart_weight_json": json.dumps(chart_weight, ensure_ascii=False),
-            "chart_glucose_json": json.dumps(chart_glucose, ensure_ascii=False),
-            "fasting_hours": fasting_hours,
-            "fasting_remaining": fasting_remaining,
-            "green_total": green_total,
-            "green_milestone": green_milestone,
-            "weight_milestone": weight_milestone,
-        },
+        {"request": request, "cards": cards, "data_version": version},
     )
+
+
+@router.get("/dashboard/cards/{name}", response_class=HTMLResponse)
+def dashboard_card(name: str, db: Session = Depends(get_db)) -> HTMLResponse:
+    if name not in CARDS:
+        raise HTTPException(status_code=404)
+    html = render_card(db, name, date.today(), data_version(tenant_id(db)))
+    return HTMLResponse(html, headers={"Cache-Control": "no-cache"})
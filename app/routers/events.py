@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.db import tenant_session
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.events import broadcaster_for, format_sse, load_state, needs_load
+
+require_user = basic_auth_dependency()
+router = APIRouter(dependencies=[Depends(require_user)])
+
+KEEPALIVE_S = 15.0
+
+
+def _load(user_id: int) -> None:
+    with tenant_session(user_id) as db:
+        load_state(db, user_id)
+
+
+@router.get("/events/dashboard")
+async def dashboard_events(request: Request, user_id: int = Depends(require_user)) -> StreamingResponse:
+    broadcaster = broadcaster_for(user_id)
+
+    async def stream() -> AsyncIterator[str]:
+        async with broadcaster.subscribe() as queue:
+            if needs_load(user_id):
+                await run_in_threadpool(_load, user_id)
+            # Anything queued so far is already reflected in the snapshot below.
+            while not queue.empty():
+                queue.get_nowait()
+            yield "retry: 5000\n\n"
+            for event, data in broadcaster.snapshot().items():
+                yield format_sse(event, data)
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
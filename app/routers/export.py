@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+
+from app.db import tenant_session
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.export import EXPORT_FORMATS, EXPORT_TABLES, MEDIA_TYPES, iter_table, iter_zip
+from app.templating import templates
+
+require_user = basic_auth_dependency()
+router = APIRouter(dependencies=[Depends(require_user)])
+
+
+def _stream(user_id: int, make_chunks) -> Iterator[bytes]:
+    # The session must outlive the request-scoped dependency, so the generator owns it.
+    with tenant_session(user_id) as db:
+        yield from make_chunks(db)
+
+
+def _download(chunks: Iterator[bytes], filename: str, media_type: str) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+
+@router.get("/export", response_class=HTMLResponse)
+def export_home(request: Request) -> HTMLResponse:
+    return templates.TemplateResponse(
+        "export.html",
+        {"request": request, "title": "导出", "tables": list(EXPORT_TABLES), "formats": EXPORT_FORMATS},
+    )
+
+
+@router.get("/export/bundle.zip")
+def export_bundle(
+    fmt: str = Query("csv"), uploads: bool = Query(True), user_id: int = Depends(require_user)
+) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="unknown format")
+    stamp = date.today().strftime("%Y%m%d")
+    return _download(
+        _stream(user_id, lambda db: iter_zip(db, fmt, include_uploads=uploads)),
+        f"project80-{stamp}.zip",
+        MEDIA_TYPES["zip"],
+    )
+
+
+@router.get("/export/{table}.{fmt}")
+def export_table(table: str, fmt: str, user_id: int = Depends(require_user)) -> StreamingResponse:
+    if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404)
+    return _download(_stream(user_id, lambda db: iter_table(db, table, fmt)), f"{table}.{fmt}", MEDIA_TYPES[fmt])
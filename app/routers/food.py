@@ -1,23 +1,25 @@
 from __future__ import annotations
 
-import uuid
 from datetime import datetime
-from pathlib import Path
 
 from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.db import get_db
-from app.models import FoodLog, MealType, SelfRating, User, UserSettings
+from app.db import get_db, tenant_id
+from app.models import FoodLog, MealType, SelfRating, UserSettings
 from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.events import publish_fasting
+from app.services.fasting import add_meal
+from app.services.rollups import schedule_refresh
 from app.services.rules import fasting_hours_since
+from app.services.search import index_food
+from app.services.uploads import new_upload
+from app.templating import templates
 
 router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
-templates = Jinja2Templates(directory="app/templates")
 
 
 def _safe_ext(filename: str) -> str:
@@ -39,10 +41,10 @@ def _default_meal_type(dt: datetime) -> MealType:
 
 @router.get("/food/new", response_class=HTMLResponse)
 def new_food(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    user = db.execute(select(User).where(User.username == "self")).scalar_one()
-    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == user.id)).scalar_one()
+    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == tenant_id(db))).scalar_one()
     now = datetime.now()
     fasting_hours = fasting_hours_since(user_settings.last_meal_end_at, now)
+    publish_fasting(tenant_id(db), user_settings.last_meal_end_at)
     return templates.TemplateResponse(
         "food_new.html",
         {
@@ -57,7 +59,7 @@ def new_food(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
 
 
 @router.post("/food/new", response_model=None)
-async def create_food(
+def create_food(
     request: Request,
     eaten_at: str = Form(...),
     meal_type: MealType = Form(...),
@@ -72,8 +74,7 @@ async def create_food(
     photo: UploadFile | None = File(None),
     db: Session = Depends(get_db),
 ):
-    user = db.execute(select(User).where(User.username == "self")).scalar_one()
-    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == user.id)).scalar_one()
+    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == tenant_id(db))).scalar_one()
 
     now = datetime.now()
     fasting_hours = fasting_hours_since(user_settings.last_meal_end_at, now)
@@ -109,7 +110,7 @@ async def create_food(
                 status_code=400,
             )
 
-        content = await photo.read()
+        content = photo.file.read()  # a plain def route runs in the threadpool, off the event loop
         if len(content) > settings.max_upload_mb * 1024 * 1024:
             return templates.TemplateResponse(
                 "food_new.html",
@@ -124,12 +125,8 @@ async def create_food(
                 status_code=400,
             )
 
-        day_folder = settings.upload_dir / now.strftime("%Y%m%d")
-        day_folder.mkdir(parents=True, exist_ok=True)
-        filename = f"{uuid.uuid4().hex}{ext}"
-        path = day_folder / filename
+        path, image_rel = new_upload(tenant_id(db), now.strftime("%Y%m%d"), ext)
         path.write_bytes(content)
-        image_rel = str(Path(day_folder.name) / filename).replace("\\", "/")
 
     eaten_dt = datetime.fromisoformat(eaten_at)
     meal_end_dt = datetime.fromisoformat(meal_end_at) if meal_end_at else None
@@ -147,10 +144,16 @@ async def create_food(
         meal_end_at=meal_end_dt,
     )
     db.add(log)
+    db.flush()
+    index_food(db, log)
+    add_meal(db, log)
 
     if meal_end_dt is not None:
         user_settings.last_meal_end_at = meal_end_dt
 
+    schedule_refresh(db, eaten_dt.date())
     db.commit()
+    if meal_end_dt is not None:
+        publish_fasting(tenant_id(db), meal_end_dt)
     return RedirectResponse(url="/dashboard", status_code=303)
 
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict
+from datetime import date, timedelta
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.orm import Session
+
+from app.db import get_db, tenant_id
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.cache import data_version
+from app.services.glucose import (
+    HIGH_MMOL,
+    LOW_MMOL,
+    GlucoseBatch,
+    day_stats,
+    glucose_days_between,
+    ingest,
+    range_stats,
+    readings_between,
+)
+from app.services.rollups import schedule_refresh
+from app.templating import templates
+
+router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
+
+MAX_RANGE_DAYS = 92
+
+
+@router.post("/api/glucose")
+def ingest_glucose(payload: GlucoseBatch, db: Session = Depends(get_db)) -> dict[str, Any]:
+    added = ingest(db, ((r.at, r.mmol) for r in payload.readings))
+    for day in added:
+        schedule_refresh(db, day)
+    db.commit()
+    return {
+        "added": {day.isoformat(): n for day, n in sorted(added.items())},
+        "data_version": str(data_version(tenant_id(db))),
+    }
+
+
+@router.get("/api/glucose")
+def glucose_range(
+    start: date = Query(...),
+    end: date = Query(...),
+    db: Session = Depends(get_db),
+) -> dict[str, Any]:
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"range must be 1-{MAX_RANGE_DAYS} days")
+    stats = range_stats(db, start, end)
+    return {
+        "readings": [[at.isoformat(), mmol] for at, mmol in readings_between(db, start, end)],
+        "stats": {**asdict(stats), "gmi": stats.gmi},
+    }
+
+
+@router.get("/glucose", response_class=HTMLResponse)
+def glucose_page(
+    request: Request,
+    day: date | None = Query(None),
+    db: Session = Depends(get_db),
+) -> HTMLResponse:
+    d = day or date.today()
+    readings = list(readings_between(db, d, d))
+    return templates.TemplateResponse(
+        "glucose.html",
+        {
+            "request": request,
+            "title": "动态血糖",
+            "day": d,
+            "prev_day": d - timedelta(days=1),
+            "next_day": d + timedelta(days=1),
+            "day_stats": day_stats(glucose_days_between(db, d, d).get(d)),
+            "range_stats": range_stats(db, d - timedelta(days=13), d),
+            "low": LOW_MMOL,
+            "high": HIGH_MMOL,
+            "chart_json": json.dumps([[at.strftime("%H:%M"), mmol] for at, mmol in readings]),
+        },
+    )
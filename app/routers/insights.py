@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.insights import FLAGS, LAGS, get_insights
+from app.templating import templates
+
+router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
+
+
+@router.get("/insights", response_class=HTMLResponse)
+def insights_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
+    insights = get_insights(db)
+    corr = {}
+    if insights:
+        corr = {(c.flag, c.lag): c for c in insights.correlations}
+    return templates.TemplateResponse(
+        "insights.html",
+        {
+            "request": request,
+            "title": "饮食与血糖",
+            "insights": insights,
+            "flags": FLAGS,
+            "lags": LAGS,
+            "corr": corr,
+        },
+    )
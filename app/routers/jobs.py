@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.jobs import recent_jobs, retry, status_counts
+from app.templating import templates
+
+router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
+
+STATUS_LABELS = {"queued": "排队中", "running": "运行中", "done": "完成", "failed": "失败"}
+KIND_LABELS = {"refresh_day": "重算当日总结"}
+
+
+@router.get("/jobs", response_class=HTMLResponse)
+def jobs_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
+    return templates.TemplateResponse(
+        "jobs.html",
+        {
+            "request": request,
+            "title": "后台任务",
+            "counts": status_counts(db),
+            "jobs": recent_jobs(db),
+            "status_labels": STATUS_LABELS,
+            "kind_labels": KIND_LABELS,
+        },
+    )
+
+
+@router.post("/jobs/{job_id}/retry")
+def retry_job(job_id: int, db: Session = Depends(get_db)) -> RedirectResponse:
+    retry(db, job_id)
+    return RedirectResponse(url="/jobs", status_code=303)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import importlib
+
+from fastapi import FastAPI
+from starlette.routing import BaseRoute, Match
+from starlette.types import Receive, Scope, Send
+
+
+class LazyRouter(BaseRoute):
+    """Placeholder for a router module that is imported on the first request under one of its prefixes.
+
+    On that request the module's `router` is included into the app, this placeholder removes itself
+    and the request is dispatched again, now to the real routes. Pages used rarely (reports, export,
+    insights with NumPy, ...) then cost nothing at process start.
+    """
+
+    def __init__(self, app: FastAPI, module: str, prefixes: tuple[str, ...]) -> None:
+        self.app = app
+        self.module = module
+        self.prefixes = prefixes
+
+    def matches(self, scope: Scope) -> tuple[Match, Scope]:
+        if scope["type"] == "http":
+            path = scope["path"]
+            if any(path == p or path.startswith(p + "/") for p in self.prefixes):
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    def load(self) -> None:
+        # Runs on the event loop without awaiting, so two requests can't both get here for one module.
+        if self not in self.app.router.routes:
+            return
+        router = importlib.import_module(self.module).router
+        self.app.router.routes.remove(self)
+        self.app.include_router(router)
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.load()
+        await self.app.router(scope, receive, send)
+
+
+def include_lazy(app: FastAPI, module: str, *prefixes: str) -> None:
+    app.router.routes.append(LazyRouter(app, module, prefixes))
+
+
+def load_all(app: FastAPI) -> None:
+    for route in list(app.router.routes):
+        if isinstance(route, LazyRouter):
+            route.load()
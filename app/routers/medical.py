@@ -1,25 +1,29 @@
 from __future__ import annotations
 
-import uuid
+import json
+from dataclasses import asdict
 from datetime import date, datetime
-from pathlib import Path
+from typing import Any
 
-from fastapi import APIRouter, Depends, File, Form, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 from fastapi import Request
 from fastapi.responses import HTMLResponse
 from sqlalchemy import select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
-from app.db import get_db
+from app.db import get_db, tenant_id
 from app.models import LabMetric, LabReport, MedicationInventory, MedicationLog
 from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.labs import analyte_for, canonical_name, latest_all, references, series
+from app.services.search import index_lab_report, index_medication
+from app.services.uploads import new_upload
+from app.templating import templates
 
 
 router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
-templates = Jinja2Templates(directory="app/templates")
 
 
 def _safe_ext(filename: str) -> str:
@@ -35,6 +39,7 @@ def medical_home(request: Request, db: Session = Depends(get_db)) -> HTMLRespons
     meds = db.execute(select(MedicationLog).order_by(MedicationLog.taken_at.desc()).limit(50)).scalars().all()
     inventory = db.execute(select(MedicationInventory).order_by(MedicationInventory.name.asc())).scalars().all()
     lab_metrics = db.execute(select(LabMetric).order_by(LabMetric.metric_date.desc()).limit(50)).scalars().all()
+    lab_latest = latest_all(db)
     reports = db.execute(select(LabReport).order_by(LabReport.created_at.desc()).limit(20)).scalars().all()
     return templates.TemplateResponse(
         "medical.html",
@@ -45,6 +50,7 @@ def medical_home(request: Request, db: Session = Depends(get_db)) -> HTMLRespons
             "meds": meds,
             "inventory": inventory,
             "lab_metrics": lab_metrics,
+            "lab_latest": lab_latest,
             "reports": reports,
         },
     )
@@ -60,7 +66,10 @@ def add_medication(
 ) -> RedirectResponse:
     taken_dt = datetime.fromisoformat(taken_at)
     reminder_dt = datetime.fromisoformat(next_reminder_at) if next_reminder_at else None
-    db.add(MedicationLog(name=name, dose=dose, taken_at=taken_dt, next_reminder_at=reminder_dt))
+    med = MedicationLog(name=name, dose=dose, taken_at=taken_dt, next_reminder_at=reminder_dt)
+    db.add(med)
+    db.flush()
+    index_medication(db, med)
     db.commit()
     return RedirectResponse(url="/medical", status_code=303)
 
@@ -86,11 +95,57 @@ def add_lab_metric(
     db: Session = Depends(get_db),
 ) -> RedirectResponse:
     d = date.fromisoformat(metric_date)
-    db.add(LabMetric(metric_date=d, name=name, value=value, unit=unit))
+    db.add(LabMetric(metric_date=d, name=canonical_name(name), value=value, unit=unit))
     db.commit()
     return RedirectResponse(url="/medical", status_code=303)
 
 
+@router.get("/medical/labs/{name}", response_class=HTMLResponse)
+def lab_trend(name: str, request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
+    points = series(db, name)
+    if not points:
+        raise HTTPException(status_code=404)
+    canonical = canonical_name(name)
+    analyte = analyte_for(name)
+    ref = references(db).get(canonical)
+    return templates.TemplateResponse(
+        "lab_trend.html",
+        {
+            "request": request,
+            "title": canonical,
+            "name": canonical,
+            "label": analyte.label if analyte else canonical,
+            "unit": points[-1].unit,
+            "points": points,
+            "ref": ref,
+            "chart_days_json": json.dumps([p.day.isoformat() for p in points]),
+            "chart_values_json": json.dumps([round(p.value, 3) for p in points]),
+        },
+    )
+
+
+@router.get("/api/labs/latest")
+def labs_latest(db: Session = Depends(get_db)) -> list[dict[str, Any]]:
+    return [
+        {
+            "name": x.name,
+            "label": x.label,
+            "latest": asdict(x.latest),
+            "previous": asdict(x.previous) if x.previous else None,
+            "delta": x.delta,
+            "low": x.low,
+            "high": x.high,
+            "status": x.status,
+        }
+        for x in latest_all(db)
+    ]
+
+
+@router.get("/api/labs/{name}")
+def lab_series(name: str, db: Session = Depends(get_db)) -> dict[str, Any]:
+    return {"name": canonical_name(name), "points": [asdict(p) for p in series(db, name)]}
+
+
 @router.post("/medical/report")
 async def add_lab_report(
     report_date: str | None = Form(None),
@@ -104,15 +159,14 @@ async def add_lab_report(
         if ext:
             content = await file.read()
             if len(content) <= settings.max_upload_mb * 1024 * 1024:
-                folder = settings.upload_dir / "reports"
-                folder.mkdir(parents=True, exist_ok=True)
-                filename = f"{uuid.uuid4().hex}{ext}"
-                path = folder / filename
-                path.write_bytes(content)
-                image_rel = str(Path(folder.name) / filename).replace("\\", "/")
+                path, image_rel = new_upload(tenant_id(db), "reports", ext)
+                await run_in_threadpool(path.write_bytes, content)
 
     d = date.fromisoformat(report_date) if report_date else None
-    db.add(LabReport(report_date=d, image_path=image_rel, notes=notes))
+    report = LabReport(report_date=d, image_path=image_rel, notes=notes)
+    db.add(report)
+    db.flush()
+    index_lab_report(db, report)
     db.commit()
     return RedirectResponse(url="/medical", status_code=303)
 
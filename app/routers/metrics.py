@@ -4,16 +4,17 @@ from datetime import date
 
 from fastapi import APIRouter, Depends, Form, Query, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.models import DailyMetrics
 from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.anomaly import observe_deleted, observe_metrics
+from app.services.rollups import schedule_refresh
+from app.templating import templates
 
 router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
-templates = Jinja2Templates(directory="app/templates")
 
 
 def _to_float(v: str | float | None) -> float | None:
@@ -75,6 +76,8 @@ def create_or_update_metrics(
     metric.bp_systolic = _to_int(bp_systolic)
     metric.bp_diastolic = _to_int(bp_diastolic)
 
+    for touched_day in observe_metrics(db, [metric]) | {d}:
+        schedule_refresh(db, touched_day)
     db.commit()
     return RedirectResponse(url=f"/metrics/new?day={day}", status_code=303)
 
@@ -85,6 +88,8 @@ def delete_metrics(day: str = Form(...), db: Session = Depends(get_db)) -> Redir
     metric = db.execute(select(DailyMetrics).where(DailyMetrics.day == d)).scalar_one_or_none()
     if metric is not None:
         db.delete(metric)
+        for touched_day in observe_deleted(db, metric) | {d}:
+            schedule_refresh(db, touched_day)
         db.commit()
     return RedirectResponse(url="/metrics", status_code=303)
 
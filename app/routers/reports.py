@@ -1,21 +1,26 @@
 from __future__ import annotations
 
+import json
 from datetime import date, timedelta
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.db import get_db
-from app.models import DailyMetrics
 from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.fasting import fasting_stats
+from app.services.rollups import MEAL_FLAGS, fill_missing_summaries, get_rollups, yearly_stats
 from app.services.rules import upsert_daily_summary
+from app.services.stats import RANGE_GROUPS, range_report
+from app.services.timeseries import series_for
+from app.templating import templates
 
 
 router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
-templates = Jinja2Templates(directory="app/templates")
+
+MAX_RANGE_DAYS = 366
 
 
 @router.get("/report/weekly", response_class=HTMLResponse)
@@ -26,12 +31,7 @@ def weekly_report(request: Request, end: str | None = None, db: Session = Depend
     days = [start_day + timedelta(days=i) for i in range(7)]
     summaries = [upsert_daily_summary(db, d) for d in days]
 
-    metrics_list = (
-        db.execute(select(DailyMetrics).where(DailyMetrics.day >= start_day, DailyMetrics.day <= end_day))
-        .scalars()
-        .all()
-    )
-    metrics = {m.day: m for m in metrics_list}
+    metrics = {m.day: m for m in series_for(db).rows(start_day, end_day)}
 
     colors = [s.color.value for s in summaries]
     green = colors.count("green")
@@ -64,3 +64,94 @@ def weekly_report(request: Request, end: str | None = None, db: Session = Depend
             "fasting_avg": fasting_avg,
         },
     )
+
+
+@router.get("/report/monthly", response_class=HTMLResponse)
+def monthly_report(
+    request: Request,
+    year: int | None = Query(None),
+    compare: int = Query(2, ge=0, le=10),
+    db: Session = Depends(get_db),
+) -> HTMLResponse:
+    y = year or date.today().year
+    rollups = get_rollups(db, date(y - compare, 1, 1), date(y, 12, 31))
+
+    by_year: dict[int, dict[int, object]] = {}
+    for r in rollups:
+        by_year.setdefault(r.month.year, {})[r.month.month] = r
+    years = sorted(by_year)
+    current = [by_year.get(y, {}).get(mo) for mo in range(1, 13)]
+    previous = [by_year.get(y - 1, {}).get(mo) for mo in range(1, 13)]
+
+    def series(attr: str) -> dict[str, list[float | None]]:
+        return {
+            str(yr): [getattr(by_year[yr][mo], attr) if mo in by_year[yr] else None for mo in range(1, 13)]
+            for yr in years
+        }
+
+    return templates.TemplateResponse(
+        "report_monthly.html",
+        {
+            "request": request,
+            "title": "月报",
+            "year": y,
+            "compare": compare,
+            "rows": list(zip(range(1, 13), current, previous)),
+            "flags": MEAL_FLAGS,
+            "weight_series_json": json.dumps(series("weight_avg")),
+            "fasting_series_json": json.dumps(series("fasting_avg")),
+        },
+    )
+
+
+@router.get("/report/yearly", response_class=HTMLResponse)
+def yearly_report(request: Request, years: int = Query(5, ge=1, le=30), db: Session = Depends(get_db)) -> HTMLResponse:
+    this_year = date.today().year
+    stats = yearly_stats(db, this_year - years + 1, this_year)
+    return templates.TemplateResponse(
+        "report_yearly.html",
+        {"request": request, "title": "年报", "years": years, "stats": stats, "flags": (*MEAL_FLAGS, "danger")},
+    )
+
+
+@router.get("/report", response_class=HTMLResponse)
+def custom_report(
+    request: Request,
+    start: date | None = Query(None),
+    end: date | None = Query(None),
+    group: str = Query("week"),
+    db: Session = Depends(get_db),
+) -> HTMLResponse:
+    if group not in RANGE_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group must be one of {', '.join(RANGE_GROUPS)}")
+    end_day = end or date.today()
+    start_day = start or end_day - timedelta(days=89)
+    if start_day > end_day:
+        start_day, end_day = end_day, start_day
+    if (end_day - start_day).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"range must be 1-{MAX_RANGE_DAYS} days")
+
+    # Colors only exist for evaluated days; evaluate the gaps once so later reports stay pure SQL.
+    try:
+        fill_missing_summaries(db, start_day, end_day)
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # a concurrent request stored them first
+    buckets = range_report(db, start_day, end_day, group)
+
+    return templates.TemplateResponse(
+        "report_range.html",
+        {
+            "request": request,
+            "title": "区间报告",
+            "start_day": start_day,
+            "end_day": end_day,
+            "group": group,
+            "groups": RANGE_GROUPS,
+            "buckets": buckets,
+            "fasting": fasting_stats(db, start_day, end_day),
+            "chart_labels_json": json.dumps([b.start.isoformat() for b in buckets]),
+            "chart_weight_json": json.dumps([b.weight_avg for b in buckets]),
+            "chart_glucose_json": json.dumps([b.fasting_avg for b in buckets]),
+        },
+    )
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.search import ENTITIES, PAGE_SIZE, search
+from app.templating import templates
+
+router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
+
+
+@router.get("/search", response_class=HTMLResponse)
+def search_page(
+    request: Request,
+    q: str = Query("", max_length=200),
+    type: str | None = Query(None),
+    page: int = Query(1, ge=1),
+    db: Session = Depends(get_db),
+) -> HTMLResponse:
+    entity = type if type in ENTITIES else None
+    hits, total = search(db, q, entity=entity, page=page)
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    return templates.TemplateResponse(
+        "search.html",
+        {
+            "request": request,
+            "title": "搜索",
+            "q": q,
+            "entity": entity,
+            "entities": ENTITIES,
+            "hits": hits,
+            "total": total,
+            "page": page,
+            "pages": pages,
+        },
+    )
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter, Depends
+
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.admission import report
+
+router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
+
+
+@router.get("/api/status/load")
+def load_status() -> dict[str, Any]:
+    """Admission counters per route class and DB pool checkout waits for this worker process."""
+    return report()
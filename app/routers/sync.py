@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.security import require_auth_dependency as basic_auth_dependency
+from app.services.sync import SyncRequest, apply_batch
+
+router = APIRouter(dependencies=[Depends(basic_auth_dependency())])
+
+
+@router.post("/api/sync")
+def sync(payload: SyncRequest, db: Session = Depends(get_db)) -> dict[str, Any]:
+    return apply_batch(db, payload)
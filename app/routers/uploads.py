@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import mimetypes
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.security import cached_session_user_id
+from app.services.uploads import etag, iter_bytes, locate, owns
+
+router = APIRouter()
+
+# Names are unique per upload, so a URL's content never changes; `private` keeps shared caches out.
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _require_session(request: Request) -> int:
+    uid = cached_session_user_id(request)
+    if uid is None:
+        raise HTTPException(status_code=status.HTTP_303_SEE_OTHER, headers={"Location": "/login"})
+    return uid
+
+
+class UploadResponse(FileResponse):
+    """FileResponse (with Range / If-Range support) that lets the server send the file when it can.
+
+    Whole-file GETs use the ASGI `http.response.pathsend` extension where the server offers it
+    (Granian, Hypercorn), which ends in sendfile(2); otherwise Starlette streams large chunks
+    from a worker thread.
+    """
+
+    chunk_size = 256 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        plain_get = scope["method"] == "GET" and not any(name == b"range" for name, _ in scope["headers"])
+        if not plain_get or "http.response.pathsend" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await send({"type": "http.response.pathsend", "path": str(self.path)})
+
+
+@router.api_route("/uploads/{rel:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def get_upload(rel: str, request: Request, user_id: int = Depends(_require_session)) -> Response:
+    item = locate(rel)
+    if item is None or not owns(user_id, rel):
+        raise HTTPException(status_code=404)  # someone else's file looks the same as a missing one
+
+    tag = etag(rel, item)
+    headers = {"ETag": tag, "Cache-Control": CACHE_CONTROL, "X-Content-Type-Options": "nosniff"}
+    if tag in {t.strip() for t in request.headers.get("if-none-match", "").split(",")}:
+        return Response(status_code=304, headers=headers)
+    if item.packed:
+        # An archived photo: a small slice of its month's ZIP, read in one go (no Range support).
+        media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        return Response(b"".join(iter_bytes(item, item.size)), media_type=media_type, headers=headers)
+    if settings.upload_accel_redirect:
+        location = settings.upload_accel_redirect.rstrip("/") + "/" + quote(rel)
+        return Response(headers={**headers, "X-Accel-Redirect": location})
+    return UploadResponse(item.path, headers=headers)
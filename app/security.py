@@ -1,13 +1,26 @@
 from __future__ import annotations
 
+import hashlib
 import secrets
+import time
+from datetime import datetime, timedelta
 from typing import Callable
 
-from fastapi import HTTPException, Request, status
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
 
 from app.config import settings
+from app.models import User, UserSession
 
 SESSION_COOKIE_NAME = "project80_session"
+SESSION_TTL = timedelta(days=7)
+OWNER_USERNAME = "self"  # the original single user; logs in with APP_BASIC_AUTH_USER/PASS
+PBKDF2_ITERATIONS = 200_000
+SESSION_CACHE_S = 60.0  # how long a process trusts a resolved cookie without asking the DB
+
+_session_cache: dict[str, tuple[int, float]] = {}  # token hash -> (user id, monotonic deadline)
+_SESSION_CACHE_MAX = 10_000
 
 
 def verify_credentials(username: str, password: str) -> bool:
@@ -20,14 +33,107 @@ def verify_credentials(username: str, password: str) -> bool:
     return secrets.compare_digest(username, expected_user) and secrets.compare_digest(password, expected_pass)
 
 
-def require_auth_dependency() -> Callable[[Request], None]:
-    def _dep(request: Request) -> None:
-        token = request.cookies.get(SESSION_COOKIE_NAME)
-        if token != "authenticated":
+def hash_password(password: str) -> str:
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt}${digest.hex()}"
+
+
+def check_password(password: str, stored: str) -> bool:
+    try:
+        algo, iterations, salt, expected = stored.split("$")
+    except ValueError:
+        return False
+    if algo != "pbkdf2_sha256":
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+    return secrets.compare_digest(digest.hex(), expected)
+
+
+def authenticate(db: Session, username: str, password: str) -> User | None:
+    """Family members log in with their own password; the configured credentials map to the owner."""
+    user = db.execute(select(User).where(User.username == username)).scalar_one_or_none()
+    if user is not None and user.password_hash:
+        return user if check_password(password, user.password_hash) else None
+    if verify_credentials(username, password):
+        return db.execute(select(User).where(User.username == OWNER_USERNAME)).scalar_one_or_none()
+    return None
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(db: Session, user_id: int) -> str:
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    db.add(UserSession(token_hash=_token_hash(token), user_id=user_id, created_at=now, expires_at=now + SESSION_TTL))
+    db.execute(delete(UserSession).where(UserSession.user_id == user_id, UserSession.expires_at < now))
+    db.commit()
+    return token
+
+
+def end_session(db: Session, token: str | None) -> None:
+    if token:
+        _session_cache.pop(_token_hash(token), None)
+        db.execute(delete(UserSession).where(UserSession.token_hash == _token_hash(token)))
+        db.commit()
+
+
+def session_user_id(db: Session, request: Request) -> int | None:
+    """Resolve the cookie to a user with one unique-index lookup; None when missing or expired."""
+    token = request.cookies.get(SESSION_COOKIE_NAME)
+    if not token:
+        return None
+    row = db.execute(
+        select(UserSession.user_id, UserSession.expires_at).where(UserSession.token_hash == _token_hash(token))
+    ).first()
+    if row is None or row.expires_at < datetime.utcnow():
+        return None
+    return row.user_id
+
+
+def cached_session_user_id(request: Request) -> int | None:
+    """`session_user_id` for hot, read-only routes (upload files): a hit costs no DB round trip.
+
+    A logout is seen at once by the process that handled it and within SESSION_CACHE_S by the others.
+    """
+    token = request.cookies.get(SESSION_COOKIE_NAME)
+    if not token:
+        return None
+    key = _token_hash(token)
+    now = time.monotonic()
+    hit = _session_cache.get(key)
+    if hit is not None and hit[1] > now:
+        return hit[0]
+
+    from app.db import SessionLocal
+
+    with SessionLocal() as db:
+        row = db.execute(
+            select(UserSession.user_id, UserSession.expires_at).where(UserSession.token_hash == key)
+        ).first()
+    if row is None:
+        return None
+    remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+    if remaining <= 0:
+        return None
+    if len(_session_cache) >= _SESSION_CACHE_MAX:
+        _session_cache.clear()
+    _session_cache[key] = (row.user_id, now + min(SESSION_CACHE_S, remaining))
+    return row.user_id
+
+
+def require_auth_dependency() -> Callable[..., int]:
+    from app.db import get_db, tenant_id
+
+    def _dep(db: Session = Depends(get_db)) -> int:
+        uid = tenant_id(db)
+        if uid is None:
             raise HTTPException(
                 status_code=status.HTTP_303_SEE_OTHER,
                 headers={"Location": "/login"},
             )
+        return uid
 
     return _dep
-
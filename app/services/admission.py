@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.db import WaitStats, engine, pool_waits, request_pool_wait
+
+# Long-lived or file responses are not gated: SSE streams would hold a slot for hours, and upload
+# downloads rarely touch the DB (see routers/uploads.py) but may take long on a slow link.
+EXEMPT_PREFIXES = ("/static/", "/events/", "/uploads/")
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+@dataclass
+class Limiter:
+    """At most `limit` requests of one class in flight and `queue` waiting; the rest are refused at once.
+
+    Runs on the event loop only, so plain counters are enough. Waiters are admitted FIFO by handing
+    them the releasing request's slot; one not admitted within `timeout_s` is refused too, so no
+    request waits longer than that before it starts.
+    """
+
+    name: str
+    limit: int
+    queue: int
+    timeout_s: float
+    inflight: int = 0
+    waiting: int = 0
+    admitted: int = 0
+    rejected_full: int = 0
+    rejected_timeout: int = 0
+    queue_waits: WaitStats = field(default_factory=WaitStats)
+    _waiters: deque[asyncio.Future] = field(default_factory=deque)
+
+    async def acquire(self) -> float | None:
+        """Seconds spent queued, or None if the request must be shed."""
+        if self.inflight < self.limit:
+            self.inflight += 1
+            self.admitted += 1
+            self.queue_waits.record(0.0)
+            return 0.0
+        if self.waiting >= self.queue:
+            self.rejected_full += 1
+            return None
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.waiting += 1
+        t0 = time.perf_counter()
+        try:
+            # If the slot is handed over as the timeout fires, wait_for still returns normally.
+            await asyncio.wait_for(fut, self.timeout_s)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            return None
+        except asyncio.CancelledError:
+            # Client went away; if the slot had already been handed over, pass it on.
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - t0
+        self.admitted += 1
+        self.queue_waits.record(waited)
+        return waited
+
+    def release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():  # skip waiters that timed out
+                fut.set_result(None)  # the slot passes straight to them; inflight is unchanged
+                return
+        self.inflight -= 1
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "queue_wait": self.queue_waits.summary(),
+        }
+
+
+def route_class(scope: Scope) -> str | None:
+    path = scope["path"]
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    if scope["method"] in READ_METHODS:
+        return "read"
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            return "upload" if value.startswith(b"multipart/form-data") else "write"
+    return "write"
+
+
+def build_limiters() -> dict[str, Limiter]:
+    timeout = settings.admission_queue_timeout_s
+    return {
+        "read": Limiter("read", settings.admission_read_limit, settings.admission_read_queue, timeout),
+        "write": Limiter("write", settings.admission_write_limit, settings.admission_write_queue, timeout),
+        "upload": Limiter("upload", settings.admission_upload_limit, settings.admission_upload_queue, timeout),
+    }
+
+
+limiters = build_limiters()
+
+_BUSY_BODY = "服务繁忙，请稍后重试。".encode()
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: sheds load per route class with a fast 503 + Retry-After.
+
+    Admitted responses carry `Server-Timing` with the time spent queued here, waiting for a DB
+    connection and handling the request, so slow requests can be told apart from overloaded ones.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.admission_enabled:
+            await self.app(scope, receive, send)
+            return
+        cls = route_class(scope)
+        if cls is None:
+            await self.app(scope, receive, send)
+            return
+        limiter = limiters[cls]
+        queued = await limiter.acquire()
+        if queued is None:
+            await _busy(send)
+            return
+
+        pool_wait = [0.0]
+        token = request_pool_wait.set(pool_wait)
+        started = time.perf_counter()
+
+        async def send_with_timing(message) -> None:
+            if message["type"] == "http.response.start":
+                app_ms = (time.perf_counter() - started) * 1000
+                timing = f"queue;dur={queued * 1000:.1f}, pool;dur={pool_wait[0] * 1000:.1f}, app;dur={app_ms:.1f}"
+                message = dict(message, headers=[*message.get("headers", []), (b"server-timing", timing.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_pool_wait.reset(token)
+            limiter.release()
+
+
+async def _busy(send: Send) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(_BUSY_BODY)).encode()),
+                (b"retry-after", str(settings.admission_retry_after_s).encode()),
+                (b"cache-control", b"no-store"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": _BUSY_BODY})
+
+
+def report() -> dict[str, object]:
+    pool = engine.pool
+    return {
+        "enabled": settings.admission_enabled,
+        "classes": {name: lim.stats() for name, lim in limiters.items()},
+        "pool": {
+            "status": pool.status(),
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "wait": pool_waits.summary(),
+        },
+    }
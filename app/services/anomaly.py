@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+from dataclasses import asdict, dataclass, replace
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import DailyMetrics, MetricAnomaly, MetricStat
+
+
+class MetricSpec(NamedTuple):
+    label: str
+    unit: str
+    resolution: float  # floor on the robust sigma, roughly the measurement noise
+    min_delta: float  # never flag a deviation smaller than this, however tight the history
+
+
+TRACKED: dict[str, MetricSpec] = {
+    "weight_kg": MetricSpec("体重", "kg", 0.2, 1.0),
+    "fasting_glucose_mmol_l": MetricSpec("空腹血糖", "mmol/L", 0.1, 0.8),
+    "post2h_glucose_mmol_l": MetricSpec("餐后2h血糖", "mmol/L", 0.2, 1.5),
+    "waist_cm": MetricSpec("腰围", "cm", 0.5, 2.0),
+    "sleep_hours": MetricSpec("睡眠", "h", 0.25, 2.0),
+    "bp_systolic": MetricSpec("收缩压", "mmHg", 2.0, 15.0),
+    "bp_diastolic": MetricSpec("舒张压", "mmHg", 2.0, 10.0),
+}
+
+MIN_HISTORY = 7  # readings needed before anything is flagged
+EWMA_ALPHA = 0.2
+ROBUST_GAIN = 0.05  # step floor for the running median once 1/n gets smaller than this
+HUBER_K = 2.5  # residuals beyond this many sigmas are clipped before they move the median
+ROBUST_SIGMA = math.sqrt(math.pi / 2)  # mean absolute deviation -> sigma for normal data
+ROBUST_Z = 3.5
+EWMA_Z = 4.0
+
+
+@dataclass(frozen=True)
+class RunningStats:
+    """Welford mean/M2, EWMA mean/variance and a clipped running median with its mean absolute deviation."""
+
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    ewma: float = 0.0
+    ewvar: float = 0.0
+    median: float = 0.0
+    mad: float = 0.0
+
+    @property
+    def std(self) -> float | None:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else None
+
+
+@dataclass(frozen=True)
+class Finding:
+    method: str
+    expected: float
+    robust_z: float
+    ewma_z: float | None
+
+
+def _update(s: RunningStats, x: float) -> RunningStats:
+    n = s.n + 1
+    delta = x - s.mean
+    mean = s.mean + delta / n
+    m2 = s.m2 + delta * (x - mean)
+    if s.n == 0:
+        return RunningStats(n=n, mean=mean, m2=m2, ewma=x, ewvar=0.0, median=x, mad=0.0)
+
+    d = x - s.ewma
+    ewma = s.ewma + EWMA_ALPHA * d
+    ewvar = (1 - EWMA_ALPHA) * (s.ewvar + EWMA_ALPHA * d * d)
+
+    r = x - s.median
+    if s.mad > 0:
+        limit = HUBER_K * ROBUST_SIGMA * s.mad
+        r = max(-limit, min(limit, r))
+    gain = max(1.0 / n, ROBUST_GAIN)
+    median = s.median + gain * r
+    mad = s.mad + gain * (abs(r) - s.mad)
+    return RunningStats(n=n, mean=mean, m2=m2, ewma=ewma, ewvar=ewvar, median=median, mad=mad)
+
+
+def _check(spec: MetricSpec, s: RunningStats, x: float) -> Finding | None:
+    if s.n < MIN_HISTORY:
+        return None
+    dev = x - s.median
+    robust_z = dev / max(ROBUST_SIGMA * s.mad, spec.resolution)
+    ewma_z = (x - s.ewma) / math.sqrt(s.ewvar) if s.ewvar > 0 else None
+    if abs(dev) >= spec.min_delta and abs(robust_z) >= ROBUST_Z:
+        return Finding("robust", s.median, robust_z, ewma_z)
+    if ewma_z is not None and abs(x - s.ewma) >= spec.min_delta and abs(ewma_z) >= EWMA_Z:
+        return Finding("ewma", s.ewma, robust_z, ewma_z)
+    return None
+
+
+def step(spec: MetricSpec, s: RunningStats, x: float) -> tuple[RunningStats, Finding | None]:
+    """The single code path for both live writes and replays: judge `x` against `s`, then absorb it."""
+    return _update(s, x), _check(spec, s, x)
+
+
+def _stats_of(row: MetricStat) -> RunningStats:
+    return RunningStats(row.n, row.mean, row.m2, row.ewma, row.ewvar, row.median, row.mad)
+
+
+def _store(
+    row: MetricStat, s: RunningStats, prev: RunningStats | None, last_day: date | None, last_value: float | None
+) -> None:
+    for k, v in asdict(s).items():
+        setattr(row, k, v)
+    row.prev = json.dumps(asdict(prev)) if prev is not None else None
+    row.last_day = last_day
+    row.last_value = last_value
+
+
+def _record(db: Session, metric: str, day: date, value: float, finding: Finding | None) -> None:
+    db.execute(delete(MetricAnomaly).where(MetricAnomaly.metric == metric, MetricAnomaly.day == day))
+    if finding is not None:
+        db.add(
+            MetricAnomaly(
+                day=day,
+                metric=metric,
+                value=value,
+                expected=finding.expected,
+                robust_z=finding.robust_z,
+                ewma_z=finding.ewma_z,
+                method=finding.method,
+            )
+        )
+
+
+def rebuild_metric(db: Session, metric: str) -> set[date]:
+    """Replay the metric's whole history through `step`; returns days whose anomaly verdict changed."""
+    spec = TRACKED[metric]
+    col = getattr(DailyMetrics, metric)
+    rows = db.execute(select(DailyMetrics.day, col).where(col.is_not(None)).order_by(DailyMetrics.day)).all()
+
+    s, prev = RunningStats(), None
+    found: dict[date, tuple[float, Finding]] = {}
+    for day, value in rows:
+        prev = s
+        s, finding = step(spec, s, float(value))
+        if finding is not None:
+            found[day] = (float(value), finding)
+
+    old = {
+        a.day: (a.value, a.method)
+        for a in db.execute(select(MetricAnomaly).where(MetricAnomaly.metric == metric)).scalars()
+    }
+    new = {day: (value, f.method) for day, (value, f) in found.items()}
+    changed = {d for d in old.keys() | new.keys() if old.get(d) != new.get(d)}
+
+    db.execute(delete(MetricAnomaly).where(MetricAnomaly.metric == metric))
+    for day, (value, finding) in found.items():
+        _record(db, metric, day, value, finding)
+
+    row = db.execute(select(MetricStat).where(MetricStat.metric == metric)).scalar_one_or_none()
+    if row is None:
+        row = MetricStat(metric=metric)
+        db.add(row)
+    last_day, last_value = (rows[-1][0], float(rows[-1][1])) if rows else (None, None)
+    _store(row, s, prev, last_day, last_value)
+    db.flush()
+    return changed
+
+
+def _observe(db: Session, metric: str, day: date, value: float | None) -> set[date]:
+    spec = TRACKED[metric]
+    row = db.execute(select(MetricStat).where(MetricStat.metric == metric).with_for_update()).scalar_one_or_none()
+    if row is None:
+        # First write since the feature shipped: seed the state from whatever history exists.
+        return rebuild_metric(db, metric)
+
+    if row.last_day is None or day > row.last_day:
+        if value is None:
+            return set()
+        base = _stats_of(row)
+    elif day == row.last_day and value is not None and row.prev is not None:
+        # Re-saving the latest reading: step back once and apply the new value instead.
+        base = replace(RunningStats(), **json.loads(row.prev))
+    else:
+        # Back-dated edit or a removed reading: everything after it depends on it.
+        return rebuild_metric(db, metric)
+
+    s, finding = step(spec, base, value)
+    had = db.execute(
+        select(MetricAnomaly.id).where(MetricAnomaly.metric == metric, MetricAnomaly.day == day)
+    ).first()
+    _record(db, metric, day, value, finding)
+    _store(row, s, base, day, value)
+    return {day} if (had is not None or finding is not None) else set()
+
+
+def changed_metrics(row: DailyMetrics) -> dict[tuple[date, str], float | None]:
+    """Tracked columns of `row` modified since its last flush, read from SQLAlchemy attribute history."""
+    attrs = inspect(row).attrs
+    out: dict[tuple[date, str], float | None] = {}
+    for metric in TRACKED:
+        if attrs[metric].history.has_changes():
+            value = getattr(row, metric)
+            out[(row.day, metric)] = None if value is None else float(value)
+    return out
+
+
+def observe_changes(db: Session, changes: dict[tuple[date, str], float | None]) -> set[date]:
+    """Feed changed readings into the running stats in day order, O(1) per in-order write.
+
+    Returns days whose anomaly verdict may have changed, so callers can refresh those days' summaries.
+    """
+    if not changes:
+        return set()
+    db.flush()
+    touched: set[date] = set()
+    for (day, metric), value in sorted(changes.items(), key=lambda c: c[0][0]):
+        touched |= _observe(db, metric, day, value)
+    return touched
+
+
+def observe_metrics(db: Session, rows: list[DailyMetrics]) -> set[date]:
+    """`observe_changes` for rows that have not been flushed since they were modified."""
+    changes: dict[tuple[date, str], float | None] = {}
+    for row in rows:
+        changes.update(changed_metrics(row))
+    return observe_changes(db, changes)
+
+
+def observe_deleted(db: Session, row: DailyMetrics) -> set[date]:
+    """Rebuild every metric the deleted row contributed to. Call after `db.delete(row)`."""
+    metrics = [m for m in TRACKED if getattr(row, m) is not None]
+    if not metrics:
+        return set()
+    db.flush()
+    touched: set[date] = set()
+    for metric in metrics:
+        touched |= rebuild_metric(db, metric)
+    return touched
+
+
+def describe(a: MetricAnomaly) -> str:
+    spec = TRACKED[a.metric]
+    direction = "偏高" if a.value > a.expected else "偏低"
+    return f"{spec.label}{direction} {a.value:g}{spec.unit}（近期约 {a.expected:.1f}）"
+
+
+def anomalies_between(db: Session, start: date, end: date) -> dict[date, list[MetricAnomaly]]:
+    out: dict[date, list[MetricAnomaly]] = {}
+    rows = db.execute(
+        select(MetricAnomaly)
+        .where(MetricAnomaly.day >= start, MetricAnomaly.day <= end)
+        .order_by(MetricAnomaly.day, MetricAnomaly.metric)
+    ).scalars()
+    for a in rows:
+        out.setdefault(a.day, []).append(a)
+    return out
+
+
+def recent_anomalies(db: Session, today: date, days: int = 14) -> list[MetricAnomaly]:
+    rows = db.execute(
+        select(MetricAnomaly)
+        .where(MetricAnomaly.day > today - timedelta(days=days), MetricAnomaly.day <= today)
+        .order_by(MetricAnomaly.day.desc(), MetricAnomaly.metric)
+    ).scalars()
+    return list(rows)
+
+
+def verify(db: Session) -> list[str]:
+    """Metrics whose stored state differs from a fresh replay (rolled back, nothing is written)."""
+    stored = {
+        row.metric: (_stats_of(row), row.last_day, row.last_value, row.prev)
+        for row in db.execute(select(MetricStat)).scalars()
+    }
+    stored_anomalies = {
+        (a.metric, a.day, a.value, a.expected, a.robust_z, a.ewma_z, a.method)
+        for a in db.execute(select(MetricAnomaly)).scalars()
+    }
+    try:
+        for metric in TRACKED:
+            rebuild_metric(db, metric)
+        replayed = {
+            row.metric: (_stats_of(row), row.last_day, row.last_value, row.prev)
+            for row in db.execute(select(MetricStat)).scalars()
+        }
+        replayed_anomalies = {
+            (a.metric, a.day, a.value, a.expected, a.robust_z, a.ewma_z, a.method)
+            for a in db.execute(select(MetricAnomaly)).scalars()
+        }
+    finally:
+        db.rollback()
+    problems = [m for m in TRACKED if m in stored and stored[m] != replayed.get(m)]
+    for metric in sorted({a[0] for a in stored_anomalies ^ replayed_anomalies}):
+        if metric not in problems:
+            problems.append(metric)
+    return problems
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app.db import SessionLocal, tenant_session
+    from app.services.users import user_ids
+
+    parser = argparse.ArgumentParser(description="Running metric statistics and anomaly events.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="replay all history into the state table")
+    sub.add_parser("verify", help="check the stored state against a replay")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        uids = user_ids(db)
+    # State and history are per user, so each user is replayed in a session scoped to them.
+    failed = False
+    for uid in uids:
+        with tenant_session(uid) as db:
+            if args.cmd == "rebuild":
+                for metric in TRACKED:
+                    changed = rebuild_metric(db, metric)
+                    print(f"user {uid} {metric}: {len(changed)} day(s) changed")
+                db.commit()
+            else:
+                for metric in verify(db):
+                    print(f"mismatch: user {uid} {metric}")
+                    failed = True
+    if args.cmd == "verify":
+        raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
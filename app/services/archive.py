@@ -0,0 +1,381 @@
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from app.config import settings
+from app.db import file_lock
+from app.services.uploads import ARCHIVE_DIR, archive_paths, is_day_folder
+
+logger = logging.getLogger(__name__)
+
+MARKER = ".recompressed"  # written into a day folder once its photos have been re-encoded
+PHOTO_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+MIN_SAVING = 0.9  # keep the original unless re-encoding makes it at least 10% smaller
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")  # ZIP local file header, without name and extra field
+
+
+@dataclass
+class ArchiveRun:
+    recompressed: int = 0  # photos re-encoded smaller
+    bytes_before: int = 0
+    bytes_after: int = 0
+    packed: int = 0  # files moved into month archives
+    archives: int = 0  # month archives written
+    pillow: bool = True
+
+
+def _lock_path() -> Path:
+    return settings.upload_dir.parent / ".archive.lock"
+
+
+def _last_run_path() -> Path:
+    return settings.upload_dir.parent / ".archive_last_run"
+
+
+def last_run() -> datetime | None:
+    try:
+        return datetime.fromisoformat(_last_run_path().read_text(encoding="utf-8").strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _prefixes(root: Path) -> list[tuple[str, Path]]:
+    """The top level (files saved before multi-user support) and every u<id>/ folder."""
+    found = [("", root)]
+    for p in sorted(root.iterdir()):
+        if p.is_dir() and p.name.startswith("u") and p.name[1:].isdigit():
+            found.append((p.name, p))
+    return found
+
+
+def _day_folders(base: Path) -> list[tuple[date, Path]]:
+    folders = []
+    for p in sorted(base.iterdir()):
+        if not (p.is_dir() and is_day_folder(p.name)):
+            continue
+        try:
+            folders.append((datetime.strptime(p.name, "%Y%m%d").date(), p))
+        except ValueError:
+            continue
+    return folders
+
+
+def _month_end(day: date) -> date:
+    first_of_next = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first_of_next - timedelta(days=1)
+
+
+def _read_marker(folder: Path) -> dict[str, int] | None:
+    try:
+        return json.loads((folder / MARKER).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _reencode(path: Path, fmt: str) -> bytes:
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as src:
+        im = ImageOps.exif_transpose(src)  # EXIF is not kept, so bake the camera rotation in
+        im.thumbnail((settings.archive_max_side_px, settings.archive_max_side_px))
+        if fmt == "JPEG" and im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        out = io.BytesIO()
+        if fmt == "PNG":
+            im.save(out, fmt, optimize=True)
+        elif fmt == "JPEG":
+            im.save(out, fmt, quality=settings.archive_jpeg_quality, optimize=True, progressive=True)
+        else:
+            im.save(out, fmt, quality=settings.archive_jpeg_quality)
+    return out.getvalue()
+
+
+def _recompress_folder(folder: Path) -> dict[str, int]:
+    """Re-encode one day folder's photos in place (same name, same format) and mark it done."""
+    stats = {"files": 0, "before": 0, "after": 0}
+    for path in sorted(folder.iterdir()):
+        fmt = PHOTO_FORMATS.get(path.suffix.lower())
+        if fmt is None or not path.is_file():
+            continue
+        before = path.stat().st_size
+        try:
+            data = _reencode(path, fmt)
+        except (OSError, ValueError) as e:  # unreadable or not really an image: keep it as it is
+            logger.warning("cannot recompress %s: %s", path, e)
+            continue
+        if len(data) >= before * MIN_SAVING:
+            continue
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        stats["files"] += 1
+        stats["before"] += before
+        stats["after"] += len(data)
+    (folder / MARKER).write_text(json.dumps(stats), encoding="utf-8")
+    return stats
+
+
+def _member_offsets(
+    zip_path: Path, old: dict[str, list[int]], mtimes: dict[str, int]
+) -> dict[str, list[int]]:
+    """`{name: [data offset, size, mtime_ns]}` read back from the ZIP itself.
+
+    Members are stored uncompressed, so the bytes at the offset are the original file. The mtime is
+    the file's own (the ZIP only keeps 2-second DOS times), so the member keeps its ETag.
+    """
+    members = {}
+    with zipfile.ZipFile(zip_path) as zf, zip_path.open("rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{zip_path}: {info.filename} is compressed")
+            f.seek(info.header_offset)
+            header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+            if header[0] != b"PK\x03\x04":
+                raise ValueError(f"{zip_path}: bad local header for {info.filename}")
+            offset = info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+            if info.filename in mtimes:
+                mtime_ns = mtimes[info.filename]
+            elif info.filename in old:
+                mtime_ns = old[info.filename][2]
+            else:
+                mtime_ns = int(time.mktime((*info.date_time, 0, 0, -1)) * 1e9)
+            members[info.filename] = [offset, info.file_size, mtime_ns]
+    return members
+
+
+def _pack_month(prefix: str, month: str, folders: list[Path]) -> int:
+    """Move every file of `folders` into the prefix's YYYYMM.zip and rewrite its index.
+
+    Crash-safe in this order: the new ZIP (old members at unchanged offsets, new ones appended)
+    replaces the old one, then the index is replaced, and only then are the files removed. Until
+    then `locate` keeps finding the files themselves.
+    """
+    zip_path, index_path = archive_paths(prefix, month)
+    zip_path.parent.mkdir(parents=True, exist_ok=True)
+    previous = json.loads(index_path.read_text(encoding="utf-8")) if index_path.exists() else {}
+    recompressed = previous.get("recompressed", {"files": 0, "before": 0, "after": 0})
+
+    files = [p for folder in folders for p in sorted(folder.iterdir()) if p.is_file() and not p.name.startswith(".")]
+    tmp = zip_path.with_name(f".{zip_path.name}.tmp")
+    if zip_path.exists():
+        shutil.copyfile(zip_path, tmp)
+    else:
+        tmp.unlink(missing_ok=True)
+    mtimes = {}
+    with zipfile.ZipFile(tmp, "a", compression=zipfile.ZIP_STORED) as zf:
+        have = set(zf.namelist())
+        for path in files:
+            rel = path.relative_to(settings.upload_dir).as_posix()
+            mtimes[rel] = path.stat().st_mtime_ns
+            if rel not in have:  # already there if an earlier run stopped before removing the files
+                zf.write(path, arcname=rel)
+    members = _member_offsets(tmp, previous.get("members", {}), mtimes)
+    for folder in folders:
+        for key, value in (_read_marker(folder) or {}).items():
+            recompressed[key] = recompressed.get(key, 0) + value
+
+    with tmp.open("rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, zip_path)
+    index_tmp = index_path.with_name(f".{index_path.name}.tmp")
+    index_tmp.write_text(json.dumps({"members": members, "recompressed": recompressed}), encoding="utf-8")
+    os.replace(index_tmp, index_path)
+
+    for path in files:
+        path.unlink()
+    for folder in folders:
+        (folder / MARKER).unlink(missing_ok=True)
+        try:
+            folder.rmdir()
+        except OSError:
+            logger.warning("archived %s but it is not empty", folder)
+    return len(files)
+
+
+def _pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run(today: date | None = None) -> ArchiveRun:
+    """One archival pass over every user's day folders. Safe to repeat; a second pass finds nothing to do."""
+    today = today or date.today()
+    result = ArchiveRun(pillow=_pillow_available())
+    root = settings.upload_dir
+    if not root.exists():
+        return result
+    recompress_before = today - timedelta(days=settings.archive_recompress_after_days)
+    pack_before = today - timedelta(days=settings.archive_pack_after_days)
+    recompress = settings.archive_recompress_after_days > 0 and result.pillow
+    if settings.archive_recompress_after_days > 0 and not result.pillow:
+        logger.warning("Pillow is not installed; old photos are packed but not recompressed")
+
+    with file_lock(_lock_path(), blocking=False) as acquired:
+        if not acquired:
+            logger.info("archival already running in another process")
+            return result
+        for prefix, base in _prefixes(root):
+            months: dict[str, list[Path]] = {}
+            for day, folder in _day_folders(base):
+                # A month is packed once, when all of it is old enough, so its ZIP never changes again.
+                pack = settings.archive_pack_after_days > 0 and _month_end(day) < pack_before
+                if recompress and (day < recompress_before or pack) and _read_marker(folder) is None:
+                    stats = _recompress_folder(folder)
+                    result.recompressed += stats["files"]
+                    result.bytes_before += stats["before"]
+                    result.bytes_after += stats["after"]
+                if pack:
+                    months.setdefault(folder.name[:6], []).append(folder)
+            for month, folders in months.items():
+                result.packed += _pack_month(prefix, month, folders)
+                result.archives += 1
+        _last_run_path().write_text(datetime.now().isoformat(timespec="seconds"), encoding="utf-8")
+    logger.info(
+        "archival: %d photo(s) recompressed (%d -> %d bytes), %d file(s) packed into %d archive(s)",
+        result.recompressed, result.bytes_before, result.bytes_after, result.packed, result.archives,
+    )
+    return result
+
+
+def report() -> dict[str, Any]:
+    """Disk use of the upload dir and what archival saved, including for backups.
+
+    A backup pass stats every file under the upload dir and re-reads changed ones, so its cost
+    follows the file count (every incremental run) and the byte count (first run, changed files).
+    The walk below is timed the same way; the "before" time is scaled from it by file count.
+    """
+    root = settings.upload_dir
+    out = {
+        "files": 0, "bytes": 0, "loose_files": 0, "archives": 0, "archive_bytes": 0, "packed_files": 0,
+        "recompressed": 0, "recompressed_before": 0, "recompressed_after": 0,
+    }
+    if not root.exists():
+        return {**out, "files_before": 0, "bytes_before": 0, "walk_ms": 0.0, "walk_ms_before": 0.0}
+
+    t0 = time.perf_counter()
+    paths = [p for p in root.rglob("*") if p.is_file()]
+    sizes = [p.stat().st_size for p in paths]
+    walk_ms = (time.perf_counter() - t0) * 1000
+
+    for path, size in zip(paths, sizes):
+        out["files"] += 1
+        out["bytes"] += size
+        if path.name == MARKER:
+            stats = json.loads(path.read_text(encoding="utf-8"))
+        elif path.name.endswith(".index.json") and path.parent.name == ARCHIVE_DIR:
+            index = json.loads(path.read_text(encoding="utf-8"))
+            out["packed_files"] += len(index["members"])
+            stats = index.get("recompressed", {})
+        else:
+            if path.suffix == ".zip" and path.parent.name == ARCHIVE_DIR:
+                out["archives"] += 1
+                out["archive_bytes"] += size
+            elif not path.name.startswith("."):
+                out["loose_files"] += 1
+            continue
+        out["recompressed"] += stats.get("files", 0)
+        out["recompressed_before"] += stats.get("before", 0)
+        out["recompressed_after"] += stats.get("after", 0)
+
+    # Without archival every packed photo would still be a file of its own, at its original size,
+    # and there would be no archives, indexes or markers.
+    bookkeeping = sum(1 for p in paths if p.name == MARKER) + 2 * out["archives"]
+    files_before = out["files"] - bookkeeping + out["packed_files"]
+    out["files_before"] = files_before
+    out["bytes_before"] = out["bytes"] + out["recompressed_before"] - out["recompressed_after"]
+    out["walk_ms"] = walk_ms
+    out["walk_ms_before"] = walk_ms * files_before / out["files"] if out["files"] else 0.0
+    return out
+
+
+class ArchiveScheduler:
+    """Periodic archival thread; with several workers only the one holding the lock file runs it."""
+
+    def __init__(self, interval_hours: float) -> None:
+        self.interval_s = interval_hours * 3600
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="archive-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _due_in(self) -> float:
+        """Seconds until the next pass, counted from the last one so restarts don't postpone it."""
+        last = last_run()
+        if last is None:
+            return 0.0
+        return max(0.0, self.interval_s - (datetime.now() - last).total_seconds())
+
+    def _run(self) -> None:
+        with file_lock(settings.upload_dir.parent / ".archive-scheduler.lock", blocking=False) as acquired:
+            if not acquired:
+                return
+            delay = self._due_in()
+            while not self._stop.wait(delay):
+                delay = self.interval_s
+                try:
+                    run()
+                except Exception:
+                    logger.exception("upload archival failed")
+
+
+def _mb(n: float) -> str:
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Recompress and pack old upload files.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("run", help="archive now, then print the report")
+    sub.add_parser("report", help="show disk and backup savings")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "run":
+        result = run()
+        if not result.pillow:
+            print("Pillow is not installed: photos were packed but not recompressed")
+        print(
+            f"recompressed {result.recompressed} photo(s), {_mb(result.bytes_before)} -> {_mb(result.bytes_after)}; "
+            f"packed {result.packed} file(s) into {result.archives} archive(s)"
+        )
+    r = report()
+    saved = r["recompressed_before"] - r["recompressed_after"]
+    print(
+        f"uploads: {r['files']} files, {_mb(r['bytes'])} "
+        f"({r['loose_files']} loose, {r['packed_files']} packed in {r['archives']} month archive(s), "
+        f"{_mb(r['archive_bytes'])})"
+    )
+    print(
+        f"recompressed: {r['recompressed']} photo(s), {_mb(r['recompressed_before'])} -> "
+        f"{_mb(r['recompressed_after'])} (saved {_mb(saved)}"
+        + (f", {saved / r['recompressed_before']:.0%})" if r["recompressed_before"] else ")")
+    )
+    print(
+        f"backup: checks {r['files']} files instead of {r['files_before']} "
+        f"(walk {r['walk_ms']:.1f} ms now, ~{r['walk_ms_before']:.1f} ms before); "
+        f"a full backup copies {_mb(r['bytes'])} instead of {_mb(r['bytes_before'])}"
+    )
+
+
+if __name__ == "__main__":
+    main()
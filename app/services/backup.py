@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Date, DateTime, LargeBinary, select
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.db import engine, file_lock
+from app.models import Base
+from app.services.export import to_plain
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+SQLITE_FILE = "data.sqlite"
+DUMP_FILE = "dump.ndjson.gz"
+BACKUP_PAGES_PER_STEP = 256
+HASH_BLOCK = 1024 * 1024
+STAMP_FORMAT = "%Y%m%dT%H%M%S"  # snapshot directory names, followed by ".<microseconds>"
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while block := f.read(HASH_BLOCK):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _snapshots_dir(root: Path) -> Path:
+    return root / "snapshots"
+
+
+def _object_path(root: Path, sha: str) -> Path:
+    return root / "objects" / sha[:2] / sha
+
+
+def _sqlite_path(eng: Engine) -> Path:
+    db = eng.url.database
+    if not db or db == ":memory:":
+        raise BackupError("in-memory SQLite databases cannot be backed up")
+    return Path(db)
+
+
+def _backup_sqlite(eng: Engine, dest: Path) -> None:
+    # The online backup API copies a few pages per step and releases the read lock in between,
+    # so writers are only ever blocked for one step.
+    src = sqlite3.connect(str(_sqlite_path(eng)))
+    dst = sqlite3.connect(str(dest))
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=0.005)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _dump_logical(eng: Engine, dest: Path) -> None:
+    """Dump every table as NDJSON records from one consistent read snapshot (no mysqldump needed)."""
+    with eng.connect() as conn, gzip.open(dest, "wt", encoding="utf-8") as out:
+        if eng.dialect.name == "mysql":
+            conn.exec_driver_sql("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            conn.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        for table in Base.metadata.sorted_tables:
+            out.write(json.dumps({"table": table.name}) + "\n")
+            result = conn.execution_options(yield_per=500).execute(select(table))
+            for row in result:
+                out.write(json.dumps([to_plain(v) for v in row], ensure_ascii=False) + "\n")
+        conn.rollback()
+
+
+def _restore_logical(eng: Engine, src: Path) -> None:
+    tables = {t.name: t for t in Base.metadata.sorted_tables}
+    with eng.begin() as conn, gzip.open(src, "rt", encoding="utf-8") as f:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+        table = None
+        batch: list[dict[str, Any]] = []
+        for line in f:
+            rec = json.loads(line)
+            if isinstance(rec, dict):
+                if batch:
+                    conn.execute(table.insert(), batch)
+                    batch = []
+                table = tables[rec["table"]]
+                continue
+            row = {}
+            for col, v in zip(table.columns, rec):
+                if v is not None and isinstance(col.type, DateTime):
+                    v = datetime.fromisoformat(v)
+                elif v is not None and isinstance(col.type, Date):
+                    v = date.fromisoformat(v)
+                elif v is not None and isinstance(col.type, LargeBinary):
+                    v = base64.b64decode(v)
+                row[col.name] = v
+            batch.append(row)
+            if len(batch) >= 500:
+                conn.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(table.insert(), batch)
+
+
+def _latest_manifest(root: Path) -> dict[str, Any] | None:
+    snaps = list_snapshots(root)
+    if not snaps:
+        return None
+    return json.loads((snaps[-1] / MANIFEST).read_text(encoding="utf-8"))
+
+
+def _sync_uploads(root: Path, upload_dir: Path, previous: dict[str, Any] | None) -> dict[str, dict[str, Any]]:
+    """rsync-style pass: only files whose size/mtime changed are re-hashed and copied."""
+    known = (previous or {}).get("uploads", {})
+    entries: dict[str, dict[str, Any]] = {}
+    if not upload_dir.exists():
+        return entries
+    for path in sorted(upload_dir.rglob("*")):
+        if not path.is_file():
+            continue
+        rel = path.relative_to(upload_dir).as_posix()
+        st = path.stat()
+        old = known.get(rel)
+        if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns:
+            sha = old["sha256"]
+        else:
+            sha = _sha256(path)
+        obj = _object_path(root, sha)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = obj.with_suffix(".tmp")
+            shutil.copy2(path, tmp)
+            tmp.replace(obj)
+        entries[rel] = {"sha256": sha, "size": st.st_size, "mtime": st.st_mtime_ns}
+    return entries
+
+
+def list_snapshots(root: Path | None = None) -> list[Path]:
+    base = _snapshots_dir(root or settings.backup_dir)
+    if not base.exists():
+        return []
+    return sorted(p for p in base.iterdir() if (p / MANIFEST).exists())
+
+
+def create_snapshot(root: Path | None = None, eng: Engine = engine) -> Path:
+    root = root or settings.backup_dir
+    previous = _latest_manifest(root)
+    now = datetime.now()
+    # Microseconds keep two snapshots taken in the same second apart; mkdir() fails rather than merging them.
+    stamp = f"{now.strftime(STAMP_FORMAT)}.{now.microsecond:06d}"
+    work = _snapshots_dir(root) / f".{stamp}.partial"
+    _snapshots_dir(root).mkdir(parents=True, exist_ok=True)
+    work.mkdir()
+
+    if eng.dialect.name == "sqlite":
+        db_file = SQLITE_FILE
+        _backup_sqlite(eng, work / db_file)
+    else:
+        db_file = DUMP_FILE
+        _dump_logical(eng, work / db_file)
+
+    manifest = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "dialect": eng.dialect.name,
+        "db_file": db_file,
+        "db_sha256": _sha256(work / db_file),
+        "uploads": _sync_uploads(root, settings.upload_dir, previous),
+    }
+    (work / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    final = _snapshots_dir(root) / stamp
+    work.rename(final)
+    return final
+
+
+def prune(root: Path | None = None, keep: int | None = None) -> None:
+    """Drop old snapshots beyond `keep` and any upload objects no remaining manifest references."""
+    root = root or settings.backup_dir
+    keep = settings.backup_keep if keep is None else keep
+    snaps = list_snapshots(root)
+    for snap in snaps[: max(0, len(snaps) - keep)]:
+        shutil.rmtree(snap)
+    live: set[str] = set()
+    for snap in list_snapshots(root):
+        manifest = json.loads((snap / MANIFEST).read_text(encoding="utf-8"))
+        live.update(e["sha256"] for e in manifest["uploads"].values())
+    objects = root / "objects"
+    if objects.exists():
+        for obj in objects.glob("*/*"):
+            if obj.name not in live:
+                obj.unlink()
+
+
+def verify_snapshot(snapshot: Path, root: Path | None = None) -> list[str]:
+    """Return a list of problems; empty means every checksum matches."""
+    root = root or snapshot.parent.parent
+    manifest = json.loads((snapshot / MANIFEST).read_text(encoding="utf-8"))
+    problems: list[str] = []
+    db_path = snapshot / manifest["db_file"]
+    if not db_path.exists() or _sha256(db_path) != manifest["db_sha256"]:
+        problems.append(f"database file {manifest['db_file']} checksum mismatch")
+    for rel, entry in manifest["uploads"].items():
+        obj = _object_path(root, entry["sha256"])
+        if not obj.exists() or _sha256(obj) != entry["sha256"]:
+            problems.append(f"upload {rel} missing or corrupt")
+    return problems
+
+
+def restore_snapshot(snapshot: Path, root: Path | None = None, eng: Engine = engine) -> None:
+    problems = verify_snapshot(snapshot, root)
+    if problems:
+        raise BackupError("refusing to restore: " + "; ".join(problems))
+    root = root or snapshot.parent.parent
+    manifest = json.loads((snapshot / MANIFEST).read_text(encoding="utf-8"))
+    if manifest["db_file"] == SQLITE_FILE and eng.dialect.name != "sqlite":
+        raise BackupError(f"snapshot is {manifest['dialect']}, target database is {eng.dialect.name}")
+
+    if manifest["db_file"] == SQLITE_FILE:
+        eng.dispose()
+        src = sqlite3.connect(str(snapshot / SQLITE_FILE))
+        dst = sqlite3.connect(str(_sqlite_path(eng)))
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    else:
+        _restore_logical(eng, snapshot / DUMP_FILE)
+
+    for rel, entry in manifest["uploads"].items():
+        target = settings.upload_dir / rel
+        if target.exists() and target.stat().st_size == entry["size"] and _sha256(target) == entry["sha256"]:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(_object_path(root, entry["sha256"]), target)
+
+
+class BackupScheduler:
+    """Periodic snapshot thread; with several workers only the one holding the lock file runs it."""
+
+    def __init__(self, interval_hours: float) -> None:
+        self.interval_s = interval_hours * 3600
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _due_in(self) -> float:
+        """Seconds until the next snapshot, counted from the newest one so restarts don't postpone it."""
+        snaps = list_snapshots()
+        if not snaps:
+            return 0.0
+        try:
+            last = datetime.strptime(snaps[-1].name.partition(".")[0], STAMP_FORMAT)
+        except ValueError:
+            return 0.0
+        return max(0.0, self.interval_s - (datetime.now() - last).total_seconds())
+
+    def _run(self) -> None:
+        with file_lock(settings.backup_dir / ".scheduler.lock", blocking=False) as acquired:
+            if not acquired:
+                return
+            delay = self._due_in()
+            while not self._stop.wait(delay):
+                delay = self.interval_s
+                try:
+                    path = create_snapshot()
+                    prune()
+                    logger.info("backup snapshot written to %s", path)
+                except Exception:
+                    logger.exception("backup snapshot failed")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Online backup and verified restore for project_80.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("snapshot", help="take a snapshot now")
+    sub.add_parser("list", help="list snapshots")
+    p_verify = sub.add_parser("verify", help="check all checksums of a snapshot")
+    p_verify.add_argument("snapshot")
+    p_restore = sub.add_parser("restore", help="verify then restore a snapshot (stop the app first)")
+    p_restore.add_argument("snapshot")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "snapshot":
+        print(create_snapshot())
+        prune()
+    elif args.cmd == "list":
+        for snap in list_snapshots():
+            print(snap.name)
+    else:
+        snap = Path(args.snapshot)
+        if not snap.is_absolute() and not snap.exists():
+            snap = _snapshots_dir(settings.backup_dir) / args.snapshot
+        if args.cmd == "verify":
+            problems = verify_snapshot(snap)
+            for p in problems:
+                print(p)
+            raise SystemExit(1 if problems else 0)
+        restore_snapshot(snap)
+        print(f"restored {snap.name}")
+
+
+if __name__ == "__main__":
+    main()
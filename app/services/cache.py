@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Hashable
+
+VERSION_DIR = Path("storage")
+
+
+def _version_file(user_id: int, scope: str) -> Path:
+    return VERSION_DIR / f".{scope}_version.{user_id}"
+
+
+def data_version(user_id: int, scope: str = "data") -> int:
+    """Monotonic stamp of the user's last data write, shared by every worker on this host via a small file.
+
+    Versions are per user so one family member's writes don't invalidate everyone else's caches. A
+    narrower `scope` (e.g. "metrics") is bumped only by writes to that kind of data.
+    """
+    try:
+        return int(_version_file(user_id, scope).read_text() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_data_version(user_id: int, scope: str = "data") -> int:
+    version = time.time_ns()
+    path = _version_file(user_id, scope)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per writer: request threads and job workers bump concurrently.
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(str(version))
+    tmp.replace(path)
+    return version
+
+
+class LRUCache:
+    """Small thread-safe LRU; callers put the data version in the key so stale entries just age out."""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, object] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], object]) -> object:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        value = factory()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
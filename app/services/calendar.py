@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import date, timedelta
+from functools import lru_cache
 
 
 @dataclass(frozen=True)
@@ -10,26 +11,47 @@ class CalendarDay:
     in_month: bool
 
 
+@dataclass(frozen=True)
+class YearLayout:
+    """Week columns (Monday first) covering a whole year, plus the column where each month starts."""
+
+    year: int
+    weeks: tuple[tuple[CalendarDay, ...], ...]
+    month_starts: tuple[tuple[int, int], ...]  # (month, week column)
+
+    @property
+    def first(self) -> date:
+        return date(self.year, 1, 1)
+
+    @property
+    def last(self) -> date:
+        return date(self.year, 12, 31)
+
+
+@lru_cache(maxsize=64)
+def _weeks(first: date, last: date) -> tuple[tuple[CalendarDay, ...], ...]:
+    """Monday-to-Sunday weeks covering first..last; days outside the range are marked `in_month=False`."""
+    start = first - timedelta(days=first.weekday())
+    end = last + timedelta(days=(6 - last.weekday()))
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    cells = [CalendarDay(day=d, in_month=first <= d <= last) for d in days]
+    return tuple(tuple(cells[i : i + 7]) for i in range(0, len(cells), 7))
+
+
 def month_grid(year: int, month: int) -> list[list[CalendarDay]]:
     first = date(year, month, 1)
-    start = first - timedelta(days=first.weekday())  # Monday start
-
     if month == 12:
         next_month = date(year + 1, 1, 1)
     else:
         next_month = date(year, month + 1, 1)
     last = next_month - timedelta(days=1)
+    return [list(week) for week in _weeks(first, last)]
 
-    end = last + timedelta(days=(6 - last.weekday()))
-
-    days: list[CalendarDay] = []
-    cur = start
-    while cur <= end:
-        days.append(CalendarDay(day=cur, in_month=(cur.month == month)))
-        cur += timedelta(days=1)
-
-    weeks: list[list[CalendarDay]] = []
-    for i in range(0, len(days), 7):
-        weeks.append(days[i : i + 7])
-    return weeks
 
+@lru_cache(maxsize=16)
+def year_layout(year: int) -> YearLayout:
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    weeks = _weeks(first, last)
+    offset = first.weekday()
+    month_starts = tuple((m, (offset + (date(year, m, 1) - first).days) // 7) for m in range(1, 13))
+    return YearLayout(year=year, weeks=weeks, month_starts=month_starts)
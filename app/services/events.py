@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import DailySummary, UserSettings
+from app.services.cache import data_version
+
+QUEUE_SIZE = 16
+
+
+def fasting_payload(last_meal_end_at: datetime | None) -> dict[str, Any]:
+    return {"last_meal_end_at": last_meal_end_at.isoformat() if last_meal_end_at else None}
+
+
+def summary_payload(summary: DailySummary | None, day: date) -> dict[str, Any]:
+    if summary is None:
+        return {"day": day.isoformat(), "color": None, "reasons": "", "commentary": ""}
+    return {
+        "day": summary.day.isoformat(),
+        "color": summary.color.value,
+        "reasons": summary.reasons,
+        "commentary": summary.commentary,
+    }
+
+
+def format_sse(event: str, data: dict[str, Any]) -> str:
+    payload = dict(data, server_now=datetime.now().isoformat(timespec="seconds"))
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class Broadcaster:
+    """Fan-out of small state changes to SSE subscribers in this process.
+
+    `publish` is thread-safe so the sync (threadpool) routes can call it directly. The latest
+    payload per event is kept, so new subscribers get a snapshot without touching the DB and
+    publishing an unchanged payload is a no-op. With several workers each one has its own
+    broadcaster and only sees its own publishes, so the snapshot is tagged with the user's data
+    version it was loaded at; a write through another worker moves that version and the next
+    subscriber here reloads from the DB.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.version: int | None = None  # data version the snapshot was loaded at
+        self._state: dict[str, dict[str, Any]] = {}
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+    def publish(self, event: str, data: dict[str, Any]) -> None:
+        with self._lock:
+            if self._state.get(event) == data:
+                return
+            self._state[event] = data
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, (event, data))
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return dict(self._state)
+
+    def has(self, *events: str) -> bool:
+        with self._lock:
+            return all(e in self._state for e in events)
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _offer(queue: asyncio.Queue, item: tuple[str, dict[str, Any]]) -> None:
+    # A client too slow to drain 16 updates just misses intermediate states; the next one supersedes them.
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        pass
+
+
+_broadcasters: dict[int, Broadcaster] = {}
+_broadcasters_lock = threading.Lock()
+
+
+def broadcaster_for(user_id: int) -> Broadcaster:
+    """One broadcaster per user, so a member's dashboard only ever sees their own state."""
+    with _broadcasters_lock:
+        b = _broadcasters.get(user_id)
+        if b is None:
+            b = _broadcasters[user_id] = Broadcaster()
+        return b
+
+
+def publish_fasting(user_id: int, last_meal_end_at: datetime | None) -> None:
+    broadcaster_for(user_id).publish("fasting", fasting_payload(last_meal_end_at))
+
+
+def publish_summary(user_id: int, summary: DailySummary) -> None:
+    """Only yesterday's summary is shown live on the dashboard, so other days are ignored."""
+    if summary.day == date.today() - timedelta(days=1):
+        broadcaster_for(user_id).publish("summary", summary_payload(summary, summary.day))
+
+
+def publish_data(user_id: int, version: int) -> None:
+    """Tell pages that cached fragments built before `version` are stale."""
+    broadcaster_for(user_id).publish("data", {"version": str(version)})
+
+
+def load_state(db: Session, user_id: int) -> None:
+    """Seed the broadcaster from the DB; called when a subscriber finds no cached or only stale state."""
+    version = data_version(user_id)  # read before loading: a racing write leaves it stale, not wrong
+    yesterday = date.today() - timedelta(days=1)
+    last_meal_end_at = db.execute(
+        select(UserSettings.last_meal_end_at).where(UserSettings.user_id == user_id)
+    ).scalar_one_or_none()
+    summary = db.execute(select(DailySummary).where(DailySummary.day == yesterday)).scalar_one_or_none()
+    b = broadcaster_for(user_id)
+    b.publish("fasting", fasting_payload(last_meal_end_at))
+    b.publish("summary", summary_payload(summary, yesterday))
+    b.version = version
+
+
+def needs_load(user_id: int) -> bool:
+    b = broadcaster_for(user_id)
+    state = b.snapshot()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    if "fasting" not in state or state.get("summary", {}).get("day") != yesterday:
+        return True
+    return b.version != data_version(user_id)  # written through another worker (or its job pool) since
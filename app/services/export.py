@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import csv
+import enum
+import io
+import json
+import sys
+import time
+import zipfile
+from datetime import date, datetime
+from typing import Any, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Base, DailyMetrics, DailySummary, FoodLog, LabMetric, LabReport, MedicationLog
+from app.services.uploads import iter_bytes, locate
+
+EXPORT_TABLES: dict[str, type[Base]] = {
+    "daily_metrics": DailyMetrics,
+    "food_logs": FoodLog,
+    "medications": MedicationLog,
+    "lab_metrics": LabMetric,
+    "lab_reports": LabReport,
+    "daily_summary": DailySummary,
+}
+EXPORT_FORMATS = ("csv", "ndjson")
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson", "zip": "application/zip"}
+
+YIELD_PER = 500
+CHUNK_BYTES = 64 * 1024
+
+
+def to_plain(v: Any) -> Any:
+    if isinstance(v, enum.Enum):
+        return v.value
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, (bytes, memoryview)):
+        return base64.b64encode(bytes(v)).decode("ascii")
+    return v
+
+
+def iter_rows(db: Session, model: type[Base]) -> Iterator[dict[str, Any]]:
+    """Yield one plain dict per row, fetched through a server-side cursor in `YIELD_PER` batches."""
+    columns = list(model.__table__.columns)
+    # Selecting from the entity (not just its table) lets a user-bound session scope the rows.
+    stmt = select(*columns).select_from(model).order_by(model.id).execution_options(yield_per=YIELD_PER)
+    for row in db.execute(stmt):
+        yield {c.name: to_plain(v) for c, v in zip(columns, row)}
+
+
+def _chunked(lines: Iterator[str]) -> Iterator[bytes]:
+    buf: list[str] = []
+    size = 0
+    first = True
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        # Flush the very first line right away so the client sees bytes before the scan finishes.
+        if first or size >= CHUNK_BYTES:
+            yield "".join(buf).encode("utf-8")
+            buf.clear()
+            size = 0
+            first = False
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def _csv_lines(db: Session, model: type[Base]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([c.name for c in model.__table__.columns])
+    for row in iter_rows(db, model):
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+        writer.writerow(row.values())
+    yield out.getvalue()
+
+
+def _ndjson_lines(db: Session, model: type[Base]) -> Iterator[str]:
+    for row in iter_rows(db, model):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_table(db: Session, table: str, fmt: str) -> Iterator[bytes]:
+    model = EXPORT_TABLES[table]
+    lines = _csv_lines(db, model) if fmt == "csv" else _ndjson_lines(db, model)
+    return _chunked(lines)
+
+
+class _Pipe(io.RawIOBase):
+    """Write-only, non-seekable sink; zipfile then emits data descriptors instead of seeking back."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:  # type: ignore[override]
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _referenced_uploads(db: Session) -> Iterator[str]:
+    for model in (FoodLog, LabReport):
+        stmt = select(model.image_path).where(model.image_path.is_not(None)).execution_options(yield_per=YIELD_PER)
+        for (rel,) in db.execute(stmt):
+            yield rel
+
+
+def iter_zip(db: Session, fmt: str, include_uploads: bool = True) -> Iterator[bytes]:
+    """Stream every export table (plus referenced upload files) as one ZIP archive."""
+    pipe = _Pipe()
+    stamp = datetime.now().timetuple()[:6]
+    with zipfile.ZipFile(pipe, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for table in EXPORT_TABLES:
+            zinfo = zipfile.ZipInfo(f"{table}.{fmt}", date_time=stamp)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(zinfo, mode="w", force_zip64=True) as entry:
+                for chunk in iter_table(db, table, fmt):
+                    entry.write(chunk)
+                    yield pipe.drain()
+        if include_uploads:
+            for rel in _referenced_uploads(db):
+                item = locate(rel)  # a file of its own, or a member of a month archive
+                if item is None:
+                    continue
+                zinfo = zipfile.ZipInfo(f"uploads/{rel}", date_time=time.localtime(item.mtime_ns / 1e9)[:6])
+                zinfo.compress_type = zipfile.ZIP_STORED  # photos/PDFs are already compressed
+                with zf.open(zinfo, mode="w", force_zip64=True) as entry:
+                    for block in iter_bytes(item, CHUNK_BYTES):
+                        entry.write(block)
+                        yield pipe.drain()
+    yield pipe.drain()
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app.db import SessionLocal
+    from app.services.users import user_id_for
+
+    parser = argparse.ArgumentParser(description="Export project_80 data as CSV/NDJSON or a ZIP bundle.")
+    parser.add_argument("--table", choices=sorted(EXPORT_TABLES), help="single table to export")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--zip", action="store_true", help="bundle all tables and referenced uploads")
+    parser.add_argument("--no-uploads", action="store_true", help="with --zip, skip upload files")
+    parser.add_argument("--user", help="export only this user's rows (default: every user)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+    if not args.zip and not args.table:
+        parser.error("either --table or --zip is required")
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        with SessionLocal() as db:
+            if args.user:
+                uid = user_id_for(db, args.user)
+                if uid is None:
+                    parser.error(f"no such user: {args.user}")
+                db.info["user_id"] = uid
+            if args.zip:
+                chunks = iter_zip(db, args.format, include_uploads=not args.no_uploads)
+            else:
+                chunks = iter_table(db, args.table, args.format)
+            for chunk in chunks:
+                out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
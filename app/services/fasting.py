@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models import FastingWindow, FoodLog, User
+
+TARGET_HOURS = 16.0
+# A longer gap almost always means meals were not logged, so it is kept out of the statistics.
+MAX_PLAUSIBLE_HOURS = 48.0
+HISTOGRAM_EDGES = (12.0, 14.0, 16.0, 18.0, 20.0)
+
+
+@dataclass(frozen=True)
+class FastingStats:
+    days: int  # days with at least one plausible window
+    compliant_days: int  # days whose longest window reached TARGET_HOURS
+    avg_longest_hours: float | None
+    max_hours: float | None
+    current_streak: int
+    longest_streak: int
+    histogram: list[tuple[str, int]]  # longest window per day, bucketed by HISTOGRAM_EDGES
+
+    @property
+    def compliance_rate(self) -> float | None:
+        return self.compliant_days / self.days if self.days else None
+
+
+def _end(meal_end_at: datetime | None, eaten_at: datetime) -> datetime:
+    return meal_end_at if meal_end_at is not None and meal_end_at > eaten_at else eaten_at
+
+
+def _window(prev: tuple[int, datetime, datetime | None], nxt: tuple[int, datetime, datetime | None]) -> FastingWindow | None:
+    prev_id, prev_eaten, prev_end = prev
+    next_id, next_eaten, _ = nxt
+    start = _end(prev_end, prev_eaten)
+    if next_eaten <= start:
+        return None  # overlapping entries, no fast in between
+    return FastingWindow(
+        prev_meal_id=prev_id,
+        next_meal_id=next_id,
+        start_at=start,
+        end_at=next_eaten,
+        hours=(next_eaten - start).total_seconds() / 3600.0,
+        day=next_eaten.date(),
+    )
+
+
+def rebuild_windows(db: Session) -> int:
+    """Recompute every window with one ordered scan of food_logs."""
+    db.execute(delete(FastingWindow))
+    stmt = (
+        select(FoodLog.id, FoodLog.eaten_at, FoodLog.meal_end_at)
+        .order_by(FoodLog.eaten_at, FoodLog.id)
+        .execution_options(yield_per=1000)
+    )
+    prev = None
+    count = 0
+    for row in db.execute(stmt):
+        cur = tuple(row)
+        if prev is not None:
+            w = _window(prev, cur)
+            if w is not None:
+                db.add(w)
+                count += 1
+        prev = cur
+    db.flush()
+    return count
+
+
+def add_meal(db: Session, log: FoodLog) -> None:
+    """Split the window the new meal falls into (or extend the ends) in O(log n): two neighbour lookups."""
+    cols = (FoodLog.id, FoodLog.eaten_at, FoodLog.meal_end_at)
+    before = or_(FoodLog.eaten_at < log.eaten_at, and_(FoodLog.eaten_at == log.eaten_at, FoodLog.id < log.id))
+    after = or_(FoodLog.eaten_at > log.eaten_at, and_(FoodLog.eaten_at == log.eaten_at, FoodLog.id > log.id))
+    prev = db.execute(select(*cols).where(before).order_by(FoodLog.eaten_at.desc(), FoodLog.id.desc()).limit(1)).first()
+    nxt = db.execute(select(*cols).where(after).order_by(FoodLog.eaten_at, FoodLog.id).limit(1)).first()
+    cur = (log.id, log.eaten_at, log.meal_end_at)
+
+    if nxt is not None:
+        db.execute(delete(FastingWindow).where(FastingWindow.next_meal_id == nxt[0]))
+    for a, b in ((prev, cur), (cur, nxt)):
+        if a is not None and b is not None:
+            w = _window(tuple(a), tuple(b))
+            if w is not None:
+                db.add(w)
+
+
+def daily_longest(db: Session, start: date, end: date) -> dict[date, float]:
+    rows = db.execute(
+        select(FastingWindow.day, func.max(FastingWindow.hours))
+        .where(FastingWindow.day >= start, FastingWindow.day <= end, FastingWindow.hours <= MAX_PLAUSIBLE_HOURS)
+        .group_by(FastingWindow.day)
+    ).all()
+    return {d: float(h) for d, h in rows}
+
+
+def _bucket_label(i: int) -> str:
+    if i == 0:
+        return f"<{HISTOGRAM_EDGES[0]:g}h"
+    if i == len(HISTOGRAM_EDGES):
+        return f"≥{HISTOGRAM_EDGES[-1]:g}h"
+    return f"{HISTOGRAM_EDGES[i - 1]:g}-{HISTOGRAM_EDGES[i]:g}h"
+
+
+def fasting_stats(db: Session, start: date, end: date) -> FastingStats:
+    """Compliance, streaks and distribution of each day's longest fast, from one GROUP BY over the windows."""
+    longest = daily_longest(db, start, end)
+    compliant = {d for d, h in longest.items() if h >= TARGET_HOURS}
+
+    best = run = 0
+    cur = start
+    while cur <= end:
+        run = run + 1 if cur in compliant else 0
+        best = max(best, run)
+        cur += timedelta(days=1)
+    # The streak still counts if the current day has not broken its fast yet.
+    current = 0
+    cur = end if end in longest else end - timedelta(days=1)
+    while cur >= start and cur in compliant:
+        current += 1
+        cur -= timedelta(days=1)
+
+    counts = [0] * (len(HISTOGRAM_EDGES) + 1)
+    for h in longest.values():
+        counts[sum(1 for edge in HISTOGRAM_EDGES if h >= edge)] += 1
+
+    values = list(longest.values())
+    return FastingStats(
+        days=len(longest),
+        compliant_days=len(compliant),
+        avg_longest_hours=sum(values) / len(values) if values else None,
+        max_hours=max(values) if values else None,
+        current_streak=current,
+        longest_streak=best,
+        histogram=[(_bucket_label(i), n) for i, n in enumerate(counts)],
+    )
+
+
+def ensure_fasting_windows(engine: Engine) -> None:
+    """Backfill each user's windows once for databases that predate the table."""
+    with Session(engine) as db:
+        user_ids = list(db.execute(select(User.id)).scalars())
+    for uid in user_ids:
+        with Session(engine, info={"user_id": uid}) as db:
+            if db.execute(select(FastingWindow.id).limit(1)).first() is not None:
+                continue
+            if db.execute(select(func.count(FoodLog.id))).scalar_one() < 2:
+                continue
+            rebuild_windows(db)
+            db.commit()
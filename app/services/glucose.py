@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import math
+import sys
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, Literal
+
+from pydantic import BaseModel, Field, model_validator
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, defer
+
+from app.models import GlucoseDay
+
+MGDL_PER_MMOL = 18.0
+LOW_MMOL = 3.9  # 70 mg/dL
+HIGH_MMOL = 10.0  # 180 mg/dL
+MAX_BATCH = 20_000
+MIN_COVERAGE = 144  # readings (12h at 5-minute intervals) before a day's CGM data is used for the summary
+
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+class Reading(BaseModel):
+    at: datetime
+    mmol_l: float | None = Field(None, gt=0, lt=600)
+    mg_dl: float | None = Field(None, gt=0, lt=10_000)
+
+    @model_validator(mode="after")
+    def _one_value(self) -> "Reading":
+        if (self.mmol_l is None) == (self.mg_dl is None):
+            raise ValueError("exactly one of mmol_l or mg_dl is required")
+        return self
+
+    @property
+    def mmol(self) -> float:
+        return self.mmol_l if self.mmol_l is not None else self.mg_dl / MGDL_PER_MMOL
+
+
+class GlucoseBatch(BaseModel):
+    readings: list[Reading] = Field(max_length=MAX_BATCH)
+
+
+@dataclass(frozen=True)
+class GlucoseStats:
+    n: int
+    mean: float | None
+    sd: float | None
+    min: float | None
+    max: float | None
+    time_in_range: float | None  # share of readings within LOW_MMOL..HIGH_MMOL
+    time_below: float | None
+    time_above: float | None
+
+    @property
+    def gmi(self) -> float | None:
+        """Glucose management indicator (estimated HbA1c %) from the mean."""
+        return None if self.mean is None else 3.31 + 0.02392 * self.mean * MGDL_PER_MMOL
+
+
+def _local_naive(dt: datetime) -> datetime:
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo is not None else dt
+
+
+def _pack(a: array) -> bytes:
+    if _BIG_ENDIAN:
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _unpack(typecode: str, raw: bytes) -> array:
+    a = array(typecode)
+    a.frombytes(raw)
+    if _BIG_ENDIAN:
+        a.byteswap()
+    return a
+
+
+def unpack_day(row: GlucoseDay) -> tuple[array, array]:
+    """(seconds since midnight, centi-mmol/L) arrays for one stored day."""
+    return _unpack("I", row.seconds), _unpack("H", row.centi_mmol)
+
+
+def _store(row: GlucoseDay, readings: dict[int, int]) -> None:
+    secs = array("I", sorted(readings))
+    vals = array("H", (readings[s] for s in secs))
+    row.seconds = _pack(secs)
+    row.centi_mmol = _pack(vals)
+
+    mmol = [v / 100 for v in vals]
+    row.n = len(mmol)
+    row.n_low = sum(1 for v in mmol if v < LOW_MMOL)
+    row.n_high = sum(1 for v in mmol if v > HIGH_MMOL)
+    row.n_in_range = row.n - row.n_low - row.n_high
+    row.sum_mmol = sum(mmol)
+    row.sum_sq_mmol = sum(v * v for v in mmol)
+    row.min_mmol = min(mmol) if mmol else None
+    row.max_mmol = max(mmol) if mmol else None
+
+
+def _group(readings: Iterable[tuple[datetime, float]]) -> dict[date, dict[int, int]]:
+    by_day: dict[date, dict[int, int]] = {}
+    for at, mmol in readings:
+        at = _local_naive(at)
+        secs = at.hour * 3600 + at.minute * 60 + at.second
+        by_day.setdefault(at.date(), {})[secs] = min(round(mmol * 100), 0xFFFF)
+    return by_day
+
+
+def _merge(db: Session, by_day: dict[date, dict[int, int]]) -> dict[date, int]:
+    existing = {
+        row.day: row
+        for row in db.execute(select(GlucoseDay).where(GlucoseDay.day.in_(list(by_day))).with_for_update()).scalars()
+    }
+    added: dict[date, int] = {}
+    for day, new in by_day.items():
+        row = existing.get(day)
+        if row is None:
+            row = GlucoseDay(day=day)
+            db.add(row)
+            merged = {}
+        else:
+            secs, vals = unpack_day(row)
+            merged = dict(zip(secs, vals))
+        before = len(merged)
+        merged.update(new)  # same timestamp again: the newer upload wins
+        _store(row, merged)
+        added[day] = len(merged) - before
+    db.commit()
+    return added
+
+
+def ingest(db: Session, readings: Iterable[tuple[datetime, float]]) -> dict[date, int]:
+    """Merge (timestamp, mmol/L) readings into their day rows; one read and one write per touched day.
+
+    Returns {day: readings added}. Re-sending readings already stored is harmless.
+    """
+    by_day = _group(readings)
+    if not by_day:
+        return {}
+    try:
+        return _merge(db, by_day)
+    except IntegrityError:
+        # Another writer created one of the day rows first; the retry merges into it.
+        db.rollback()
+        return _merge(db, by_day)
+
+
+def readings_between(db: Session, start: date, end: date) -> Iterator[tuple[datetime, float]]:
+    """Readings in [start, end] in time order, unpacked from one row per day."""
+    rows = db.execute(
+        select(GlucoseDay.day, GlucoseDay.seconds, GlucoseDay.centi_mmol)
+        .where(GlucoseDay.day >= start, GlucoseDay.day <= end)
+        .order_by(GlucoseDay.day)
+    )
+    for day, raw_secs, raw_vals in rows:
+        midnight = datetime.combine(day, time.min)
+        for s, v in zip(_unpack("I", raw_secs), _unpack("H", raw_vals)):
+            yield midnight + timedelta(seconds=s), v / 100
+
+
+def _stats(n, n_low, n_in, n_high, total, total_sq, lo, hi) -> GlucoseStats:
+    n = int(n or 0)
+    if n == 0:
+        return GlucoseStats(0, None, None, None, None, None, None, None)
+    mean = total / n
+    # Constant readings cancel to a tiny negative variance in floating point; clamp it.
+    sd = math.sqrt(max(0.0, (total_sq - n * mean * mean) / (n - 1))) if n > 1 else None
+    return GlucoseStats(n, mean, sd, lo, hi, n_in / n, n_low / n, n_high / n)
+
+
+def day_stats(row: GlucoseDay | None) -> GlucoseStats:
+    if row is None:
+        return _stats(0, 0, 0, 0, 0, 0, None, None)
+    return _stats(
+        row.n, row.n_low, row.n_in_range, row.n_high, row.sum_mmol, row.sum_sq_mmol, row.min_mmol, row.max_mmol
+    )
+
+
+def range_stats(db: Session, start: date, end: date) -> GlucoseStats:
+    """Aggregate over [start, end] from the per-day counters in one SQL statement."""
+    row = db.execute(
+        select(
+            func.sum(GlucoseDay.n),
+            func.sum(GlucoseDay.n_low),
+            func.sum(GlucoseDay.n_in_range),
+            func.sum(GlucoseDay.n_high),
+            func.sum(GlucoseDay.sum_mmol),
+            func.sum(GlucoseDay.sum_sq_mmol),
+            func.min(GlucoseDay.min_mmol),
+            func.max(GlucoseDay.max_mmol),
+        ).where(GlucoseDay.day >= start, GlucoseDay.day <= end)
+    ).one()
+    return _stats(*row)
+
+
+def glucose_days_between(db: Session, start: date, end: date) -> dict[date, GlucoseDay]:
+    """Day rows without their packed arrays, for summary evaluation."""
+    rows = db.execute(
+        select(GlucoseDay)
+        .options(defer(GlucoseDay.seconds), defer(GlucoseDay.centi_mmol))
+        .where(GlucoseDay.day >= start, GlucoseDay.day <= end)
+    ).scalars()
+    return {row.day: row for row in rows}
+
+
+def _parse_time(raw: str) -> datetime:
+    raw = raw.strip().replace("/", "-")
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        return datetime.strptime(raw, "%d-%m-%Y %H:%M")
+
+
+def read_csv(
+    path: Path, time_col: str, value_col: str, unit: Literal["mmol", "mgdl"]
+) -> Iterator[tuple[datetime, float]]:
+    """Yield readings from a CSV export; rows without a numeric value (notes, calibrations) are skipped."""
+    with path.open(newline="", encoding="utf-8-sig") as f:
+        for rec in csv.DictReader(f):
+            raw_time, raw_value = (rec.get(time_col) or "").strip(), (rec.get(value_col) or "").strip()
+            if not raw_time or not raw_value:
+                continue
+            try:
+                value = float(raw_value)
+            except ValueError:
+                continue
+            yield _parse_time(raw_time), value / MGDL_PER_MMOL if unit == "mgdl" else value
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app.db import SessionLocal
+    from app.security import OWNER_USERNAME
+    from app.services.rollups import refresh_day
+    from app.services.users import user_id_for
+
+    parser = argparse.ArgumentParser(description="Import intraday (CGM) glucose readings from CSV.")
+    parser.add_argument("csv", type=Path)
+    parser.add_argument("--time-col", default="timestamp")
+    parser.add_argument("--value-col", default="glucose")
+    parser.add_argument("--unit", choices=("mmol", "mgdl"), default="mmol")
+    parser.add_argument("--user", default=OWNER_USERNAME, help="whose readings these are")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        uid = user_id_for(db, args.user)
+        if uid is None:
+            parser.error(f"no such user: {args.user}")
+        db.info["user_id"] = uid
+        added = ingest(db, read_csv(args.csv, args.time_col, args.value_col, args.unit))
+        for day in sorted(added):
+            refresh_day(db, day)
+    print(f"{sum(added.values())} new readings over {len(added)} day(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.db import tenant_id
+from app.models import DailyMetrics, FoodLog, SelfRating
+from app.services.cache import LRUCache, data_version
+
+FLAGS = ("refined_carbs", "sugar", "veggies_first", "protein_enough", "risk_or_danger", "late_meal")
+LAGS = (0, 1, 2, 3)
+LATE_MEAL_HOUR = 20  # a meal starting at or after 20:00 counts as late
+Z95 = 1.959963984540054
+MIN_GROUP = 3
+
+_cache = LRUCache(maxsize=4)
+
+
+@dataclass(frozen=True)
+class FeatureMatrix:
+    """Day-aligned arrays: row i is `start + i days`; NaN marks a day without data."""
+
+    start: date
+    flags: np.ndarray  # (days, len(FLAGS)) share of that day's meals with the flag
+    meals: np.ndarray  # (days,) meal count, 0 where nothing was logged
+    fasting: np.ndarray  # (days,) fasting glucose measured that morning
+    post2h: np.ndarray  # (days,) 2h post-prandial glucose
+
+
+@dataclass(frozen=True)
+class FlagEffect:
+    flag: str
+    n_with: int
+    n_without: int
+    mean_with: float | None
+    mean_without: float | None
+    diff: float | None  # flagged days minus clean days
+    ci_low: float | None
+    ci_high: float | None
+    cohens_d: float | None
+
+
+@dataclass(frozen=True)
+class LagCorrelation:
+    flag: str
+    lag: int
+    n: int
+    r: float | None
+    ci_low: float | None
+    ci_high: float | None
+
+
+@dataclass(frozen=True)
+class Insights:
+    days: int
+    meal_days: int
+    fasting_days: int
+    effects: list[FlagEffect]  # outcome: next-morning fasting glucose
+    post2h_effects: list[FlagEffect]  # outcome: same-day 2h post-prandial glucose
+    correlations: list[LagCorrelation]
+
+
+def _to_date(v) -> date:
+    return v if isinstance(v, date) else date.fromisoformat(str(v)[:10])
+
+
+def build_features(db: Session) -> FeatureMatrix | None:
+    """Two GROUP BY queries (meals per day, metrics per day) folded into dense NumPy arrays."""
+    day_expr = func.date(FoodLog.eaten_at)
+    late = func.extract("hour", FoodLog.eaten_at) >= LATE_MEAL_HOUR
+    meal_rows = db.execute(
+        select(
+            day_expr,
+            func.count(FoodLog.id),
+            func.sum(case((FoodLog.refined_carbs.is_(True), 1), else_=0)),
+            func.sum(case((FoodLog.sugar.is_(True), 1), else_=0)),
+            func.sum(case((FoodLog.veggies_first.is_(True), 1), else_=0)),
+            func.sum(case((FoodLog.protein_enough.is_(True), 1), else_=0)),
+            func.sum(case((FoodLog.self_rating != SelfRating.safe, 1), else_=0)),
+            func.sum(case((late, 1), else_=0)),
+        ).group_by(day_expr)
+    ).all()
+    metric_rows = db.execute(
+        select(DailyMetrics.day, DailyMetrics.fasting_glucose_mmol_l, DailyMetrics.post2h_glucose_mmol_l).where(
+            (DailyMetrics.fasting_glucose_mmol_l.is_not(None)) | (DailyMetrics.post2h_glucose_mmol_l.is_not(None))
+        )
+    ).all()
+    if not meal_rows and not metric_rows:
+        return None
+
+    meal_days = [_to_date(r[0]) for r in meal_rows]
+    metric_days = [r[0] for r in metric_rows]
+    start = min(meal_days + metric_days)
+    n = (max(meal_days + metric_days) - start).days + 1
+
+    flags = np.full((n, len(FLAGS)), np.nan)
+    meals = np.zeros(n)
+    if meal_rows:
+        idx = np.array([(d - start).days for d in meal_days])
+        counts = np.array([[float(v or 0) for v in r[1:]] for r in meal_rows])
+        meals[idx] = counts[:, 0]
+        flags[idx] = counts[:, 1:] / counts[:, :1]
+
+    fasting = np.full(n, np.nan)
+    post2h = np.full(n, np.nan)
+    if metric_rows:
+        idx = np.array([(d - start).days for d in metric_days])
+        fasting[idx] = np.array([np.nan if r[1] is None else r[1] for r in metric_rows], dtype=float)
+        post2h[idx] = np.array([np.nan if r[2] is None else r[2] for r in metric_rows], dtype=float)
+
+    return FeatureMatrix(start=start, flags=flags, meals=meals, fasting=fasting, post2h=post2h)
+
+
+def _shift(a: np.ndarray, lag: int) -> np.ndarray:
+    """Value `lag` days later aligned to each day (NaN past the end)."""
+    if lag == 0:
+        return a
+    out = np.full_like(a, np.nan)
+    out[:-lag] = a[lag:]
+    return out
+
+
+def _effect(flag: str, x: np.ndarray, y: np.ndarray) -> FlagEffect:
+    ok = ~np.isnan(x) & ~np.isnan(y)
+    with_flag = y[ok & (x > 0)]
+    without = y[ok & (x == 0)]
+    n1, n0 = len(with_flag), len(without)
+    if n1 < MIN_GROUP or n0 < MIN_GROUP:
+        return FlagEffect(flag, n1, n0, _mean(with_flag), _mean(without), None, None, None, None)
+    m1, m0 = float(with_flag.mean()), float(without.mean())
+    v1, v0 = float(with_flag.var(ddof=1)), float(without.var(ddof=1))
+    diff = m1 - m0
+    se = math.sqrt(v1 / n1 + v0 / n0)  # Welch standard error
+    pooled = math.sqrt(((n1 - 1) * v1 + (n0 - 1) * v0) / (n1 + n0 - 2))
+    d = diff / pooled if pooled > 0 else None
+    return FlagEffect(flag, n1, n0, m1, m0, diff, diff - Z95 * se, diff + Z95 * se, d)
+
+
+def _mean(a: np.ndarray) -> float | None:
+    return float(a.mean()) if len(a) else None
+
+
+def _correlation(flag: str, lag: int, x: np.ndarray, y: np.ndarray) -> LagCorrelation:
+    ok = ~np.isnan(x) & ~np.isnan(y)
+    n = int(ok.sum())
+    if n < 4 or x[ok].std() == 0 or y[ok].std() == 0:
+        return LagCorrelation(flag, lag, n, None, None, None)
+    r = float(np.corrcoef(x[ok], y[ok])[0, 1])
+    # Fisher z-transform interval.
+    z = math.atanh(max(min(r, 0.999999), -0.999999))
+    half = Z95 / math.sqrt(n - 3)
+    return LagCorrelation(flag, lag, n, r, math.tanh(z - half), math.tanh(z + half))
+
+
+def compute_insights(fm: FeatureMatrix) -> Insights:
+    next_fasting = _shift(fm.fasting, 1)
+    effects = [_effect(f, fm.flags[:, i], next_fasting) for i, f in enumerate(FLAGS)]
+    correlations = [
+        _correlation(f, lag, fm.flags[:, i], _shift(fm.fasting, lag)) for i, f in enumerate(FLAGS) for lag in LAGS
+    ]
+    return Insights(
+        days=len(fm.meals),
+        meal_days=int((fm.meals > 0).sum()),
+        fasting_days=int((~np.isnan(fm.fasting)).sum()),
+        effects=effects,
+        post2h_effects=[_effect(f, fm.flags[:, i], fm.post2h) for i, f in enumerate(FLAGS)],
+        correlations=correlations,
+    )
+
+
+def get_insights(db: Session) -> Insights | None:
+    """Cached per data version, so the page is a dict lookup until something is written."""
+
+    def build() -> Insights | None:
+        fm = build_features(db)
+        return None if fm is None else compute_insights(fm)
+
+    uid = tenant_id(db)
+    return _cache.get_or_set(("insights", uid, data_version(uid)), build)
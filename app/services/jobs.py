@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, tenant_id, tenant_session
+from app.models import Job
+from app.services.cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+POLL_S = 1.0
+LEASE = timedelta(minutes=10)  # a running job older than this belongs to a dead worker
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 3600.0
+DEFAULT_ATTEMPTS = 5
+KEEP_FINISHED = timedelta(days=7)
+CLAIM_BATCH = 8
+STATUSES = ("queued", "running", "done", "failed")
+
+Handler = Callable[[Session, dict[str, Any]], None]
+_handlers: dict[str, Handler] = {}
+_wake = threading.Event()
+
+
+def handler(kind: str) -> Callable[[Handler], Handler]:
+    """Register `fn(db, payload)` for jobs of `kind`; `db` is bound to the job's user."""
+
+    def register(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        return fn
+
+    return register
+
+
+def enqueue(
+    db: Session, kind: str, key: str = "", payload: dict[str, Any] | None = None, *, delay_s: float = 0.0
+) -> Job:
+    """Queue work in the caller's transaction; it runs once the caller commits.
+
+    Always a new row: reusing a queued one would race with a worker claiming it before this
+    transaction commits, and that run would miss the caller's write. Duplicates are folded when
+    one of them is claimed instead (see `_claim`), so a burst of writes to one day still runs a
+    single recompute.
+    """
+    db.info["jobs_enqueued"] = True
+    pending = db.info.setdefault("jobs_pending", {})  # this transaction's own rows are safe to reuse
+    if (kind, key) in pending:
+        return pending[kind, key]
+    job = Job(
+        kind=kind,
+        key=key,
+        payload=json.dumps(payload) if payload else None,
+        max_attempts=DEFAULT_ATTEMPTS,
+        run_at=datetime.utcnow() + timedelta(seconds=delay_s),
+    )
+    db.add(job)
+    pending[kind, key] = job
+    return job
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db: Session) -> None:
+    db.info.pop("jobs_pending", None)
+    if not db.info.pop("jobs_enqueued", False):
+        return
+    # What the jobs will recompute is stale from this commit on; drop cached renders now rather than
+    # when the job finishes, then wake the workers.
+    uid = tenant_id(db)
+    if uid is not None:
+        bump_data_version(uid)
+    _wake.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(db: Session) -> None:
+    db.info.pop("jobs_enqueued", None)
+    db.info.pop("jobs_pending", None)
+
+
+def _backoff_s(attempts: int) -> float:
+    return min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+def _claim(db: Session, worker: str) -> Job | None:
+    """Take the oldest due job. The conditional UPDATE makes this safe across threads and processes."""
+    now = datetime.utcnow()
+    candidates = db.execute(
+        select(Job.id).where(Job.status == "queued", Job.run_at <= now).order_by(Job.run_at, Job.id).limit(CLAIM_BATCH)
+    ).scalars().all()
+    for job_id in candidates:
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(status="running", locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed:
+            job = db.get(Job, job_id)
+            # Duplicates committed before this run started are covered by it: the handler starts
+            # after this commit, so it sees their writes. Ones committed later stay queued.
+            db.execute(
+                update(Job)
+                .where(
+                    Job.user_id == job.user_id,
+                    Job.kind == job.kind,
+                    Job.key == job.key,
+                    Job.status == "queued",
+                    Job.id != job.id,
+                    Job.created_at <= now,
+                )
+                .values(status="done", finished_at=now, last_error=f"coalesced into #{job.id}")
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return job
+    return None
+
+
+def run_one(worker: str = "inline") -> bool:
+    """Run one due job; False when nothing was due."""
+    with SessionLocal() as db:
+        job = _claim(db, worker)
+        if job is None:
+            return False
+        job_id, user_id, kind, attempts = job.id, job.user_id, job.kind, job.attempts
+        payload = json.loads(job.payload) if job.payload else {}
+
+    error = None
+    try:
+        fn = _handlers.get(kind)
+        if fn is None:
+            raise LookupError(f"no handler for job kind {kind!r}")
+        with tenant_session(user_id) as db:
+            fn(db, payload)
+            db.commit()
+    except Exception as e:  # noqa: BLE001 - any failure is recorded on the job and retried
+        logger.exception("job #%s (%s) failed", job_id, kind)
+        error = f"{type(e).__name__}: {e}"
+
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        now = datetime.utcnow()
+        job.locked_by = job.locked_at = None
+        if error is None:
+            job.status, job.finished_at, job.last_error = "done", now, None
+        elif attempts < job.max_attempts:
+            job.status, job.run_at, job.last_error = "queued", now + timedelta(seconds=_backoff_s(attempts)), error
+        else:
+            job.status, job.finished_at, job.last_error = "failed", now, error
+        db.commit()
+    return True
+
+
+def drain(max_jobs: int = 10_000) -> int:
+    """Run due jobs inline until none are left (CLIs, maintenance)."""
+    n = 0
+    while n < max_jobs and run_one():
+        n += 1
+    return n
+
+
+def requeue_stale(db: Session) -> int:
+    cutoff = datetime.utcnow() - LEASE
+    n = db.execute(
+        update(Job)
+        .where(Job.status == "running", Job.locked_at < cutoff)
+        .values(status="queued", locked_by=None, locked_at=None, run_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return n
+
+
+def prune(db: Session) -> int:
+    cutoff = datetime.utcnow() - KEEP_FINISHED
+    n = db.execute(
+        delete(Job).where(Job.status.in_(("done", "failed")), Job.finished_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return n
+
+
+def retry(db: Session, job_id: int) -> bool:
+    job = db.get(Job, job_id)
+    if job is None or job.status != "failed":
+        return False
+    job.status, job.attempts, job.run_at, job.finished_at = "queued", 0, datetime.utcnow(), None
+    db.info["jobs_enqueued"] = True
+    db.commit()
+    return True
+
+
+def status_counts(db: Session) -> dict[str, int]:
+    counts = dict(db.execute(select(Job.status, func.count(Job.id)).group_by(Job.status)).all())
+    return {s: counts.get(s, 0) for s in STATUSES}
+
+
+def recent_jobs(db: Session, limit: int = 50) -> list[Job]:
+    return list(db.execute(select(Job).order_by(Job.id.desc()).limit(limit)).scalars())
+
+
+class JobPool:
+    """Worker threads pulling from the jobs table.
+
+    Each process runs its own pool; claiming is a compare-and-set on the row, so several workers
+    (threads or processes) never run the same job. Commits that enqueue wake the pool at once;
+    otherwise it polls every POLL_S for delayed retries and jobs queued by other processes.
+    """
+
+    MAINTENANCE_S = 300.0
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, workers)
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> None:
+        with SessionLocal() as db:
+            requeue_stale(db)
+        for i in range(self.workers):
+            # Thread 0 also requeues jobs orphaned by dead workers and prunes old finished ones.
+            t = threading.Thread(
+                target=self._run, args=(f"{self._prefix}:{i}", i == 0), name=f"job-worker-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        _wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+
+    def _run(self, worker: str, maintain: bool) -> None:
+        last_maintenance = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                if run_one(worker):
+                    continue
+                now = time.monotonic()
+                if maintain and now - last_maintenance > self.MAINTENANCE_S:
+                    last_maintenance = now
+                    with SessionLocal() as db:
+                        requeue_stale(db)
+                        prune(db)
+            except Exception:
+                logger.exception("job worker %s crashed; continuing", worker)
+            _wake.wait(POLL_S)
+            _wake.clear()
+
+
+def main(argv: list[str] | None = None) -> None:
+    import app.services.rollups  # noqa: F401 - registers the refresh_day handler
+
+    parser = argparse.ArgumentParser(description="Inspect and run background jobs.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("run", help="run every due job now, then exit")
+    sub.add_parser("list", help="show job counts and failures")
+    p_retry = sub.add_parser("retry", help="requeue a failed job")
+    p_retry.add_argument("job_id", type=int)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "run":
+        print(f"{drain()} job(s) run")
+    elif args.cmd == "list":
+        with SessionLocal() as db:
+            print(" ".join(f"{s}={n}" for s, n in status_counts(db).items()))
+            for job in db.execute(select(Job).where(Job.status == "failed").order_by(Job.id)).scalars():
+                print(f"#{job.id} user {job.user_id} {job.kind}[{job.key}] x{job.attempts}: {job.last_error}")
+    else:
+        with SessionLocal() as db:
+            raise SystemExit(0 if retry(db, args.job_id) else 1)
+
+
+if __name__ == "__main__":
+    main()
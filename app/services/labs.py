@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import LabMetric, LabReference
+
+
+class Analyte(NamedTuple):
+    name: str  # canonical name, also what new rows are stored under
+    label: str
+    unit: str  # canonical unit
+    aliases: tuple[str, ...]
+    conversions: dict[str, tuple[float, float]]  # unit -> (scale, offset) into the canonical unit
+    low: float | None
+    high: float | None
+
+
+_MGDL_CHOL = 0.02586
+ANALYTES: tuple[Analyte, ...] = (
+    Analyte("HbA1c", "糖化血红蛋白", "%", ("hba1c", "a1c", "糖化血红蛋白", "糖化"), {"mmol/mol": (0.09148, 2.152)}, 4.0, 6.0),
+    Analyte("FPG", "空腹血糖", "mmol/L", ("fpg", "glu", "glucose", "空腹血糖", "血糖"), {"mg/dl": (1 / 18.0, 0.0)}, 3.9, 6.1),
+    Analyte("TC", "总胆固醇", "mmol/L", ("tc", "chol", "总胆固醇", "胆固醇"), {"mg/dl": (_MGDL_CHOL, 0.0)}, None, 5.2),
+    Analyte("LDL-C", "低密度脂蛋白", "mmol/L", ("ldl", "ldl-c", "低密度脂蛋白", "低密度"), {"mg/dl": (_MGDL_CHOL, 0.0)}, None, 3.4),
+    Analyte("HDL-C", "高密度脂蛋白", "mmol/L", ("hdl", "hdl-c", "高密度脂蛋白", "高密度"), {"mg/dl": (_MGDL_CHOL, 0.0)}, 1.0, None),
+    Analyte("TG", "甘油三酯", "mmol/L", ("tg", "trig", "甘油三酯"), {"mg/dl": (0.01129, 0.0)}, None, 1.7),
+    Analyte("CREA", "肌酐", "µmol/L", ("crea", "cr", "creatinine", "肌酐"), {"mg/dl": (88.42, 0.0)}, 57.0, 111.0),
+    Analyte("UA", "尿酸", "µmol/L", ("ua", "uric acid", "尿酸"), {"mg/dl": (59.48, 0.0)}, 208.0, 428.0),
+    Analyte("ALT", "谷丙转氨酶", "U/L", ("alt", "gpt", "谷丙转氨酶"), {}, 9.0, 50.0),
+    Analyte("AST", "谷草转氨酶", "U/L", ("ast", "got", "谷草转氨酶"), {}, 15.0, 40.0),
+    Analyte("INS", "空腹胰岛素", "µIU/mL", ("ins", "insulin", "空腹胰岛素", "胰岛素"), {"pmol/l": (1 / 6.0, 0.0)}, 2.6, 24.9),
+)
+_BY_KEY: dict[str, Analyte] = {}
+for _a in ANALYTES:
+    for _k in (_a.name, *_a.aliases):
+        _BY_KEY[_k.lower()] = _a
+
+
+@dataclass(frozen=True)
+class LabPoint:
+    day: date
+    value: float  # in the analyte's canonical unit when the stored unit is known
+    unit: str | None
+    raw_value: float
+    raw_unit: str | None
+
+
+@dataclass(frozen=True)
+class LabLatest:
+    name: str
+    label: str
+    latest: LabPoint
+    previous: LabPoint | None
+    low: float | None
+    high: float | None
+
+    @property
+    def delta(self) -> float | None:
+        return None if self.previous is None else self.latest.value - self.previous.value
+
+    @property
+    def status(self) -> str:
+        if self.low is not None and self.latest.value < self.low:
+            return "low"
+        if self.high is not None and self.latest.value > self.high:
+            return "high"
+        return "normal"
+
+
+def analyte_for(name: str) -> Analyte | None:
+    return _BY_KEY.get(name.strip().lower())
+
+
+def canonical_name(name: str) -> str:
+    a = analyte_for(name)
+    return a.name if a else name.strip()
+
+
+def _names(name: str) -> list[str]:
+    """Every spelling a series may be stored under, so one IN query on (name, metric_date) finds it all."""
+    a = analyte_for(name)
+    if a is None:
+        return [name.strip()]
+    return list(dict.fromkeys([a.name, *a.aliases, *(x.upper() for x in a.aliases)]))
+
+
+def _unit_key(unit: str | None) -> str:
+    return (unit or "").strip().lower().replace(" ", "").replace("μ", "µ").replace("umol", "µmol").replace("uiu", "µiu")
+
+
+def normalize(name: str, value: float, unit: str | None) -> tuple[float, str | None]:
+    """Convert into the analyte's canonical unit; unknown analytes or units pass through unchanged."""
+    a = analyte_for(name)
+    if a is None:
+        return value, unit
+    key = _unit_key(unit)
+    if not key or key == _unit_key(a.unit):
+        return value, a.unit
+    conv = a.conversions.get(key)
+    if conv is None:
+        return value, unit
+    scale, offset = conv
+    return value * scale + offset, a.unit
+
+
+def _point(row: tuple) -> LabPoint:
+    name, day, value, unit = row
+    v, u = normalize(name, value, unit)
+    return LabPoint(day=day, value=v, unit=u, raw_value=value, raw_unit=unit)
+
+
+def references(db: Session) -> dict[str, LabReference]:
+    return {r.analyte: r for r in db.execute(select(LabReference)).scalars()}
+
+
+def series(db: Session, name: str) -> list[LabPoint]:
+    rows = db.execute(
+        select(LabMetric.name, LabMetric.metric_date, LabMetric.value, LabMetric.unit)
+        .where(LabMetric.name.in_(_names(name)))
+        .order_by(LabMetric.metric_date, LabMetric.id)
+    ).all()
+    return [_point(r) for r in rows]
+
+
+def latest_all(db: Session) -> list[LabLatest]:
+    """Latest value and the one before it for every analyte, from a single windowed query."""
+    rn = (
+        func.row_number()
+        .over(partition_by=LabMetric.name, order_by=(LabMetric.metric_date.desc(), LabMetric.id.desc()))
+        .label("rn")
+    )
+    inner = select(LabMetric.name, LabMetric.metric_date, LabMetric.value, LabMetric.unit, LabMetric.id, rn).subquery()
+    rows = db.execute(
+        select(inner.c.name, inner.c.metric_date, inner.c.value, inner.c.unit, inner.c.id).where(inner.c.rn <= 2)
+    ).all()
+
+    # Several stored spellings can map to one analyte; the top two of the union are among the per-name top twos.
+    grouped: dict[str, list[tuple]] = {}
+    for name, day, value, unit, row_id in rows:
+        grouped.setdefault(canonical_name(name), []).append((day, row_id, (name, day, value, unit)))
+
+    refs = references(db)
+    out: list[LabLatest] = []
+    for name, items in grouped.items():
+        items.sort(key=lambda x: (x[0], x[1]), reverse=True)
+        points = [_point(raw) for _, _, raw in items[:2]]
+        a = analyte_for(name)
+        ref = refs.get(name)
+        out.append(
+            LabLatest(
+                name=name,
+                label=a.label if a else name,
+                latest=points[0],
+                previous=points[1] if len(points) > 1 else None,
+                low=ref.low if ref else None,
+                high=ref.high if ref else None,
+            )
+        )
+    out.sort(key=lambda x: x.latest.day, reverse=True)
+    return out
+
+
+def ensure_lab_tables(engine: Engine) -> None:
+    """Seed missing reference ranges."""
+    with Session(engine) as db:
+        have = set(db.execute(select(LabReference.analyte)).scalars())
+        for a in ANALYTES:
+            if a.name not in have:
+                db.add(LabReference(analyte=a.name, unit=a.unit, low=a.low, high=a.high))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
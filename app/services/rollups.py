@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+from sqlalchemy import case, delete, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db import tenant_id, tenant_session
+from app.models import DailyMetrics, DailySummary, FoodLog, MonthlyRollup, SelfRating, SummaryColor
+from app.services.anomaly import anomalies_between
+from app.services.cache import bump_data_version, data_version
+from app.services.glucose import glucose_days_between
+from app.services.events import publish_data, publish_summary
+from app.services.jobs import enqueue, handler
+from app.services.rules import evaluate_day_from_data, upsert_daily_summary
+
+MEAL_FLAGS = ("refined_carbs", "sugar", "veggies_first", "protein_enough")
+
+# Days found to have no data (so deliberately left without a summary), per user, valid while the
+# user's data version is unchanged. Without this every report over a range with a gap would re-read
+# and re-evaluate the whole range just to find the gap still empty.
+_empty_days: dict[int, tuple[int, set[date]]] = {}
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+def _month_range(first: date, last: date) -> list[date]:
+    months = []
+    cur = month_start(first)
+    while cur <= last:
+        months.append(cur)
+        cur = next_month(cur)
+    return months
+
+
+def fill_missing_summaries(
+    db: Session, start: date, end: date, have: set[date] | None = None
+) -> list[DailySummary]:
+    """Create DailySummary rows for past days that were never evaluated, using one batched fetch.
+
+    Pass `have` when the caller already knows which days are summarized to skip that lookup.
+    Days without data are remembered until the user's next write, so a range whose only gaps
+    are empty days costs the one `have` lookup. Returns the rows created.
+    """
+    end = min(end, date.today() - timedelta(days=1))
+    if end < start:
+        return []
+    if have is None:
+        have = set(
+            db.execute(select(DailySummary.day).where(DailySummary.day >= start, DailySummary.day <= end)).scalars()
+        )
+    missing = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    missing = [d for d in missing if d not in have]
+    uid = tenant_id(db)
+    version = data_version(uid)
+    known = _empty_days.get(uid)
+    if known is not None and known[0] == version:
+        missing = [d for d in missing if d not in known[1]]
+    if not missing:
+        return []
+
+    created: list[DailySummary] = []
+    empty: set[date] = set()
+    lo, hi = missing[0], missing[-1]  # raw rows only for the span of days that still need evaluating
+    # Read in a transaction that starts after the version read (the caller's may hold an older
+    # snapshot under REPEATABLE READ), so days remembered as empty really were empty at `version`.
+    with tenant_session(uid) as fresh:
+        metrics = fresh.execute(select(DailyMetrics).where(DailyMetrics.day >= lo, DailyMetrics.day <= hi)).scalars()
+        metrics_map = {m.day: m for m in metrics}
+        logs = fresh.execute(
+            select(FoodLog).where(
+                FoodLog.eaten_at >= datetime.combine(lo, time.min), FoodLog.eaten_at <= datetime.combine(hi, time.max)
+            )
+        ).scalars()
+        logs_map: dict[date, list[FoodLog]] = {}
+        for log in logs:
+            logs_map.setdefault(log.eaten_at.date(), []).append(log)
+        anomalies_map = anomalies_between(fresh, lo, hi)
+        glucose_map = glucose_days_between(fresh, lo, hi)
+
+        for d in missing:
+            # Days with no data at all are left unsummarized, matching what the dashboard would do.
+            if d not in metrics_map and d not in logs_map and d not in glucose_map:
+                empty.add(d)
+                continue
+            result = evaluate_day_from_data(
+                metrics_map.get(d), logs_map.get(d, []), anomalies_map.get(d), glucose_map.get(d)
+            )
+            created.append(
+                DailySummary(
+                    day=d,
+                    color=result.color,
+                    score=result.score,
+                    reasons="\n".join(f"- {r}" for r in result.reasons),
+                    commentary=result.commentary,
+                )
+            )
+    db.add_all(created)
+    db.flush()
+    if known is not None and known[0] == version:
+        known[1].update(empty)
+    else:
+        _empty_days[uid] = (version, empty)
+    return created
+
+
+def ensure_rollup_columns(engine: Engine) -> None:
+    """Add `bp_diastolic_n` to older rollup tables and drop their rows, which get_rollups rebuilds on demand."""
+    have = {c["name"] for c in inspect(engine).get_columns(MonthlyRollup.__tablename__)}
+    if "bp_diastolic_n" in have:
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"ALTER TABLE {MonthlyRollup.__tablename__} ADD COLUMN bp_diastolic_n INTEGER NOT NULL DEFAULT 0"
+        )
+        conn.execute(delete(MonthlyRollup))
+
+
+def refresh_month(db: Session, day: date) -> MonthlyRollup:
+    """Recompute the rollup row for the month containing `day` (three aggregate queries over ~31 rows)."""
+    first = month_start(day)
+    last = next_month(first) - timedelta(days=1)
+
+    m = db.execute(
+        select(
+            func.count(DailyMetrics.id),
+            func.count(DailyMetrics.weight_kg),
+            func.avg(DailyMetrics.weight_kg),
+            func.min(DailyMetrics.weight_kg),
+            func.max(DailyMetrics.weight_kg),
+            func.count(DailyMetrics.fasting_glucose_mmol_l),
+            func.avg(DailyMetrics.fasting_glucose_mmol_l),
+            func.min(DailyMetrics.fasting_glucose_mmol_l),
+            func.max(DailyMetrics.fasting_glucose_mmol_l),
+            func.count(DailyMetrics.bp_systolic),
+            func.avg(DailyMetrics.bp_systolic),
+            func.max(DailyMetrics.bp_systolic),
+            func.count(DailyMetrics.bp_diastolic),
+            func.avg(DailyMetrics.bp_diastolic),
+            func.max(DailyMetrics.bp_diastolic),
+            func.count(DailyMetrics.sleep_hours),
+            func.avg(DailyMetrics.sleep_hours),
+        ).where(DailyMetrics.day >= first, DailyMetrics.day <= last)
+    ).one()
+
+    colors = dict(
+        db.execute(
+            select(DailySummary.color, func.count())
+            .where(DailySummary.day >= first, DailySummary.day <= last)
+            .group_by(DailySummary.color)
+        ).all()
+    )
+
+    flag_sums = [func.sum(case((getattr(FoodLog, f).is_(True), 1), else_=0)) for f in MEAL_FLAGS]
+    meals = db.execute(
+        select(
+            func.count(FoodLog.id),
+            *flag_sums,
+            func.sum(case((FoodLog.self_rating == SelfRating.danger, 1), else_=0)),
+        ).where(FoodLog.eaten_at >= datetime.combine(first, time.min), FoodLog.eaten_at <= datetime.combine(last, time.max))
+    ).one()
+
+    row = db.execute(select(MonthlyRollup).where(MonthlyRollup.month == first)).scalar_one_or_none()
+    if row is None:
+        row = MonthlyRollup(month=first)
+        db.add(row)
+
+    (
+        row.metric_days,
+        row.weight_n,
+        row.weight_avg,
+        row.weight_min,
+        row.weight_max,
+        row.fasting_n,
+        row.fasting_avg,
+        row.fasting_min,
+        row.fasting_max,
+        row.bp_n,
+        row.bp_systolic_avg,
+        row.bp_systolic_max,
+        row.bp_diastolic_n,
+        row.bp_diastolic_avg,
+        row.bp_diastolic_max,
+        row.sleep_n,
+        row.sleep_avg,
+    ) = m
+    row.green_days = colors.get(SummaryColor.green, 0)
+    row.yellow_days = colors.get(SummaryColor.yellow, 0)
+    row.red_days = colors.get(SummaryColor.red, 0)
+    row.meals = meals[0]
+    row.refined_carbs_meals, row.sugar_meals, row.veggies_first_meals, row.protein_enough_meals = (
+        int(v or 0) for v in meals[1:5]
+    )
+    row.danger_meals = int(meals[5] or 0)
+    db.flush()
+    return row
+
+
+def _refresh_days(db: Session, days: list[date]) -> dict[date, DailySummary]:
+    summaries = {d: upsert_daily_summary(db, d, refresh_rollup=False, commit=False) for d in days}
+    for month in sorted({month_start(d) for d in days}):
+        refresh_month(db, month)
+    db.commit()
+    # The commit expired them; reload all in one query rather than one per row on first access.
+    db.execute(select(DailySummary).where(DailySummary.day.in_(days))).scalars().all()
+    return summaries
+
+
+def refresh_days(db: Session, days: Iterable[date]) -> dict[date, DailySummary]:
+    """Call after writes that touch several days: re-evaluates each day's summary, then each month once.
+
+    One transaction and one data-version bump however many days and months the set spans.
+    """
+    days = sorted(set(days))
+    if not days:
+        return {}
+    try:
+        summaries = _refresh_days(db, days)
+    except IntegrityError:
+        # A concurrent request or job stored one of these days (or months) first; update their rows instead.
+        db.rollback()
+        summaries = _refresh_days(db, days)
+    uid = tenant_id(db)
+    publish_data(uid, bump_data_version(uid))
+    return summaries
+
+
+def refresh_day(db: Session, day: date) -> DailySummary:
+    """Call after any write that touches `day`: re-evaluates its summary and its month rollup."""
+    return refresh_days(db, [day])[day]
+
+
+def schedule_refresh(db: Session, day: date) -> None:
+    """Deferred `refresh_day`: runs on the job pool after the caller commits, once per day however many writes."""
+    enqueue(db, "refresh_day", key=day.isoformat(), payload={"day": day.isoformat()})
+
+
+@handler("refresh_day")
+def _refresh_day_job(db: Session, payload: dict) -> None:
+    day = date.fromisoformat(payload["day"])
+    try:
+        summary = refresh_day(db, day)
+    except IntegrityError:
+        # A job for another day of the same month (or a later run for this day) created the row first.
+        db.rollback()
+        summary = refresh_day(db, day)
+    publish_summary(tenant_id(db), summary)
+
+
+def get_rollups(db: Session, first: date, last: date) -> list[MonthlyRollup]:
+    """Rollups for every month in [first, last]; months never materialized are built once and stored."""
+    months = _month_range(first, min(last, date.today()))
+    if not months:
+        return []
+    rows = db.execute(
+        select(MonthlyRollup).where(MonthlyRollup.month >= months[0], MonthlyRollup.month <= months[-1])
+    ).scalars()
+    by_month = {r.month: r for r in rows}
+    missing = [mo for mo in months if mo not in by_month]
+    if missing:
+        for mo in missing:
+            fill_missing_summaries(db, mo, next_month(mo) - timedelta(days=1))
+            by_month[mo] = refresh_month(db, mo)
+        db.commit()
+    return [by_month[mo] for mo in months]
+
+
+def _weighted(rows: list[MonthlyRollup], avg: str, n: str) -> float | None:
+    pairs = [(getattr(r, avg), getattr(r, n)) for r in rows if getattr(r, avg) is not None and getattr(r, n)]
+    total = sum(k for _, k in pairs)
+    if not total:
+        return None
+    return sum(v * k for v, k in pairs) / total
+
+
+def _extreme(rows: list[MonthlyRollup], attr: str, fn) -> float | None:
+    values = [getattr(r, attr) for r in rows if getattr(r, attr) is not None]
+    return fn(values) if values else None
+
+
+@dataclass
+class PeriodStats:
+    """Aggregate of several monthly rollups (e.g. one calendar year)."""
+
+    label: str
+    months: int
+    metric_days: int
+    weight_avg: float | None
+    weight_min: float | None
+    weight_max: float | None
+    fasting_avg: float | None
+    fasting_min: float | None
+    fasting_max: float | None
+    bp_systolic_avg: float | None
+    bp_diastolic_avg: float | None
+    sleep_avg: float | None
+    green_days: int
+    yellow_days: int
+    red_days: int
+    meals: int
+    flag_rates: dict[str, float | None] = field(default_factory=dict)
+
+
+def combine(label: str, rows: list[MonthlyRollup]) -> PeriodStats:
+    meals = sum(r.meals for r in rows)
+    return PeriodStats(
+        label=label,
+        months=len(rows),
+        metric_days=sum(r.metric_days for r in rows),
+        weight_avg=_weighted(rows, "weight_avg", "weight_n"),
+        weight_min=_extreme(rows, "weight_min", min),
+        weight_max=_extreme(rows, "weight_max", max),
+        fasting_avg=_weighted(rows, "fasting_avg", "fasting_n"),
+        fasting_min=_extreme(rows, "fasting_min", min),
+        fasting_max=_extreme(rows, "fasting_max", max),
+        bp_systolic_avg=_weighted(rows, "bp_systolic_avg", "bp_n"),
+        bp_diastolic_avg=_weighted(rows, "bp_diastolic_avg", "bp_diastolic_n"),
+        sleep_avg=_weighted(rows, "sleep_avg", "sleep_n"),
+        green_days=sum(r.green_days for r in rows),
+        yellow_days=sum(r.yellow_days for r in rows),
+        red_days=sum(r.red_days for r in rows),
+        meals=meals,
+        flag_rates={
+            f: (sum(getattr(r, f"{f}_meals") for r in rows) / meals if meals else None)
+            for f in (*MEAL_FLAGS, "danger")
+        },
+    )
+
+
+def yearly_stats(db: Session, first_year: int, last_year: int) -> list[PeriodStats]:
+    rows = get_rollups(db, date(first_year, 1, 1), date(last_year, 12, 31))
+    by_year: dict[int, list[MonthlyRollup]] = {}
+    for r in rows:
+        if not (r.metric_days or r.meals):
+            continue
+        by_year.setdefault(r.month.year, []).append(r)
+    return [combine(str(y), by_year[y]) for y in sorted(by_year)]
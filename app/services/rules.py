@@ -4,9 +4,12 @@ from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta
 
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models import DailyMetrics, DailySummary, FoodLog, SelfRating, SummaryColor
+from app.models import DailyMetrics, DailySummary, FoodLog, GlucoseDay, MetricAnomaly, SelfRating, SummaryColor
+from app.services.anomaly import anomalies_between, describe
+from app.services.glucose import MIN_COVERAGE, day_stats, glucose_days_between
 
 
 @dataclass(frozen=True)
@@ -24,9 +27,23 @@ def _day_bounds(day: date) -> tuple[datetime, datetime]:
     return start, end
 
 
-def evaluate_day_from_data(metrics: DailyMetrics | None, food_logs: list[FoodLog]) -> SummaryResult:
+_SEVERITY = {SummaryColor.green: 0, SummaryColor.yellow: 1, SummaryColor.red: 2}
+
+
+def _worse(a: SummaryColor, b: SummaryColor) -> SummaryColor:
+    return a if _SEVERITY[a] >= _SEVERITY[b] else b
+
+
+def evaluate_day_from_data(
+    metrics: DailyMetrics | None,
+    food_logs: list[FoodLog],
+    anomalies: list[MetricAnomaly] | None = None,
+    glucose: GlucoseDay | None = None,
+) -> SummaryResult:
     reasons: list[str] = []
     score = 0
+    # Intraday readings only count once they cover enough of the day to mean something.
+    cgm = day_stats(glucose) if glucose is not None and glucose.n >= MIN_COVERAGE else None
 
     glucose_flag = SummaryColor.green
     if metrics and metrics.fasting_glucose_mmol_l is not None:
@@ -41,11 +58,28 @@ def evaluate_day_from_data(metrics: DailyMetrics | None, food_logs: list[FoodLog
             score -= 2
         else:
             score += 2
-    else:
+    elif cgm is None:
         reasons.append("未录入空腹血糖")
         score -= 1
         glucose_flag = SummaryColor.yellow
 
+    if cgm is not None:
+        tir = cgm.time_in_range
+        if tir < 0.5:
+            glucose_flag = SummaryColor.red
+            reasons.append(f"动态血糖达标时间 {tir:.0%} < 50%")
+            score -= 3
+        elif tir < 0.7:
+            glucose_flag = _worse(glucose_flag, SummaryColor.yellow)
+            reasons.append(f"动态血糖达标时间 {tir:.0%} 介于 50%-70%")
+            score -= 1
+        else:
+            score += 1
+        if cgm.time_below > 0.04:
+            glucose_flag = _worse(glucose_flag, SummaryColor.yellow)
+            reasons.append(f"低血糖时间 {cgm.time_below:.0%} > 4%")
+            score -= 2
+
     diet_flag = SummaryColor.green
     if not food_logs:
         reasons.append("未记录饮食（可能漏记）")
@@ -68,6 +102,10 @@ def evaluate_day_from_data(metrics: DailyMetrics | None, food_logs: list[FoodLog
         else:
             score += 2
 
+    for a in anomalies or []:
+        reasons.append(f"异常读数：{describe(a)}")
+        score -= 1
+
     color = SummaryColor.green
     if glucose_flag == SummaryColor.red or diet_flag == SummaryColor.red:
         color = SummaryColor.red
@@ -92,13 +130,18 @@ def evaluate_day(db: Session, day: date) -> SummaryResult:
         .scalars()
         .all()
     )
-    return evaluate_day_from_data(metrics, list(food_logs))
+    anomalies = anomalies_between(db, day, day).get(day, [])
+    glucose = glucose_days_between(db, day, day).get(day)
+    return evaluate_day_from_data(metrics, list(food_logs), anomalies, glucose)
 
 
-def upsert_daily_summary(db: Session, day: date) -> DailySummary:
+def upsert_daily_summary(
+    db: Session, day: date, refresh_rollup: bool = True, commit: bool = True
+) -> DailySummary:
     result = evaluate_day(db, day)
     existing = db.execute(select(DailySummary).where(DailySummary.day == day)).scalar_one_or_none()
     reasons_text = "\n".join(f"- {r}" for r in result.reasons)
+    color_changed = existing is None or existing.color != result.color
 
     if existing is None:
         existing = DailySummary(
@@ -115,7 +158,22 @@ def upsert_daily_summary(db: Session, day: date) -> DailySummary:
         existing.reasons = reasons_text
         existing.commentary = result.commentary
 
-    db.commit()
+    if not commit:
+        # The caller batches several days into one transaction and handles conflicts itself.
+        db.flush()
+        return existing
+    try:
+        if refresh_rollup and color_changed:
+            # Green/yellow/red day counts live in the monthly rollup.
+            from app.services.rollups import refresh_month
+
+            db.flush()
+            refresh_month(db, day)
+        db.commit()
+    except IntegrityError:
+        # A concurrent request or job stored this day (or month) first; update their rows instead.
+        db.rollback()
+        return upsert_daily_summary(db, day, refresh_rollup, commit)
     db.refresh(existing)
     return existing
 
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.models import AppMeta, Base
+
+# Bump whenever a model changes or an ensure_* step below gains new work; startup then runs the
+# full migration once. While the stored version is current, startup costs a single query.
+SCHEMA_VERSION = 2
+_KEY = "schema_version"
+
+
+def stored_version(engine: Engine) -> int:
+    """The version recorded by the last completed migration; 0 for a new or pre-versioning database."""
+    try:
+        with Session(engine) as db:
+            value = db.execute(select(AppMeta.value).where(AppMeta.key == _KEY)).scalar_one_or_none()
+    except DBAPIError:  # no app_meta table yet
+        return 0
+    return int(value) if value else 0
+
+
+def migrate(engine: Engine) -> None:
+    """Create tables and run every idempotent upgrade/backfill step, then record SCHEMA_VERSION."""
+    # Imported here: these pull in most of the services, which a current schema never needs at startup.
+    from app.services.fasting import ensure_fasting_windows
+    from app.services.labs import ensure_lab_tables
+    from app.services.rollups import ensure_rollup_columns
+    from app.services.search import ensure_search_index
+    from app.services.users import ensure_tenancy
+
+    Base.metadata.create_all(bind=engine)
+    ensure_tenancy(engine)
+    ensure_search_index(engine)
+    ensure_lab_tables(engine)
+    ensure_fasting_windows(engine)
+    ensure_rollup_columns(engine)
+    with Session(engine) as db:
+        row = db.get(AppMeta, _KEY)
+        if row is None:
+            db.add(AppMeta(key=_KEY, value=str(SCHEMA_VERSION)))
+        elif int(row.value) < SCHEMA_VERSION:  # never step back if newer code already migrated
+            row.value = str(SCHEMA_VERSION)
+        db.commit()
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import html
+import re
+from dataclasses import dataclass
+from datetime import date
+
+from sqlalchemy import delete, func, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.db import tenant_id
+from app.models import FoodLog, LabReport, MealType, MedicationLog, SearchDocument
+
+ENTITIES = ("food", "lab_report", "medication")
+PAGE_SIZE = 20
+SNIPPET_CHARS = 40
+MIN_FTS_TERM = 3  # the SQLite trigram tokenizer cannot match shorter terms
+
+_MEAL_LABELS = {MealType.breakfast: "早餐", MealType.lunch: "午餐", MealType.dinner: "晚餐", MealType.snack: "加餐"}
+# Private-use markers survive html.escape and are swapped for <mark> afterwards.
+_OPEN, _CLOSE = "\ue000", "\ue001"
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+    "title, body, content='search_documents', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+)
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    entity: str
+    entity_id: int
+    day: date | None
+    title_html: str
+    snippet_html: str
+    link: str | None
+
+
+def ensure_search_index(eng: Engine) -> None:
+    """Create the full-text index for this dialect (idempotent) and backfill it on first use."""
+    with eng.begin() as conn:
+        if eng.dialect.name == "sqlite":
+            for ddl in _SQLITE_DDL:
+                conn.exec_driver_sql(ddl)
+        elif eng.dialect.name == "mysql":
+            exists = conn.execute(
+                text(
+                    "SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                    "AND table_name = 'search_documents' AND index_name = 'ft_search_documents'"
+                )
+            ).scalar()
+            if not exists:
+                # ngram keeps Chinese notes searchable without a word segmenter.
+                conn.exec_driver_sql(
+                    "ALTER TABLE search_documents ADD FULLTEXT INDEX ft_search_documents (title, body) WITH PARSER ngram"
+                )
+    with Session(eng) as db:
+        if db.execute(select(SearchDocument.id).limit(1)).first() is None:
+            rebuild_index(db)
+
+
+def _upsert(
+    db: Session, user_id: int | None, entity: str, entity_id: int, day: date | None, title: str, body: str
+) -> None:
+    doc = db.execute(
+        select(SearchDocument).where(SearchDocument.entity == entity, SearchDocument.entity_id == entity_id)
+    ).scalar_one_or_none()
+    if doc is None:
+        db.add(SearchDocument(user_id=user_id, entity=entity, entity_id=entity_id, day=day, title=title, body=body))
+    else:
+        doc.day, doc.title, doc.body = day, title, body
+
+
+def index_food(db: Session, log: FoodLog) -> None:
+    title = f"{_MEAL_LABELS.get(log.meal_type, log.meal_type.value)} {log.eaten_at:%Y-%m-%d %H:%M}"
+    _upsert(db, log.user_id, "food", log.id, log.eaten_at.date(), title, log.notes or "")
+
+
+def index_lab_report(db: Session, report: LabReport) -> None:
+    day = report.report_date or report.created_at.date()
+    _upsert(db, report.user_id, "lab_report", report.id, day, f"体检报告 {day.isoformat()}", report.notes or "")
+
+
+def index_medication(db: Session, med: MedicationLog) -> None:
+    _upsert(db, med.user_id, "medication", med.id, med.taken_at.date(), med.name, med.dose or "")
+
+
+def rebuild_index(db: Session) -> int:
+    db.execute(delete(SearchDocument))
+    count = 0
+    for model, index in ((FoodLog, index_food), (LabReport, index_lab_report), (MedicationLog, index_medication)):
+        for obj in db.execute(select(model).execution_options(yield_per=500)).scalars():
+            index(db, obj)
+            count += 1
+    db.commit()
+    return count
+
+
+def _terms(query: str) -> list[str]:
+    return [t for t in re.split(r"\s+", query.strip()) if t]
+
+
+def _mark(text_value: str, terms: list[str]) -> str:
+    if not terms:
+        return text_value
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    return pattern.sub(lambda m: f"{_OPEN}{m.group(0)}{_CLOSE}", text_value)
+
+
+def _to_html(marked: str) -> str:
+    return html.escape(marked).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _snippet(body: str, terms: list[str]) -> str:
+    marked = _mark(body, terms)
+    pos = marked.find(_OPEN)
+    if pos < 0 or len(marked) <= 2 * SNIPPET_CHARS:
+        return marked if len(marked) <= 2 * SNIPPET_CHARS else marked[: 2 * SNIPPET_CHARS] + "…"
+    start = max(0, pos - SNIPPET_CHARS)
+    end = min(len(marked), pos + SNIPPET_CHARS)
+    # Never cut a marker pair in half.
+    if marked.count(_OPEN, start, end) != marked.count(_CLOSE, start, end):
+        end = marked.find(_CLOSE, end) + 1 or len(marked)
+    return ("…" if start else "") + marked[start:end] + ("…" if end < len(marked) else "")
+
+
+def _link(entity: str, entity_id: int, day: date | None, image_path: str | None = None) -> str | None:
+    if entity == "lab_report" and image_path:
+        return f"/uploads/{image_path}"
+    if entity in ("lab_report", "medication"):
+        return "/medical"
+    if day is not None:
+        return f"/calendar?year={day.year}&month={day.month}"
+    return None
+
+
+def _fts_query(terms: list[str]) -> str:
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def search(db: Session, query: str, entity: str | None = None, page: int = 1) -> tuple[list[SearchHit], int]:
+    """Ranked, highlighted hits for `query` plus the total hit count."""
+    terms = _terms(query)
+    if not terms:
+        return [], 0
+    dialect = db.get_bind().dialect.name
+    offset = (max(page, 1) - 1) * PAGE_SIZE
+    # Text SQL bypasses the session's tenant criteria, so the user filter is spelled out here.
+    where_scope = "AND d.user_id = :uid" + (" AND d.entity = :entity" if entity else "")
+    params = {"uid": tenant_id(db), "entity": entity, "limit": PAGE_SIZE, "offset": offset}
+
+    if dialect == "sqlite" and all(len(t) >= MIN_FTS_TERM for t in terms):
+        params["q"] = _fts_query(terms)
+        base = f"FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid WHERE search_fts MATCH :q {where_scope}"
+        total = db.execute(text(f"SELECT COUNT(*) {base}"), params).scalar() or 0
+        rows = db.execute(
+            text(
+                "SELECT d.entity, d.entity_id, d.day, "
+                f"highlight(search_fts, 0, '{_OPEN}', '{_CLOSE}'), "
+                f"snippet(search_fts, 1, '{_OPEN}', '{_CLOSE}', '…', 24) "
+                f"{base} ORDER BY bm25(search_fts, 2.0, 1.0) LIMIT :limit OFFSET :offset"
+            ),
+            params,
+        ).all()
+        hits_raw = [(r[0], r[1], r[2], r[3], r[4]) for r in rows]
+    elif dialect == "mysql":
+        params["q"] = " ".join(terms)
+        match = "MATCH(d.title, d.body) AGAINST (:q IN NATURAL LANGUAGE MODE)"
+        base = f"FROM search_documents d WHERE {match} {where_scope}"
+        total = db.execute(text(f"SELECT COUNT(*) {base}"), params).scalar() or 0
+        rows = db.execute(
+            text(
+                f"SELECT d.entity, d.entity_id, d.day, d.title, d.body, {match} AS score {base} "
+                "ORDER BY score DESC LIMIT :limit OFFSET :offset"
+            ),
+            params,
+        ).all()
+        hits_raw = [(r[0], r[1], r[2], _mark(r[3], terms), _snippet(r[4], terms)) for r in rows]
+    else:
+        # Short CJK terms (below the trigram size) and other dialects: substring scan of the documents table.
+        conds = [or_(SearchDocument.title.contains(t, autoescape=True), SearchDocument.body.contains(t, autoescape=True)) for t in terms]
+        stmt = select(SearchDocument).where(*conds)
+        if entity:
+            stmt = stmt.where(SearchDocument.entity == entity)
+        total = db.execute(select(func.count()).select_from(stmt.subquery())).scalar() or 0
+        docs = db.execute(
+            stmt.order_by(SearchDocument.day.desc(), SearchDocument.id.desc()).limit(PAGE_SIZE).offset(offset)
+        ).scalars()
+        hits_raw = [(d.entity, d.entity_id, d.day, _mark(d.title, terms), _snippet(d.body, terms)) for d in docs]
+
+    report_ids = [eid for ent, eid, *_ in hits_raw if ent == "lab_report"]
+    report_files = (
+        dict(db.execute(select(LabReport.id, LabReport.image_path).where(LabReport.id.in_(report_ids))).all())
+        if report_ids
+        else {}
+    )
+    hits = []
+    for ent, eid, day, title, snippet in hits_raw:
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        hits.append(
+            SearchHit(
+                entity=ent,
+                entity_id=eid,
+                day=day,
+                title_html=_to_html(title),
+                snippet_html=_to_html(snippet),
+                link=_link(ent, eid, day, report_files.get(eid)),
+            )
+        )
+    return hits, total
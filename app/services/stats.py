@@ -1,35 +1,181 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 
-from sqlalchemy import select
+from sqlalchemy import String, case, cast, func, literal, null, select, union_all
 from sqlalchemy.orm import Session
 
-from app.models import DailyMetrics, DailySummary
+from app.models import DailyMetrics, DailySummary, SummaryColor
+from app.services.timeseries import MetricDay, series_for
 
 
-def get_recent_metrics(db: Session, days: int = 30) -> list[DailyMetrics]:
-    start_day = date.today() - timedelta(days=days - 1)
-    return (
-        db.execute(select(DailyMetrics).where(DailyMetrics.day >= start_day).order_by(DailyMetrics.day.asc()))
-        .scalars()
-        .all()
-    )
+def get_recent_metrics(db: Session, days: int = 30) -> list[MetricDay]:
+    today = date.today()
+    return series_for(db).rows(today - timedelta(days=days - 1), today)
 
 
 def get_weight_baseline(db: Session) -> float | None:
-    first = (
-        db.execute(select(DailyMetrics).where(DailyMetrics.weight_kg.is_not(None)).order_by(DailyMetrics.day.asc()).limit(1))
-        .scalars()
-        .first()
-    )
-    return None if first is None else first.weight_kg
+    first = series_for(db).first("weight_kg")
+    return None if first is None else first[1]
+
+
+def get_latest_weight(db: Session) -> float | None:
+    latest = series_for(db).latest("weight_kg")
+    return None if latest is None else latest[1]
 
 
 def get_summary_counts(db: Session) -> dict[str, int]:
-    rows = db.execute(select(DailySummary.color)).scalars().all()
+    rows = db.execute(select(DailySummary.color, func.count()).group_by(DailySummary.color)).all()
     counts: dict[str, int] = {"green": 0, "yellow": 0, "red": 0}
-    for c in rows:
-        counts[c.value] += 1
+    for c, n in rows:
+        counts[c.value] = n
     return counts
 
+
+RANGE_GROUPS = ("day", "week", "month")
+
+
+@dataclass(frozen=True)
+class RangeBucket:
+    start: date
+    days_with_metrics: int
+    weight_avg: float | None
+    weight_min: float | None
+    weight_max: float | None
+    weight_first: float | None
+    weight_last: float | None
+    fasting_avg: float | None
+    fasting_n: int
+    bp_systolic_avg: float | None
+    bp_diastolic_avg: float | None
+    sleep_avg: float | None
+    green: int
+    yellow: int
+    red: int
+
+    @property
+    def weight_change(self) -> float | None:
+        if self.weight_first is None or self.weight_last is None:
+            return None
+        return self.weight_last - self.weight_first
+
+
+def _bucket_expr(dialect: str, day_col, group: str):
+    """Start-of-bucket date for `day_col`; weeks start on Monday like the calendar."""
+    if group == "day":
+        return day_col
+    if dialect == "sqlite":
+        if group == "week":
+            return func.date(day_col, "-6 days", "weekday 1")
+        return func.strftime("%Y-%m-01", day_col)
+    if dialect == "mysql":
+        if group == "week":
+            return func.subdate(day_col, func.weekday(day_col))  # SUBDATE(d, n) subtracts n days
+        return func.date_format(day_col, "%Y-%m-01")
+    # PostgreSQL and friends
+    return func.date_trunc(group, day_col)
+
+
+def _as_date(v) -> date:
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    return date.fromisoformat(str(v)[:10])
+
+
+def range_report(db: Session, start: date, end: date, group: str = "week") -> list[RangeBucket]:
+    """Bucketed metrics and day colors for [start, end], computed entirely in one SQL statement.
+
+    Metrics and summaries are stacked with UNION ALL so a single GROUP BY yields every bucket;
+    first/last weights come from FIRST_VALUE windows ordered so NULL weights sort last.
+    """
+    if group not in RANGE_GROUPS:
+        raise ValueError(f"group must be one of {RANGE_GROUPS}")
+
+    metrics_src = select(
+        DailyMetrics.day.label("day"),
+        DailyMetrics.weight_kg.label("weight"),
+        DailyMetrics.fasting_glucose_mmol_l.label("fasting"),
+        DailyMetrics.bp_systolic.label("bp_sys"),
+        DailyMetrics.bp_diastolic.label("bp_dia"),
+        DailyMetrics.sleep_hours.label("sleep"),
+        literal(1).label("is_metric"),
+        null().label("color"),
+    ).where(DailyMetrics.day >= start, DailyMetrics.day <= end)
+    summary_src = select(
+        DailySummary.day,
+        null(),
+        null(),
+        null(),
+        null(),
+        null(),
+        literal(0),
+        cast(DailySummary.color, String),
+    ).where(DailySummary.day >= start, DailySummary.day <= end)
+    src = union_all(metrics_src, summary_src).subquery("src")
+
+    bucket = _bucket_expr(db.get_bind().dialect.name, src.c.day, group).label("bucket")
+    weight_missing = case((src.c.weight.is_(None), 1), else_=0)
+    windowed = select(
+        bucket,
+        src.c.weight,
+        src.c.fasting,
+        src.c.bp_sys,
+        src.c.bp_dia,
+        src.c.sleep,
+        src.c.is_metric,
+        src.c.color,
+        func.first_value(src.c.weight)
+        .over(partition_by=bucket, order_by=(weight_missing, src.c.day.asc()))
+        .label("weight_first"),
+        func.first_value(src.c.weight)
+        .over(partition_by=bucket, order_by=(weight_missing, src.c.day.desc()))
+        .label("weight_last"),
+    ).subquery("w")
+
+    def color_count(name: str):
+        return func.sum(case((windowed.c.color == name, 1), else_=0))
+
+    stmt = (
+        select(
+            windowed.c.bucket,
+            func.sum(windowed.c.is_metric),
+            func.avg(windowed.c.weight),
+            func.min(windowed.c.weight),
+            func.max(windowed.c.weight),
+            func.max(windowed.c.weight_first),
+            func.max(windowed.c.weight_last),
+            func.avg(windowed.c.fasting),
+            func.count(windowed.c.fasting),
+            func.avg(windowed.c.bp_sys),
+            func.avg(windowed.c.bp_dia),
+            func.avg(windowed.c.sleep),
+            color_count(SummaryColor.green.value),
+            color_count(SummaryColor.yellow.value),
+            color_count(SummaryColor.red.value),
+        )
+        .group_by(windowed.c.bucket)
+        .order_by(windowed.c.bucket)
+    )
+    return [
+        RangeBucket(
+            start=_as_date(r[0]),
+            days_with_metrics=int(r[1] or 0),
+            weight_avg=r[2],
+            weight_min=r[3],
+            weight_max=r[4],
+            weight_first=r[5],
+            weight_last=r[6],
+            fasting_avg=r[7],
+            fasting_n=r[8],
+            bp_systolic_avg=r[9],
+            bp_diastolic_avg=r[10],
+            sleep_avg=r[11],
+            green=int(r[12] or 0),
+            yellow=int(r[13] or 0),
+            red=int(r[14] or 0),
+        )
+        for r in db.execute(stmt)
+    ]
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Annotated, Any, Literal, Union
+
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db import tenant_id
+from app.models import DailyMetrics, FoodLog, MealType, MedicationLog, SelfRating, SyncMutation, UserSettings
+from app.services.anomaly import changed_metrics, observe_changes
+from app.services.cache import data_version
+from app.services.events import publish_fasting, publish_summary
+from app.services.fasting import add_meal
+from app.services.rollups import refresh_days
+from app.services.search import index_food, index_medication
+
+MAX_BATCH = 500
+METRIC_FIELDS = (
+    "weight_kg",
+    "fasting_glucose_mmol_l",
+    "post2h_glucose_mmol_l",
+    "waist_cm",
+    "sleep_hours",
+    "bp_systolic",
+    "bp_diastolic",
+)
+
+
+class _Mutation(BaseModel):
+    key: str = Field(min_length=1, max_length=64)
+
+
+class FoodMutation(_Mutation):
+    type: Literal["food"]
+    eaten_at: datetime
+    meal_type: MealType
+    refined_carbs: bool = False
+    sugar: bool = False
+    veggies_first: bool = False
+    protein_enough: bool = False
+    self_rating: SelfRating
+    notes: str | None = None
+    meal_end_at: datetime | None = None
+
+
+class MetricsMutation(_Mutation):
+    """Partial upsert: only the fields present in the payload are written (null clears a value)."""
+
+    type: Literal["metrics"]
+    day: date
+    weight_kg: float | None = None
+    fasting_glucose_mmol_l: float | None = None
+    post2h_glucose_mmol_l: float | None = None
+    waist_cm: float | None = None
+    sleep_hours: float | None = None
+    bp_systolic: int | None = None
+    bp_diastolic: int | None = None
+
+
+class MedicationMutation(_Mutation):
+    type: Literal["medication"]
+    name: str = Field(min_length=1, max_length=128)
+    dose: str | None = Field(None, max_length=128)
+    taken_at: datetime
+    next_reminder_at: datetime | None = None
+
+
+Mutation = Annotated[Union[FoodMutation, MetricsMutation, MedicationMutation], Field(discriminator="type")]
+
+
+class SyncRequest(BaseModel):
+    mutations: list[Mutation] = Field(max_length=MAX_BATCH)
+
+
+def _apply_food(db: Session, m: FoodMutation, user_settings: UserSettings) -> tuple[int, date]:
+    log = FoodLog(**m.model_dump(exclude={"key", "type"}))
+    db.add(log)
+    db.flush()
+    index_food(db, log)
+    add_meal(db, log)
+    if m.meal_end_at is not None and (
+        user_settings.last_meal_end_at is None or m.meal_end_at > user_settings.last_meal_end_at
+    ):
+        # Offline queues replay out of order; only a later meal moves the fasting clock.
+        user_settings.last_meal_end_at = m.meal_end_at
+    return log.id, m.eaten_at.date()
+
+
+def _apply_metrics(
+    db: Session, m: MetricsMutation, pending: dict[date, DailyMetrics], changes: dict[tuple[date, str], float | None]
+) -> tuple[int, date]:
+    metric = pending.get(m.day)
+    if metric is None:
+        metric = db.execute(select(DailyMetrics).where(DailyMetrics.day == m.day)).scalar_one_or_none()
+    if metric is None:
+        metric = DailyMetrics(day=m.day)
+        db.add(metric)
+    pending[m.day] = metric
+    for field in METRIC_FIELDS:
+        if field in m.model_fields_set:
+            setattr(metric, field, getattr(m, field))
+    changes.update(changed_metrics(metric))
+    db.flush()
+    return metric.id, m.day
+
+
+def _apply_medication(db: Session, m: MedicationMutation) -> tuple[int, None]:
+    log = MedicationLog(**m.model_dump(exclude={"key", "type"}))
+    db.add(log)
+    db.flush()
+    index_medication(db, log)
+    return log.id, None
+
+
+def _apply(db: Session, mutations: list[Any]) -> tuple[list[dict[str, Any]], set[date], datetime | None]:
+    keys = [m.key for m in mutations]
+    seen = {
+        row.idempotency_key: row
+        for row in db.execute(select(SyncMutation).where(SyncMutation.idempotency_key.in_(keys))).scalars()
+    }
+    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == tenant_id(db))).scalar_one()
+    fasting_before = user_settings.last_meal_end_at
+
+    results: list[dict[str, Any]] = []
+    touched: set[date] = set()
+    pending_metrics: dict[date, DailyMetrics] = {}
+    metric_changes: dict[tuple[date, str], float | None] = {}
+    for m in mutations:
+        done = seen.get(m.key)
+        if done is not None:
+            results.append({"key": m.key, "status": "duplicate", "type": done.kind, "id": done.entity_id})
+            continue
+        if isinstance(m, FoodMutation):
+            entity_id, day = _apply_food(db, m, user_settings)
+        elif isinstance(m, MetricsMutation):
+            entity_id, day = _apply_metrics(db, m, pending_metrics, metric_changes)
+        else:
+            entity_id, day = _apply_medication(db, m)
+        if day is not None:
+            touched.add(day)
+        row = SyncMutation(idempotency_key=m.key, kind=m.type, entity_id=entity_id)
+        db.add(row)
+        seen[m.key] = row
+        results.append({"key": m.key, "status": "applied", "type": m.type, "id": entity_id})
+
+    touched |= observe_changes(db, metric_changes)
+    fasting_after = user_settings.last_meal_end_at
+    db.commit()
+    return results, touched, (fasting_after if fasting_after != fasting_before else None)
+
+
+def apply_batch(db: Session, request: SyncRequest) -> dict[str, Any]:
+    """Apply a batch in one transaction, skipping keys already applied, then refresh the touched days together.
+
+    Summaries are upserted per day, rollups once per month, with one commit and one version bump.
+    """
+    try:
+        results, touched, fasting = _apply(db, request.mutations)
+    except IntegrityError:
+        # A concurrent sync committed one of our keys first; on retry those keys read as duplicates.
+        db.rollback()
+        results, touched, fasting = _apply(db, request.mutations)
+
+    uid = tenant_id(db)
+    summaries: dict[str, str] = {}
+    for day, summary in refresh_days(db, touched).items():
+        publish_summary(uid, summary)
+        summaries[day.isoformat()] = summary.color.value
+    if fasting is not None:
+        publish_fasting(uid, fasting)
+
+    return {"results": results, "summaries": summaries, "data_version": str(data_version(uid))}
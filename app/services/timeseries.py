@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.db import file_lock, tenant_id, tenant_session
+from app.models import DailyMetrics
+from app.services.cache import VERSION_DIR, bump_data_version, data_version
+
+COLUMNS = (
+    "weight_kg",
+    "fasting_glucose_mmol_l",
+    "post2h_glucose_mmol_l",
+    "waist_cm",
+    "sleep_hours",
+    "bp_systolic",
+    "bp_diastolic",
+)
+_INT_COLUMNS = frozenset({"bp_systolic", "bp_diastolic"})
+VERSION_SCOPE = "metrics"
+NAN = float("nan")
+
+
+class MetricDay(NamedTuple):
+    """Read-only stand-in for a `DailyMetrics` row (same attribute names)."""
+
+    day: date
+    weight_kg: float | None
+    fasting_glucose_mmol_l: float | None
+    post2h_glucose_mmol_l: float | None
+    waist_cm: float | None
+    sleep_hours: float | None
+    bp_systolic: int | None
+    bp_diastolic: int | None
+
+
+def _nan_array(n: int) -> array:
+    return array("d", [NAN]) * n
+
+
+class MetricSeries:
+    """One user's daily metrics as parallel `array('d')` columns indexed by days since `origin`.
+
+    NaN marks a missing value and `present` marks days that have a row at all. That is 8 bytes per
+    column per day plus one: about 21 KB per year of history for all seven columns, ~0.6 MB for 30 years.
+    """
+
+    def __init__(self, version: int) -> None:
+        self.version = version
+        self.origin: date | None = None
+        self.present = bytearray()
+        self.columns: dict[str, array] = {name: array("d") for name in COLUMNS}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.present) + sum(col.itemsize * len(col) for col in self.columns.values())
+
+    def _offset(self, day: date) -> int | None:
+        if self.origin is None:
+            return None
+        i = (day - self.origin).days
+        return i if 0 <= i < len(self.present) else None
+
+    def _grow_to(self, day: date) -> int:
+        if self.origin is None:
+            self.origin = day
+        i = (day - self.origin).days
+        if i < 0:  # a day before the first one: shift everything right
+            self.present[0:0] = bytes(-i)
+            for col in self.columns.values():
+                col[0:0] = _nan_array(-i)
+            self.origin, i = day, 0
+        elif i >= len(self.present):
+            grow = i + 1 - len(self.present)
+            self.present.extend(bytes(grow))
+            for col in self.columns.values():
+                col.extend(_nan_array(grow))
+        return i
+
+    def _set(self, day: date, values: tuple[float | None, ...] | None) -> None:
+        i = self._grow_to(day)
+        self.present[i] = values is not None
+        for col, v in zip(self.columns.values(), values or (None,) * len(COLUMNS)):
+            col[i] = NAN if v is None else v
+
+    def _value(self, name: str, i: int) -> float | int | None:
+        v = self.columns[name][i]
+        if v != v:  # NaN
+            return None
+        return int(v) if name in _INT_COLUMNS else v
+
+    def _row(self, i: int) -> MetricDay:
+        return MetricDay(self.origin + timedelta(days=i), *(self._value(name, i) for name in COLUMNS))
+
+    def apply(self, changes: dict[date, tuple[float | None, ...] | None], version: int) -> None:
+        """Write-through from a committed transaction; None deletes the day."""
+        with self._lock:
+            for day, values in changes.items():
+                self._set(day, values)
+            self.version = version
+
+    def row(self, day: date) -> MetricDay | None:
+        with self._lock:
+            i = self._offset(day)
+            return self._row(i) if i is not None and self.present[i] else None
+
+    def _bounds(self, start: date, end: date) -> tuple[int, int]:
+        lo = max(0, (start - self.origin).days)
+        hi = min(len(self.present), (end - self.origin).days + 1)
+        return lo, hi
+
+    def rows(self, start: date, end: date) -> list[MetricDay]:
+        """Days in [start, end] that have a row, oldest first."""
+        with self._lock:
+            if self.origin is None:
+                return []
+            lo, hi = self._bounds(start, end)
+            return [self._row(i) for i in range(lo, hi) if self.present[i]]
+
+    def values(self, name: str, start: date, end: date) -> array:
+        """Raw column slice for [start, end] clipped to the data, one float per day, NaN where missing."""
+        with self._lock:
+            if self.origin is None:
+                return array("d")
+            lo, hi = self._bounds(start, end)
+            return self.columns[name][lo:hi] if lo < hi else array("d")
+
+    def first(self, name: str) -> tuple[date, float] | None:
+        with self._lock:
+            col = self.columns[name]
+            for i, v in enumerate(col):
+                if v == v:
+                    return self.origin + timedelta(days=i), self._value(name, i)
+            return None
+
+    def latest(self, name: str) -> tuple[date, float] | None:
+        with self._lock:
+            col = self.columns[name]
+            for i in range(len(col) - 1, -1, -1):
+                if col[i] == col[i]:
+                    return self.origin + timedelta(days=i), self._value(name, i)
+            return None
+
+
+_series: dict[int, MetricSeries] = {}
+
+
+def _load(db: Session, user_id: int, version: int) -> MetricSeries:
+    series = MetricSeries(version)
+    rows = db.execute(
+        select(DailyMetrics.day, *(getattr(DailyMetrics, name) for name in COLUMNS))
+        .where(DailyMetrics.user_id == user_id)
+        .order_by(DailyMetrics.day)
+    ).all()
+    if rows:
+        series._grow_to(rows[0][0])
+        series._grow_to(rows[-1][0])  # allocate the full span once
+        for day, *values in rows:
+            series._set(day, values)
+    return series
+
+
+def series_for(db: Session) -> MetricSeries:
+    """The current user's series, loaded with one narrow query and then kept up to date in memory.
+
+    Writes in this process are applied in place; a write from another process bumps the per-user
+    "metrics" version and the next read here reloads.
+    """
+    uid = tenant_id(db)
+    version = data_version(uid, VERSION_SCOPE)
+    series = _series.get(uid)
+    if series is None or series.version != version:
+        # Load in a transaction that starts after the version read: under REPEATABLE READ the caller's
+        # may hold an older snapshot, which would be cached under the newer version. A write racing
+        # with the load only leaves the series one version behind, so the next read reloads.
+        with tenant_session(uid) as fresh:
+            series = _series[uid] = _load(fresh, uid, version)
+    return series
+
+
+def _values(row: DailyMetrics) -> tuple[float | None, ...]:
+    return tuple(getattr(row, name) for name in COLUMNS)
+
+
+@event.listens_for(Session, "after_flush")
+def _capture(db: Session, flush_context) -> None:
+    writes = None
+    for obj in (*db.new, *db.dirty, *db.deleted):
+        if isinstance(obj, DailyMetrics):
+            writes = db.info.setdefault("metric_writes", {}) if writes is None else writes
+            writes[(obj.user_id, obj.day)] = None if obj in db.deleted else _values(obj)
+
+
+@event.listens_for(Session, "after_commit")
+def _write_through(db: Session) -> None:
+    writes = db.info.pop("metric_writes", None)
+    if not writes:
+        return
+    by_user: dict[int, dict[date, tuple[float | None, ...] | None]] = {}
+    for (uid, day), values in writes.items():
+        by_user.setdefault(uid, {})[day] = values
+    for uid, changes in by_user.items():
+        # Under the lock no other process can bump in between, so `before` is exactly the version this
+        # bump replaces: if the series was loaded at it, nobody else has written since.
+        with file_lock(VERSION_DIR / f".{VERSION_SCOPE}_version.{uid}.lock"):
+            before = data_version(uid, VERSION_SCOPE)
+            after = bump_data_version(uid, VERSION_SCOPE)
+        series = _series.get(uid)
+        if series is None:
+            continue
+        if series.version == before:
+            series.apply(changes, after)
+        else:  # another process wrote since this one loaded; reload on next read
+            _series.pop(uid, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(db: Session) -> None:
+    db.info.pop("metric_writes", None)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import uuid
+from pathlib import Path, PurePosixPath
+from typing import Iterator, NamedTuple
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.db import tenant_session
+from app.models import FoodLog, LabReport
+
+# Files saved since multi-user support live under u<user id>/, so ownership is a prefix check.
+# Older ones (YYYYMMDD/… and reports/…) are looked up in the tables that reference them.
+_legacy_owned: set[tuple[int, str]] = set()
+_LEGACY_CACHE_MAX = 50_000
+
+# Cold day folders are packed into <prefix>/archive/YYYYMM.zip (see app/services/archive.py); the
+# JSON index next to it maps each original relative path to where its bytes are in the ZIP.
+ARCHIVE_DIR = "archive"
+_indexes: dict[Path, tuple[int, dict[str, list[int]]]] = {}
+
+
+class Stored(NamedTuple):
+    """An upload's bytes: a file of its own, or `size` bytes at `offset` inside a month archive."""
+
+    path: Path
+    offset: int
+    size: int
+    mtime_ns: int
+    packed: bool
+
+
+def user_prefix(user_id: int) -> str:
+    return f"u{user_id}"
+
+
+def new_upload(user_id: int, folder: str, ext: str) -> tuple[Path, str]:
+    """Absolute path to write a new upload to, and the relative path stored on the row."""
+    rel = f"{user_prefix(user_id)}/{folder}/{uuid.uuid4().hex}{ext}"
+    path = settings.upload_dir / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path, rel
+
+
+def is_day_folder(name: str) -> bool:
+    return len(name) == 8 and name.isdigit()
+
+
+def split_prefix(rel: str) -> tuple[str, list[str]]:
+    """("u3", ["20250101", "x.jpg"]) for new paths, ("", [...]) for ones saved before multi-user support."""
+    parts = rel.split("/")
+    if parts[0].startswith("u") and parts[0][1:].isdigit():
+        return parts[0], parts[1:]
+    return "", parts
+
+
+def archive_paths(prefix: str, month: str) -> tuple[Path, Path]:
+    """The ZIP and index for one prefix's month ("202501")."""
+    folder = settings.upload_dir / prefix / ARCHIVE_DIR
+    return folder / f"{month}.zip", folder / f"{month}.index.json"
+
+
+def resolve(rel: str) -> Path | None:
+    """The file for a stored relative path, or None if it is missing or escapes the upload dir."""
+    parts = rel.split("/")
+    if ARCHIVE_DIR in parts[:-1] or any(part.startswith(".") for part in parts):
+        return None  # archive internals and bookkeeping files are not uploads
+    root = settings.upload_dir.resolve()
+    path = (root / rel).resolve()
+    if root not in path.parents or not path.is_file():
+        return None
+    return path
+
+
+def load_index(path: Path) -> dict[str, list[int]]:
+    """`{rel: [offset, size, mtime_ns]}` for one month archive, re-read only when the index file changes."""
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    members = json.loads(path.read_text(encoding="utf-8"))["members"]
+    _indexes[path] = (mtime, members)
+    return members
+
+
+def locate(rel: str) -> Stored | None:
+    """Where a stored relative path's bytes are now: the file itself, else its month archive.
+
+    `FoodLog.image_path` never changes when a photo is archived; this lookup is what moves.
+    """
+    path = resolve(rel)
+    if path is not None:
+        st = path.stat()
+        return Stored(path, 0, st.st_size, st.st_mtime_ns, False)
+    prefix, rest = split_prefix(rel)
+    if len(rest) != 2 or not is_day_folder(rest[0]):
+        return None
+    zip_path, index_path = archive_paths(prefix, rest[0][:6])
+    entry = load_index(index_path).get(rel)
+    if entry is None:
+        return None
+    offset, size, mtime_ns = entry
+    return Stored(zip_path, offset, size, mtime_ns, True)
+
+
+def iter_bytes(item: Stored, chunk_size: int) -> Iterator[bytes]:
+    with item.path.open("rb") as f:
+        f.seek(item.offset)
+        left = item.size
+        while left > 0 and (block := f.read(min(chunk_size, left))):
+            left -= len(block)
+            yield block
+
+
+def owns(user_id: int, rel: str) -> bool:
+    head = rel.split("/", 1)[0]
+    if head.startswith("u") and head[1:].isdigit():
+        return head == user_prefix(user_id)
+    if (user_id, rel) in _legacy_owned:
+        return True
+    with tenant_session(user_id) as db:
+        found = any(
+            db.execute(select(model.id).where(model.user_id == user_id, model.image_path == rel).limit(1)).first()
+            for model in (FoodLog, LabReport)
+        )
+    if not found:
+        return False
+    if len(_legacy_owned) >= _LEGACY_CACHE_MAX:
+        _legacy_owned.clear()
+    _legacy_owned.add((user_id, rel))
+    return True
+
+
+def etag(rel: str, item: Stored) -> str:
+    """Strong validator: upload names are unique, and size + mtime change if a file is ever rewritten.
+
+    An archived member keeps the size and mtime it had as a file, so packing doesn't change its ETag.
+    """
+    return f'"{PurePosixPath(rel).stem}-{item.size:x}-{item.mtime_ns:x}"'
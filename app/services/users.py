@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import argparse
+import getpass
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Base, TenantMixin, User, UserSettings
+from app.security import OWNER_USERNAME, hash_password
+
+# Columns added to pre-existing tables after their first release; all nullable, so a plain ADD COLUMN works.
+_ADDED_COLUMNS = {"users": ("password_hash",)}
+
+
+def user_ids(db: Session) -> list[int]:
+    return list(db.execute(select(User.id).order_by(User.id)).scalars())
+
+
+def user_id_for(db: Session, username: str) -> int | None:
+    return db.execute(select(User.id).where(User.username == username)).scalar_one_or_none()
+
+
+def create_user(db: Session, username: str, password: str | None = None) -> User:
+    """A family member with default settings; they log in with `password`."""
+    user = User(username=username, password_hash=hash_password(password) if password else None)
+    db.add(user)
+    db.flush()
+    db.add(UserSettings(user_id=user.id, height_cm=settings.user_height_cm, goal_weight_kg=settings.goal_weight_kg))
+    return user
+
+
+def ensure_owner(engine: Engine) -> int:
+    """The original single user; every row from before multi-user support belongs to them."""
+    with Session(engine) as db:
+        uid = user_id_for(db, OWNER_USERNAME)
+        if uid is not None:
+            return uid
+        create_user(db, OWNER_USERNAME)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another process (e.g. a worker on a different host without the shared lock) won the race.
+            db.rollback()
+        return user_id_for(db, OWNER_USERNAME)
+
+
+def tenant_tables() -> list:
+    return [m.local_table for m in Base.registry.mappers if issubclass(m.class_, TenantMixin)]
+
+
+def _add_missing_columns(engine: Engine) -> None:
+    insp = inspect(engine)
+    for table_name, columns in _ADDED_COLUMNS.items():
+        have = {c["name"] for c in insp.get_columns(table_name)}
+        table = Base.metadata.tables[table_name]
+        for name in columns:
+            if name in have:
+                continue
+            column = table.c[name]
+            ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {column.type.compile(engine.dialect)}"
+            with engine.begin() as conn:
+                conn.exec_driver_sql(ddl)
+
+
+def _rebuild_with_owner(engine: Engine, table, owner_id: int) -> None:
+    """Recreate a single-user table with `user_id` and its composite indexes, assigning every row to the owner.
+
+    Rebuilding instead of ALTER ... ADD COLUMN gives the new NOT NULL column, its foreign key and the
+    (user_id, ...) unique indexes on SQLite too, which cannot add constraints to an existing table.
+    """
+    insp = inspect(engine)
+    q = engine.dialect.identifier_preparer.quote
+    old = f"{table.name}__single"
+    old_columns = {c["name"] for c in insp.get_columns(table.name)}
+    columns = [c.name for c in table.c if c.name in old_columns]
+    column_list = ", ".join(q(c) for c in columns)
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # SQLite index names are schema-wide; free them for the new table.
+            for index in insp.get_indexes(table.name):
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {q(index['name'])}")
+        conn.exec_driver_sql(f"ALTER TABLE {q(table.name)} RENAME TO {q(old)}")
+        table.create(conn)
+        conn.execute(
+            text(
+                f"INSERT INTO {q(table.name)} (user_id, {column_list}) "
+                f"SELECT :owner, {column_list} FROM {q(old)}"
+            ),
+            {"owner": owner_id},
+        )
+        conn.exec_driver_sql(f"DROP TABLE {q(old)}")
+
+
+def ensure_tenancy(engine: Engine) -> int:
+    """Upgrade a single-user database in place (idempotent); returns the owner's id.
+
+    Runs after `create_all`, which creates missing tables but never alters existing ones. Search
+    triggers and the MySQL FULLTEXT index go away with the old table; `ensure_search_index` recreates them.
+    """
+    _add_missing_columns(engine)
+    owner_id = ensure_owner(engine)
+    insp = inspect(engine)
+    for table in tenant_tables():
+        if not insp.has_table(table.name):
+            continue
+        if "user_id" in {c["name"] for c in insp.get_columns(table.name)}:
+            continue
+        _rebuild_with_owner(engine, table, owner_id)
+    return owner_id
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manage project_80 users (family members).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="list users")
+    add = sub.add_parser("add", help="create a user")
+    add.add_argument("username")
+    passwd = sub.add_parser("passwd", help="set a user's password")
+    passwd.add_argument("username")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        if args.cmd == "list":
+            for user in db.execute(select(User).order_by(User.id)).scalars():
+                login = "config credentials" if user.username == OWNER_USERNAME and not user.password_hash else "password"
+                print(f"{user.id}\t{user.username}\t{login}")
+            return
+        if args.cmd == "add" and user_id_for(db, args.username) is not None:
+            parser.error(f"user {args.username!r} already exists")
+        if args.cmd == "passwd" and user_id_for(db, args.username) is None:
+            parser.error(f"no such user: {args.username}")
+        password = getpass.getpass(f"password for {args.username}: ")
+        if not password:
+            parser.error("empty password")
+        if args.cmd == "add":
+            create_user(db, args.username, password)
+        else:
+            user = db.execute(select(User).where(User.username == args.username)).scalar_one()
+            user.password_hash = hash_password(password)
+        db.commit()
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+/* Live fasting timer, yesterday summary and dashboard card refresh, fed by /events/dashboard
+   (server-sent events). The server only pushes when state changes; the countdown ticks locally. */
+(function () {
+  if (!window.EventSource) return;
+
+  const TARGET_HOURS = 16.0;
+  const BADGE_CLASSES = {
+    green: ['bg-success-subtle', 'text-success'],
+    yellow: ['bg-warning-subtle', 'text-warning-emphasis'],
+    red: ['bg-danger-subtle', 'text-danger'],
+  };
+  let lastMealEnd = null;
+  let clockOffsetMs = 0;
+
+  function all(name) {
+    return document.querySelectorAll('[data-live="' + name + '"]');
+  }
+
+  function renderFasting() {
+    if (lastMealEnd === null) return;
+    const hours = (Date.now() + clockOffsetMs - lastMealEnd) / 3600000;
+    const remaining = Math.max(0, TARGET_HOURS - hours);
+    const progress = Math.min(100, (hours / TARGET_HOURS) * 100);
+
+    all('fasting-hours').forEach((el) => { el.textContent = hours.toFixed(1); });
+    all('fasting-remaining').forEach((el) => { el.textContent = remaining.toFixed(1); });
+    all('fasting-progress').forEach((el) => {
+      el.style.width = progress + '%';
+      el.classList.toggle('bg-success', progress >= 100);
+      el.classList.toggle('bg-primary', progress < 100);
+    });
+    all('fasting-pending').forEach((el) => { el.classList.toggle('d-none', remaining <= 0); });
+    all('fasting-done').forEach((el) => { el.classList.toggle('d-none', remaining > 0); });
+  }
+
+  const source = new EventSource('/events/dashboard');
+
+  source.addEventListener('fasting', (e) => {
+    const data = JSON.parse(e.data);
+    clockOffsetMs = Date.parse(data.server_now) - Date.now();
+    if (data.last_meal_end_at === null) return;
+    // The page was rendered without a timer card; it needs the full markup once.
+    if (lastMealEnd === null && all('fasting-hours').length === 0 && all('fasting-empty').length > 0) {
+      window.location.reload();
+      return;
+    }
+    lastMealEnd = Date.parse(data.last_meal_end_at);
+    renderFasting();
+  });
+
+  source.addEventListener('summary', (e) => {
+    const data = JSON.parse(e.data);
+    if (!data.color) return;
+    all('summary-color').forEach((el) => {
+      el.textContent = '昨日: ' + data.color.toUpperCase();
+      Object.values(BADGE_CLASSES).flat().forEach((c) => el.classList.remove(c));
+      el.classList.add(...BADGE_CLASSES[data.color]);
+    });
+    all('summary-reasons').forEach((el) => { el.textContent = data.reasons || '无记录'; });
+    all('summary-commentary').forEach((el) => { el.textContent = data.commentary; });
+  });
+
+  // Re-fetch cards marked data-refresh-on="data" when another request changed the data.
+  source.addEventListener('data', (e) => {
+    const data = JSON.parse(e.data);
+    const root = document.querySelector('[data-version]');
+    if (!root || root.dataset.version === data.version) return;
+    root.dataset.version = data.version;
+    document.querySelectorAll('[data-fragment][data-refresh-on~="data"]').forEach(refreshFragment);
+  });
+
+  function refreshFragment(el) {
+    fetch(el.dataset.fragment, { credentials: 'same-origin' })
+      .then((resp) => (resp.ok ? resp.text() : Promise.reject(resp.status)))
+      .then((html) => {
+        const tpl = document.createElement('template');
+        tpl.innerHTML = html.trim();
+        const fresh = tpl.content.firstElementChild;
+        el.replaceWith(fresh);
+        fresh.dispatchEvent(new CustomEvent('fragment:loaded', { bubbles: true }));
+        renderFasting();
+      })
+      .catch(() => {});
+  }
+  window.refreshFragment = refreshFragment;
+
+  setInterval(renderFasting, 30000);
+})();
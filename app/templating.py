@@ -0,0 +1,6 @@
+from __future__ import annotations
+
+from fastapi.templating import Jinja2Templates
+
+# One Jinja environment for every router, so base.html and partials are compiled once per process.
+templates = Jinja2Templates(directory="app/templates")
@@ -0,0 +1,156 @@
+"""Tail latency under overload, with and without admission control.
+
+    python -m bench.overload --clients 128 --seconds 10
+
+Starts the app with uvicorn on a scratch SQLite database (once with limits so high nothing is
+ever queued or shed, once with the configured limits), drives it with more concurrent clients
+than it can serve, and reports latency percentiles for successful responses and how many
+requests were shed with 503. "server" is queue + handling time from the Server-Timing header;
+"client" also includes the client's own scheduling, which matters when both share a CPU.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+PATHS = ("/dashboard", "/metrics", "/calendar/year", "/api/status/load")
+USER, PASSWORD = "bench", "bench-password"
+UNLIMITED = {
+    f"ADMISSION_{cls}_{what}": "100000" for cls in ("READ", "WRITE", "UPLOAD") for what in ("LIMIT", "QUEUE")
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pct(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+
+def _server_s(r: httpx.Response) -> float:
+    parts = dict(p.strip().split(";dur=") for p in r.headers.get("server-timing", "").split(",") if ";dur=" in p)
+    return (float(parts.get("queue", 0)) + float(parts.get("app", 0))) / 1000
+
+
+async def _client(
+    base: str,
+    cookies: httpx.Cookies,
+    deadline: float,
+    ok: list[tuple[float, float]],
+    shed: list[float],
+    errors: list[str],
+) -> None:
+    async with httpx.AsyncClient(base_url=base, cookies=cookies, timeout=60.0) as client:
+        i = 0
+        while time.perf_counter() < deadline:
+            path = PATHS[i % len(PATHS)]
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path)
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+                continue
+            elapsed = time.perf_counter() - t0
+            if r.status_code == 200:
+                ok.append((elapsed, _server_s(r)))
+            elif r.status_code == 503:
+                shed.append(elapsed)
+                await asyncio.sleep(float(r.headers.get("retry-after", "1")) / 10)  # impatient client
+            else:
+                errors.append(str(r.status_code))
+
+
+def _seed(env: dict[str, str]) -> None:
+    code = (
+        "from app.main import init_app_state; init_app_state()\n"
+        "from app.db import SessionLocal; from app.services.users import create_user\n"
+        "from app.models import DailyMetrics; from datetime import date, timedelta\n"
+        "with SessionLocal() as db:\n"
+        f"    u = create_user(db, {USER!r}, {PASSWORD!r}); db.flush()\n"
+        "    for i in range(365):\n"
+        "        db.add(DailyMetrics(user_id=u.id, day=date.today() - timedelta(days=i), weight_kg=80 + i % 7 / 10))\n"
+        "    db.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+
+async def _drive(base: str, clients: int, seconds: float) -> tuple[list[tuple[float, float]], list[float], list[str]]:
+    async with httpx.AsyncClient(base_url=base) as login:
+        r = await login.post("/login", data={"username": USER, "password": PASSWORD})
+        cookies = login.cookies
+        assert r.status_code in (200, 302), r.status_code
+    ok: list[tuple[float, float]] = []
+    shed: list[float] = []
+    errors: list[str] = []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(_client(base, cookies, deadline, ok, shed, errors) for _ in range(clients)))
+    return ok, shed, errors
+
+
+def run(admission: bool, clients: int, seconds: float) -> None:
+    work = Path(tempfile.mkdtemp(prefix="project80-overload-"))
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{work / 'data.sqlite'}",
+        UPLOAD_DIR=str(work / "uploads"),
+        BACKUP_INTERVAL_HOURS="0",
+        **({} if admission else UNLIMITED),
+    )
+    _seed(env)
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base}/login", timeout=1.0)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        ok, shed, errors = asyncio.run(_drive(base, clients, seconds))
+    finally:
+        server.terminate()
+        server.wait()
+    client = [c for c, _ in ok]
+    server = [s for _, s in ok]
+    print(f"{'limits' if admission else 'no limits'}: {len(ok)} ok ({len(ok) / seconds:.1f}/s), "
+          f"{len(shed)} shed with 503 (client median {statistics.median(shed) * 1000 if shed else 0:.1f}ms), "
+          f"{len(errors)} errors")
+    for name, samples in (("server", server), ("client", client)):
+        print(
+            f"  {name}  p50={_pct(samples, 0.50):7.1f}ms  p95={_pct(samples, 0.95):7.1f}ms  "
+            f"p99={_pct(samples, 0.99):7.1f}ms  max={max(samples, default=0) * 1000:7.1f}ms"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=128)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    for admission in (False, True):
+        run(admission, args.clients, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Process start-up cost (import + init) against a time budget.
+
+    python -m bench.startup --runs 5 --budget-ms 1500
+
+Each sample is a fresh interpreter that imports app.main and runs init_app_state, as a uvicorn
+worker does before it can serve. The first start on an empty database (which runs the schema
+migration) is reported separately; the budget applies to the median of later starts with lazy
+routers on. Exits with status 1 when the budget is exceeded, so it can gate a deploy.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+_START = """
+import json, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+app.main.init_app_state()
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "init_ms": (t2 - t1) * 1000}))
+"""
+
+# What every start used to pay: the full migration against an up-to-date database.
+_MIGRATE = """
+import json, time
+from app.db import engine
+from app.services.schema import migrate, stored_version
+t0 = time.perf_counter()
+migrate(engine)
+t1 = time.perf_counter()
+stored_version(engine)
+t2 = time.perf_counter()
+print(json.dumps({"migrate_ms": (t1 - t0) * 1000, "check_ms": (t2 - t1) * 1000}))
+"""
+
+
+def _probe(code: str, env: dict[str, str]) -> dict[str, float]:
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _median(samples: list[dict[str, float]], key: str) -> float:
+    return statistics.median(s[key] for s in samples)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="max median import + init with lazy routers")
+    args = parser.parse_args(argv)
+
+    work = Path(tempfile.mkdtemp(prefix="project80-startup-"))
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{work / 'data.sqlite'}",
+        UPLOAD_DIR=str(work / "uploads"),
+        BACKUP_INTERVAL_HOURS="0",
+        JOB_WORKERS="1",
+    )
+
+    first = _probe(_START, env)
+    print(f"first start (empty database)  import {first['import_ms']:7.1f} ms  init {first['init_ms']:7.1f} ms")
+
+    results = {}
+    for lazy in ("0", "1"):
+        samples = [_probe(_START, dict(env, LAZY_ROUTERS=lazy)) for _ in range(args.runs)]
+        results[lazy] = samples
+        label = "lazy routers on " if lazy == "1" else "lazy routers off"
+        print(
+            f"{label}              import {_median(samples, 'import_ms'):7.1f} ms  "
+            f"init {_median(samples, 'init_ms'):7.1f} ms  (median of {args.runs})"
+        )
+
+    migrate = [_probe(_MIGRATE, env) for _ in range(args.runs)]
+    print(
+        f"schema check                  full migration {_median(migrate, 'migrate_ms'):7.1f} ms  "
+        f"vs stored-version query {_median(migrate, 'check_ms'):5.1f} ms"
+    )
+
+    total = statistics.median(s["import_ms"] + s["init_ms"] for s in results["1"])
+    ok = total <= args.budget_ms
+    print(f"budget: import + init {total:.1f} ms {'<=' if ok else '>'} {args.budget_ms:.0f} ms -> {'OK' if ok else 'OVER'}")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
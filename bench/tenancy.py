@@ -0,0 +1,137 @@
+"""Per-user request latency as the number of users on one instance grows.
+
+    python -m bench.tenancy --users 120 --days 180
+
+Builds a throwaway SQLite database, adds users in steps, and after each step times the main
+per-user pages for a sample of users. With every query led by a (user_id, ...) index the
+medians should stay flat from 1 to 100+ users.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+PAGES = ("/dashboard", "/metrics", "/calendar/year", "/report/weekly")
+PASSWORD = "bench-password"
+
+
+def _seed_user(conn, user_id: int, days: int, rng: random.Random) -> None:
+    from app.models import DailyMetrics, FoodLog, MealType, SelfRating
+
+    today = date.today()
+    now = datetime.utcnow()
+    metrics, meals = [], []
+    for i in range(days):
+        day = today - timedelta(days=i)
+        metrics.append(
+            {
+                "user_id": user_id,
+                "day": day,
+                "weight_kg": round(rng.gauss(80, 3), 1),
+                "fasting_glucose_mmol_l": round(rng.gauss(6.0, 0.6), 1),
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        for hour, meal_type in ((8, MealType.breakfast), (12, MealType.lunch)):
+            eaten_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+            meals.append(
+                {
+                    "user_id": user_id,
+                    "eaten_at": eaten_at,
+                    "meal_end_at": eaten_at + timedelta(minutes=30),
+                    "meal_type": meal_type,
+                    "self_rating": SelfRating.safe,
+                    "refined_carbs": rng.random() < 0.3,
+                    "sugar": rng.random() < 0.2,
+                    "veggies_first": rng.random() < 0.5,
+                    "protein_enough": rng.random() < 0.6,
+                    "created_at": now,
+                }
+            )
+    conn.execute(DailyMetrics.__table__.insert(), metrics)
+    conn.execute(FoodLog.__table__.insert(), meals)
+
+
+def _add_users(n_from: int, n_to: int, days: int, rng: random.Random) -> None:
+    from app.db import SessionLocal, engine
+    from app.security import hash_password
+    from app.services.users import create_user
+
+    password_hash = hash_password(PASSWORD)  # one PBKDF2 run, shared by every synthetic user
+    with SessionLocal() as db:
+        ids = []
+        for i in range(n_from, n_to):
+            user = create_user(db, f"bench{i}")
+            user.password_hash = password_hash
+            ids.append(user.id)
+        db.commit()
+    with engine.begin() as conn:
+        for uid in ids:
+            _seed_user(conn, uid, days, rng)
+
+
+def _time_user(client, username: str, repeat: int) -> dict[str, float]:
+    from app.routers.dashboard import _card_cache
+
+    client.cookies.clear()
+    r = client.post("/login", data={"username": username, "password": PASSWORD}, follow_redirects=False)
+    assert r.status_code == 302, r.text
+    for page in PAGES:  # first view materializes summaries; time the steady state
+        client.get(page)
+    timings = {}
+    for page in PAGES:
+        samples = []
+        for _ in range(repeat):
+            _card_cache.clear()
+            t0 = time.perf_counter()
+            r = client.get(page)
+            samples.append(time.perf_counter() - t0)
+            assert r.status_code == 200, (page, r.status_code)
+        timings[page] = statistics.median(samples) * 1000
+    return timings
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=120)
+    parser.add_argument("--days", type=int, default=180, help="history per user")
+    parser.add_argument("--sample", type=int, default=5, help="users timed at each step")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    work = Path(tempfile.mkdtemp(prefix="project80-bench-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{work / 'data.sqlite'}"
+    os.environ["UPLOAD_DIR"] = str(work / "uploads")
+    os.environ["BACKUP_INTERVAL_HOURS"] = "0"
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.services import cache
+
+    cache.VERSION_DIR = work
+    rng = random.Random(80)
+    steps = sorted({s for s in (1, 10, 50, args.users) if s <= args.users})
+    print(f"{'users':>6} " + " ".join(f"{p:>16}" for p in PAGES) + "   (median ms)")
+    with TestClient(app) as client:
+        have = 0
+        for step in steps:
+            _add_users(have, step, args.days, rng)
+            have = step
+            sampled = rng.sample(range(step), min(args.sample, step))
+            per_page: dict[str, list[float]] = {p: [] for p in PAGES}
+            for i in sampled:
+                for page, ms in _time_user(client, f"bench{i}", args.repeat).items():
+                    per_page[page].append(ms)
+            print(f"{step:>6} " + " ".join(f"{statistics.median(per_page[p]):>16.1f}" for p in PAGES))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 #!/bin/bash
 
+# In prod mode (APP_MODE=prod) a SIGHUP makes the uvicorn supervisor replace its
+# workers one by one without dropping the listening socket.
+if [ "${APP_MODE}" = "prod" ] && pgrep -f "python -u run.py" > /dev/null
+then
+    echo "Gracefully reloading project_80 workers..."
+    pkill -HUP -o -f "python -u run.py"
+    echo "Reload signal sent. Logs: tail -f super_nohup.out"
+    exit 0
+fi
+
 # 1. Kill existing process
 echo "Stopping existing project_80 process..."
 pkill -f "python -u run.py"
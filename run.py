@@ -1,16 +1,47 @@
 from __future__ import annotations
 
+import importlib.util
 import os
 
 import uvicorn
 
 
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _run_dev(host: str, port: int) -> None:
+    reload = os.getenv("RELOAD", "1") not in {"0", "false", "False"}
+    uvicorn.run("app.main:app", host=host, port=port, reload=reload)
+
+
+def _run_prod(host: str, port: int) -> None:
+    # 多进程模式：每个 worker 启动时通过 app.db.init_lock() 串行执行建表/建用户，不会互相抢。
+    # 平滑重启：向主进程发送 SIGHUP（见 restart.sh），worker 会逐个替换；SIGTTIN/SIGTTOU 增减 worker。
+    workers = int(os.getenv("WORKERS", "0")) or (os.cpu_count() or 1)
+    uvicorn.run(
+        "app.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop" if _has("uvloop") else "asyncio",
+        http="httptools" if _has("httptools") else "h11",
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_S", "5")),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT_S", "30")),
+        access_log=os.getenv("ACCESS_LOG", "0") not in {"0", "false", "False"},
+    )
+
+
 if __name__ == "__main__":
     # --- 配置区域 ---
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8000")) # <--- 在这里修改端口号，例如改为 8080
-    reload = os.getenv("RELOAD", "1") not in {"0", "false", "False"}
+    mode = os.getenv("APP_MODE", "dev")  # dev: 单进程 + reload；prod: 多进程 + uvloop/httptools
     # ----------------
 
-    uvicorn.run("app.main:app", host=host, port=port, reload=reload)
-
+    if mode == "prod":
+        _run_prod(host, port)
+    else:
+        _run_dev(host, port)